@@ -0,0 +1,317 @@
+"""
+Batch Translate → Summarize Pipeline
+------------------------------------
+
+High-throughput version of `p04_processing_pipeline.py`:
+- Streams inputs from a JSONL file (one `{"id", "initial_text"}` per line)
+- Keeps up to `--max-concurrency` records in flight over the whole stream
+  (threads or asyncio), starting the next record as soon as any one finishes
+- Skips the translation hop when the text already looks like English
+- Appends results incrementally, so an interrupted run can be resumed
+
+Usage:
+    uv run ch02_chains_and_processing/p08_processing_pipeline_batch.py \\
+        input.jsonl output.jsonl --max-concurrency 16 --async
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import re
+from collections.abc import Iterator
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from pathlib import Path
+from typing import IO, Any
+
+from dotenv import load_dotenv
+from langchain_core.language_models import BaseChatModel
+from langchain_core.output_parsers import StrOutputParser
+from langchain_core.prompts import PromptTemplate
+from langchain_core.runnables import Runnable, RunnableBranch, RunnableParallel
+
+# =========================
+# Configuration
+# =========================
+
+MODEL_NAME = "gemini-2.5-flash"
+MAX_CONCURRENCY = 16
+ENGLISH_THRESHOLD = 0.2
+
+ENGLISH_STOPWORDS = frozenset(
+    {
+        "a", "about", "an", "and", "are", "as", "at", "be", "by", "for",
+        "from", "has", "have", "in", "is", "it", "its", "of", "on", "or",
+        "that", "the", "this", "to", "was", "were", "will", "with", "you",
+    }
+)  # fmt: skip
+
+WORD_PATTERN = re.compile(r"[^\W\d_]+")
+
+
+# =========================
+# Type Aliases
+# =========================
+
+type Record = dict[str, Any]
+
+
+# =========================
+# Language Detection
+# =========================
+
+
+def is_probably_english(text: str) -> bool:
+    """
+    Cheap local check that tells whether a text is already in English.
+
+    A text is considered English when it has no non-ASCII letters and a
+    reasonable share of its words are common English stopwords.
+    """
+
+    words = WORD_PATTERN.findall(text.lower())
+    if not words:
+        return True
+
+    if any(not word.isascii() for word in words):
+        return False
+
+    hits = sum(1 for word in words if word in ENGLISH_STOPWORDS)
+    return hits / len(words) >= ENGLISH_THRESHOLD
+
+
+# =========================
+# Pipeline Builder
+# =========================
+
+
+def build_pipeline(llm_en: BaseChatModel | None = None) -> Runnable[Record, str]:
+    """Create the translate → summarize pipeline with an English fast path."""
+
+    if llm_en is None:
+        # Imported here: the provider package dominates the script's startup time.
+        from langchain_google_genai import ChatGoogleGenerativeAI
+
+        llm_en = ChatGoogleGenerativeAI(
+            model=MODEL_NAME,
+            temperature=0,
+        )
+
+    template_translate = PromptTemplate(
+        input_variables=["initial_text"],
+        template="Translate the following text to English:\n ```{initial_text}```",
+    )
+
+    template_summary = PromptTemplate(
+        input_variables=["text"],
+        template="Summarize the following text in 4 words:\n ```{text}```",
+    )
+
+    translate: Runnable[Record, str] = template_translate | llm_en | StrOutputParser()
+    maybe_translate: Runnable[Record, str] = RunnableBranch(
+        (
+            lambda payload: is_probably_english(payload["initial_text"]),
+            lambda payload: payload["initial_text"],
+        ),
+        translate,
+    )
+
+    return (
+        RunnableParallel[Record](text=maybe_translate)
+        | template_summary
+        | llm_en
+        | StrOutputParser()
+    )
+
+
+# =========================
+# Input / Output
+# =========================
+
+
+def read_records(path: Path) -> Iterator[Record]:
+    """Stream records from a JSONL file, assigning line numbers as fallback IDs."""
+
+    with path.open(encoding="utf-8") as file:
+        for line_number, line in enumerate(file, start=1):
+            if not line.strip():
+                continue
+
+            record = json.loads(line)
+            record.setdefault("id", line_number)
+            yield record
+
+
+def load_completed_ids(path: Path) -> set[str]:
+    """Collect the IDs already written successfully to the output file."""
+
+    if not path.exists():
+        return set()
+
+    completed: set[str] = set()
+    with path.open(encoding="utf-8") as file:
+        for line in file:
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                # Last line of an interrupted run may be partially written.
+                continue
+
+            if "error" not in record:
+                completed.add(str(record["id"]))
+
+    return completed
+
+
+def write_result(sink: IO[str], record: Record, result: str | BaseException) -> None:
+    """Append one output line for a record and flush it to disk."""
+
+    if isinstance(result, BaseException):
+        line = {"id": record["id"], "error": repr(result)}
+    else:
+        line = {"id": record["id"], "summary": result}
+    sink.write(json.dumps(line, ensure_ascii=False) + "\n")
+    sink.flush()
+
+
+# =========================
+# Batch Runners
+# =========================
+
+
+def pending_records(input_path: Path, output_path: Path) -> Iterator[Record]:
+    """Yield the records that are not yet in the output file."""
+
+    completed = load_completed_ids(output_path)
+    return (
+        record
+        for record in read_records(input_path)
+        if str(record["id"]) not in completed
+    )
+
+
+def run_batch(
+    pipeline: Runnable[Record, str],
+    input_path: Path,
+    output_path: Path,
+    max_concurrency: int = MAX_CONCURRENCY,
+) -> int:
+    """
+    Process the input file on a thread pool.
+
+    A sliding window keeps `max_concurrency` records in flight: a slow record
+    only holds its own slot, and results are written in completion order.
+    """
+
+    processed = 0
+    in_flight: dict[Future[str], Record] = {}
+
+    with (
+        output_path.open("a", encoding="utf-8") as sink,
+        ThreadPoolExecutor(max_workers=max_concurrency) as pool,
+    ):
+
+        def drain(done: set[Future[str]]) -> None:
+            nonlocal processed
+            for future in done:
+                write_result(
+                    sink, in_flight.pop(future), future.exception() or future.result()
+                )
+                processed += 1
+
+        for record in pending_records(input_path, output_path):
+            if len(in_flight) >= max_concurrency:
+                drain(wait(in_flight, return_when=FIRST_COMPLETED).done)
+            future = pool.submit(
+                pipeline.invoke, {"initial_text": record["initial_text"]}
+            )
+            in_flight[future] = record
+        drain(wait(in_flight).done)
+
+    return processed
+
+
+async def arun_batch(
+    pipeline: Runnable[Record, str],
+    input_path: Path,
+    output_path: Path,
+    max_concurrency: int = MAX_CONCURRENCY,
+) -> int:
+    """Process the input file with asyncio tasks, using the same sliding window."""
+
+    processed = 0
+    in_flight: dict[asyncio.Task[str], Record] = {}
+
+    with output_path.open("a", encoding="utf-8") as sink:
+
+        def drain(done: set[asyncio.Task[str]]) -> None:
+            nonlocal processed
+            for task in done:
+                write_result(
+                    sink, in_flight.pop(task), task.exception() or task.result()
+                )
+                processed += 1
+
+        for record in pending_records(input_path, output_path):
+            if len(in_flight) >= max_concurrency:
+                done, _ = await asyncio.wait(
+                    in_flight, return_when=asyncio.FIRST_COMPLETED
+                )
+                drain(done)
+            task = asyncio.create_task(
+                pipeline.ainvoke({"initial_text": record["initial_text"]})
+            )
+            in_flight[task] = record
+        if in_flight:
+            drain((await asyncio.wait(in_flight))[0])
+
+    return processed
+
+
+# =========================
+# Entrypoint
+# =========================
+
+
+def parse_args() -> argparse.Namespace:
+    """Parse command line arguments."""
+
+    parser = argparse.ArgumentParser(description="Batch translate → summarize pipeline")
+    parser.add_argument("input", type=Path, help="JSONL file with initial_text")
+    parser.add_argument("output", type=Path, help="JSONL file for the summaries")
+    parser.add_argument("--max-concurrency", type=int, default=MAX_CONCURRENCY)
+    parser.add_argument("--async", dest="use_async", action="store_true")
+
+    return parser.parse_args()
+
+
+def main() -> None:
+    """Main entrypoint for the application."""
+
+    load_dotenv()
+    args = parse_args()
+    pipeline = build_pipeline()
+
+    if args.use_async:
+        processed = asyncio.run(
+            arun_batch(
+                pipeline,
+                args.input,
+                args.output,
+                args.max_concurrency,
+            )
+        )
+    else:
+        processed = run_batch(
+            pipeline,
+            args.input,
+            args.output,
+            args.max_concurrency,
+        )
+
+    print(f"Processed {processed} records into {args.output}.")
+
+
+if __name__ == "__main__":
+    main()
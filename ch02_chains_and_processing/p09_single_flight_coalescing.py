@@ -0,0 +1,392 @@
+"""
+Single-Flight Request Coalescing
+--------------------------------
+
+Wrappers for chat models and embeddings that let concurrent identical
+requests share a single upstream call:
+- The first caller for a given request key (leader) performs the call
+- Callers arriving while it is in flight (followers) wait for its result
+- Works for thread-based (`invoke`/`batch`) and asyncio (`ainvoke`) callers
+
+Nothing is cached after the call completes, so later requests always reach
+the provider again. Running this script executes an offline benchmark with
+a fake chat model and fake embeddings under a synthetic burst.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import threading
+import time
+from collections.abc import Awaitable, Callable
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Any
+
+from langchain_core.callbacks import (
+    AsyncCallbackManagerForLLMRun,
+    CallbackManagerForLLMRun,
+)
+from langchain_core.embeddings import Embeddings
+from langchain_core.language_models import BaseChatModel
+from langchain_core.load import dumps
+from langchain_core.messages import AIMessage, BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+from langchain_core.prompts import PromptTemplate
+from pydantic import PrivateAttr
+
+# =========================
+# Configuration
+# =========================
+
+BURST_SIZE = 64
+UPSTREAM_LATENCY_SECONDS = 0.2
+EMBEDDING_SIZE = 8
+
+
+# =========================
+# Single-Flight Core
+# =========================
+
+
+@dataclass
+class FlightStats:
+    """Counters describing how many calls were executed or shared."""
+
+    leaders: int = 0
+    followers: int = 0
+
+
+class SingleFlight[T]:
+    """
+    Deduplicate concurrent calls that share the same key.
+
+    Sync callers are coordinated with a `concurrent.futures.Future`; async
+    callers share an `asyncio.Task` on their own event loop.
+    """
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._calls: dict[str, Future[T]] = {}
+        self._tasks: dict[tuple[int, str], asyncio.Task[T]] = {}
+        self.stats = FlightStats()
+
+    def do(self, key: str, fn: Callable[[], T]) -> T:
+        """Run `fn` once for all threads concurrently asking for `key`."""
+
+        with self._lock:
+            future = self._calls.get(key)
+            is_leader = future is None
+            if future is None:
+                future = self._calls[key] = Future()
+                self.stats.leaders += 1
+            else:
+                self.stats.followers += 1
+
+        if not is_leader:
+            return future.result()
+
+        try:
+            result = fn()
+        except BaseException as error:
+            self._forget(key)
+            future.set_exception(error)
+            raise
+
+        self._forget(key)
+        future.set_result(result)
+        return result
+
+    async def ado(self, key: str, factory: Callable[[], Awaitable[T]]) -> T:
+        """Await `factory()` once for all tasks concurrently asking for `key`."""
+
+        loop = asyncio.get_running_loop()
+        slot = (id(loop), key)
+
+        with self._lock:
+            task = self._tasks.get(slot)
+            if task is None:
+                task = self._tasks[slot] = loop.create_task(_as_coroutine(factory))
+                task.add_done_callback(lambda _: self._forget_task(slot))
+                self.stats.leaders += 1
+            else:
+                self.stats.followers += 1
+
+        # Shielding keeps one cancelled caller from cancelling everyone else.
+        return await asyncio.shield(task)
+
+    def _forget(self, key: str) -> None:
+        with self._lock:
+            self._calls.pop(key, None)
+
+    def _forget_task(self, slot: tuple[int, str]) -> None:
+        with self._lock:
+            self._tasks.pop(slot, None)
+
+
+async def _as_coroutine[T](factory: Callable[[], Awaitable[T]]) -> T:
+    return await factory()
+
+
+def request_key(**parts: Any) -> str:
+    """Build a stable hash for a request from its serializable parts."""
+
+    payload = dumps(parts, sort_keys=True)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+# =========================
+# Coalescing Wrappers
+# =========================
+
+
+class CoalescingChatModel(BaseChatModel):
+    """Chat model wrapper that coalesces identical in-flight requests."""
+
+    model: BaseChatModel
+    _flight: SingleFlight[AIMessage] = PrivateAttr(default_factory=SingleFlight)
+
+    @property
+    def _llm_type(self) -> str:
+        return f"coalescing-{self.model._llm_type}"
+
+    @property
+    def stats(self) -> FlightStats:
+        """Leader/follower counters for this wrapper."""
+
+        return self._flight.stats
+
+    def _generate(
+        self,
+        messages: list[BaseMessage],
+        stop: list[str] | None = None,
+        run_manager: CallbackManagerForLLMRun | None = None,
+        **kwargs: Any,
+    ) -> ChatResult:
+        key = request_key(messages=messages, stop=stop, kwargs=kwargs)
+        message = self._flight.do(
+            key, lambda: self.model.invoke(messages, stop=stop, **kwargs)
+        )
+
+        return _to_result(message)
+
+    async def _agenerate(
+        self,
+        messages: list[BaseMessage],
+        stop: list[str] | None = None,
+        run_manager: AsyncCallbackManagerForLLMRun | None = None,
+        **kwargs: Any,
+    ) -> ChatResult:
+        key = request_key(messages=messages, stop=stop, kwargs=kwargs)
+        message = await self._flight.ado(
+            key, lambda: self.model.ainvoke(messages, stop=stop, **kwargs)
+        )
+
+        return _to_result(message)
+
+
+def _to_result(message: BaseMessage) -> ChatResult:
+    # Every caller gets its own copy, since callbacks may mutate the message.
+    generation = ChatGeneration(message=message.model_copy(deep=True))
+    return ChatResult(generations=[generation])
+
+
+class CoalescingEmbeddings(Embeddings):
+    """Embeddings wrapper that coalesces identical in-flight requests."""
+
+    def __init__(self, embeddings: Embeddings) -> None:
+        self.embeddings = embeddings
+        self._queries: SingleFlight[list[float]] = SingleFlight()
+        self._documents: SingleFlight[list[list[float]]] = SingleFlight()
+
+    @property
+    def stats(self) -> FlightStats:
+        """Combined leader/follower counters for queries and documents."""
+
+        return FlightStats(
+            leaders=self._queries.stats.leaders + self._documents.stats.leaders,
+            followers=self._queries.stats.followers + self._documents.stats.followers,
+        )
+
+    def embed_query(self, text: str) -> list[float]:
+        vector = self._queries.do(
+            request_key(text=text), lambda: self.embeddings.embed_query(text)
+        )
+        return list(vector)
+
+    def embed_documents(self, texts: list[str]) -> list[list[float]]:
+        vectors = self._documents.do(
+            request_key(texts=texts), lambda: self.embeddings.embed_documents(texts)
+        )
+        return [list(vector) for vector in vectors]
+
+    async def aembed_query(self, text: str) -> list[float]:
+        vector = await self._queries.ado(
+            request_key(text=text), lambda: self.embeddings.aembed_query(text)
+        )
+        return list(vector)
+
+    async def aembed_documents(self, texts: list[str]) -> list[list[float]]:
+        vectors = await self._documents.ado(
+            request_key(texts=texts),
+            lambda: self.embeddings.aembed_documents(texts),
+        )
+        return [list(vector) for vector in vectors]
+
+
+# =========================
+# Fake Upstream Providers
+# =========================
+
+
+class CountingFakeChatModel(BaseChatModel):
+    """Fake chat model that sleeps like a provider and counts its calls."""
+
+    latency: float = UPSTREAM_LATENCY_SECONDS
+    calls: int = 0
+    _lock: threading.Lock = PrivateAttr(default_factory=threading.Lock)
+
+    @property
+    def _llm_type(self) -> str:
+        return "counting-fake-chat-model"
+
+    def _count(self) -> AIMessage:
+        with self._lock:
+            self.calls += 1
+        return AIMessage(content="Why did Higor cross the road?")
+
+    def _generate(
+        self,
+        messages: list[BaseMessage],
+        stop: list[str] | None = None,
+        run_manager: CallbackManagerForLLMRun | None = None,
+        **kwargs: Any,
+    ) -> ChatResult:
+        time.sleep(self.latency)
+        return ChatResult(generations=[ChatGeneration(message=self._count())])
+
+    async def _agenerate(
+        self,
+        messages: list[BaseMessage],
+        stop: list[str] | None = None,
+        run_manager: AsyncCallbackManagerForLLMRun | None = None,
+        **kwargs: Any,
+    ) -> ChatResult:
+        await asyncio.sleep(self.latency)
+        return ChatResult(generations=[ChatGeneration(message=self._count())])
+
+
+class CountingFakeEmbeddings(Embeddings):
+    """Fake embeddings that sleep like a provider and count their calls."""
+
+    def __init__(self, latency: float = UPSTREAM_LATENCY_SECONDS) -> None:
+        self.latency = latency
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def _vector(self, text: str) -> list[float]:
+        digest = hashlib.sha256(text.encode("utf-8")).digest()
+        return [byte / 255 for byte in digest[:EMBEDDING_SIZE]]
+
+    def embed_documents(self, texts: list[str]) -> list[list[float]]:
+        time.sleep(self.latency)
+        with self._lock:
+            self.calls += 1
+        return [self._vector(text) for text in texts]
+
+    def embed_query(self, text: str) -> list[float]:
+        return self.embed_documents([text])[0]
+
+
+# =========================
+# Benchmark
+# =========================
+
+
+def burst_threads(fn: Callable[[], Any], size: int) -> float:
+    """Fire `size` simultaneous calls from a thread pool and time them."""
+
+    barrier = threading.Barrier(size)
+
+    def worker() -> Any:
+        barrier.wait()
+        return fn()
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=size) as pool:
+        for future in [pool.submit(worker) for _ in range(size)]:
+            future.result()
+
+    return time.perf_counter() - start
+
+
+def burst_async(fn: Callable[[], Awaitable[Any]], size: int) -> float:
+    """Fire `size` simultaneous calls on one event loop and time them."""
+
+    async def run() -> None:
+        await asyncio.gather(*(fn() for _ in range(size)))
+
+    start = time.perf_counter()
+    asyncio.run(run())
+    return time.perf_counter() - start
+
+
+def print_row(label: str, upstream_calls: int, elapsed: float) -> None:
+    """Print one benchmark result line."""
+
+    print(f"{label:<32} upstream calls: {upstream_calls:>4}   wall: {elapsed:.3f}s")
+
+
+def run_benchmark(size: int = BURST_SIZE) -> None:
+    """Compare upstream calls with and without coalescing under a burst."""
+
+    question_template = PromptTemplate(
+        input_variables=["name"],
+        template="Hi, I'm {name}! Tell me a joke with my name!",
+    )
+    payload = {"name": "Higor"}
+
+    print(f"Synthetic burst of {size} identical requests\n")
+
+    for mode in ("threads", "asyncio"):
+        for coalesce in (False, True):
+            upstream = CountingFakeChatModel()
+            model = CoalescingChatModel(model=upstream) if coalesce else upstream
+            chain = question_template | model
+
+            if mode == "threads":
+                elapsed = burst_threads(lambda: chain.invoke(payload), size)
+            else:
+                elapsed = burst_async(lambda: chain.ainvoke(payload), size)
+
+            label = f"chat / {mode} / {'coalesced' if coalesce else 'baseline'}"
+            print_row(label, upstream.calls, elapsed)
+
+    query = "Tell me more about the gpt-5 thinking evaluation"
+    for coalesce in (False, True):
+        upstream_embeddings = CountingFakeEmbeddings()
+        embeddings: Embeddings = (
+            CoalescingEmbeddings(upstream_embeddings)
+            if coalesce
+            else upstream_embeddings
+        )
+
+        elapsed = burst_threads(lambda: embeddings.embed_query(query), size)
+        label = f"embeddings / threads / {'coalesced' if coalesce else 'baseline'}"
+        print_row(label, upstream_embeddings.calls, elapsed)
+
+
+# =========================
+# Entrypoint
+# =========================
+
+
+def main() -> None:
+    """Main entrypoint for the application."""
+
+    run_benchmark()
+
+
+if __name__ == "__main__":
+    main()
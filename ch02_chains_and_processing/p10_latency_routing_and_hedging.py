@@ -0,0 +1,523 @@
+"""
+Latency-Based Routing and Hedged Requests
+-----------------------------------------
+
+Chat model wrapper that spreads requests across several providers
+(e.g. Gemini and OpenAI):
+- Tracks rolling per-model latency percentiles (p50/p95/p99)
+- Sends each request to the fastest healthy model
+- Optionally fires a hedged request to the next model once the primary
+  exceeds its own p95 latency, keeping the first answer to arrive
+- Falls back to the next model when a call fails, and benches models that
+  fail repeatedly for a short cooldown
+
+Async callers get real cancellation of the losing request; its latency is
+only known to be above the time it ran, so it is recorded as a censored
+sample. Sync callers run both requests in a thread pool; the losing thread
+cannot be interrupted, so it finishes in the background and only feeds the
+latency statistics. Failed calls never enter the latency window.
+
+Running this script compares single-model, routed and hedged latencies
+offline, using fake models with programmable latency distributions.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import random
+import threading
+import time
+from collections import deque
+from collections.abc import Callable, Sequence
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from typing import Any
+
+from langchain_core.callbacks import (
+    AsyncCallbackManagerForLLMRun,
+    CallbackManagerForLLMRun,
+)
+from langchain_core.language_models import BaseChatModel
+from langchain_core.messages import AIMessage, BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+from pydantic import PrivateAttr
+
+# =========================
+# Configuration
+# =========================
+
+LATENCY_WINDOW = 200
+MIN_SAMPLES = 20
+DEFAULT_HEDGE_DELAY_SECONDS = 1.0
+MAX_CONSECUTIVE_FAILURES = 3
+FAILURE_COOLDOWN_SECONDS = 30.0
+MAX_WORKERS = 32
+
+DEMO_REQUESTS = 300
+DEMO_CONCURRENCY = 16
+
+
+# =========================
+# Latency Tracking
+# =========================
+
+
+def percentile(samples: Sequence[float], q: float) -> float:
+    """Nearest-rank percentile of `samples`, with `q` in the [0, 1] range."""
+
+    if not samples:
+        return 0.0
+
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, max(0, round(q * len(ordered)) - 1))
+    return ordered[index]
+
+
+class LatencyTracker:
+    """Rolling latency window and health state for a single model."""
+
+    def __init__(self, window: int = LATENCY_WINDOW) -> None:
+        self._samples: deque[float] = deque(maxlen=window)
+        self._lock = threading.Lock()
+        self.failures = 0
+        self.cancelled = 0
+        self.benched_until = 0.0
+
+    def record_success(self, latency: float) -> None:
+        with self._lock:
+            self._samples.append(latency)
+            self.failures = 0
+
+    def record_failure(self) -> None:
+        """Count a failed call; its latency says nothing about a real answer."""
+
+        with self._lock:
+            self.failures += 1
+            if self.failures >= MAX_CONSECUTIVE_FAILURES:
+                self.benched_until = time.monotonic() + FAILURE_COOLDOWN_SECONDS
+
+    def record_cancelled(self, elapsed: float) -> None:
+        """
+        Record a request that lost a hedge race.
+
+        Its real latency is unknown, only that it is above `elapsed`, and it
+        was cut off because it ran past the hedge delay. The sample is
+        censored to at least the current p95 so the tail is not erased.
+        """
+
+        with self._lock:
+            floor = percentile(self._samples, 0.95)
+            self._samples.append(max(elapsed, floor))
+            self.cancelled += 1
+
+    @property
+    def healthy(self) -> bool:
+        return time.monotonic() >= self.benched_until
+
+    @property
+    def sample_count(self) -> int:
+        return len(self._samples)
+
+    def percentile(self, q: float) -> float:
+        with self._lock:
+            samples = list(self._samples)
+        return percentile(samples, q)
+
+
+# =========================
+# Routing Chat Model
+# =========================
+
+
+class RoutingChatModel(BaseChatModel):
+    """Route each request to the fastest healthy model, with optional hedging."""
+
+    models: list[BaseChatModel]
+    hedge: bool = False
+    hedge_percentile: float = 0.95
+    max_workers: int = MAX_WORKERS
+    hedges_fired: int = 0
+
+    _trackers: list[LatencyTracker] = PrivateAttr(default_factory=list)
+    _executor: ThreadPoolExecutor | None = PrivateAttr(default=None)
+    _lock: threading.Lock = PrivateAttr(default_factory=threading.Lock)
+
+    def model_post_init(self, context: Any) -> None:
+        self._trackers = [LatencyTracker() for _ in self.models]
+
+    @property
+    def _llm_type(self) -> str:
+        return "latency-routing-chat-model"
+
+    # ---------- Ranking ----------
+
+    def ranked(self) -> list[int]:
+        """
+        Model indexes ordered from the best to the worst candidate.
+
+        Healthy models come first. Models without enough samples are tried
+        before the others so every provider gets warmed up, then models are
+        ordered by their rolling median latency.
+        """
+
+        def score(index: int) -> tuple[bool, bool, float]:
+            tracker = self._trackers[index]
+            return (
+                not tracker.healthy,
+                tracker.sample_count >= MIN_SAMPLES,
+                tracker.percentile(0.5),
+            )
+
+        return sorted(range(len(self.models)), key=score)
+
+    def hedge_delay(self, index: int) -> float:
+        """How long to wait on a model before hedging to the next one."""
+
+        tracker = self._trackers[index]
+        if tracker.sample_count < MIN_SAMPLES:
+            return DEFAULT_HEDGE_DELAY_SECONDS
+
+        return tracker.percentile(self.hedge_percentile)
+
+    def latency_report(self) -> dict[str, dict[str, float]]:
+        """Current p50/p95/p99 latencies (in seconds) per model."""
+
+        return {
+            model_label(model): {
+                "p50": tracker.percentile(0.50),
+                "p95": tracker.percentile(0.95),
+                "p99": tracker.percentile(0.99),
+                "cancelled": tracker.cancelled,
+            }
+            for model, tracker in zip(self.models, self._trackers, strict=True)
+        }
+
+    def _count_hedge(self) -> None:
+        with self._lock:
+            self.hedges_fired += 1
+
+    # ---------- Sync path ----------
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.max_workers)
+            return self._executor
+
+    def _timed_invoke(
+        self,
+        index: int,
+        messages: list[BaseMessage],
+        stop: list[str] | None,
+        **kwargs: Any,
+    ) -> BaseMessage:
+        tracker = self._trackers[index]
+        start = time.perf_counter()
+        try:
+            message = self.models[index].invoke(messages, stop=stop, **kwargs)
+        except Exception:
+            tracker.record_failure()
+            raise
+
+        tracker.record_success(time.perf_counter() - start)
+        return message
+
+    def _generate(
+        self,
+        messages: list[BaseMessage],
+        stop: list[str] | None = None,
+        run_manager: CallbackManagerForLLMRun | None = None,
+        **kwargs: Any,
+    ) -> ChatResult:
+        executor = self._get_executor()
+        candidates = self.ranked()
+        hedges_left = 1 if self.hedge else 0
+        pending: dict[Future[BaseMessage], int] = {}
+        last_error: BaseException | None = None
+
+        def launch() -> None:
+            index = candidates.pop(0)
+            future = executor.submit(
+                self._timed_invoke, index, messages, stop, **kwargs
+            )
+            pending[future] = index
+
+        launch()
+        while pending:
+            can_hedge = hedges_left > 0 and bool(candidates)
+            timeout = self.hedge_delay(next(iter(pending.values())))
+            done, _ = wait(
+                pending,
+                timeout=timeout if can_hedge else None,
+                return_when=FIRST_COMPLETED,
+            )
+
+            if not done:
+                hedges_left -= 1
+                self._count_hedge()
+                launch()
+                continue
+
+            for future in done:
+                pending.pop(future)
+                error = future.exception()
+                if error is None:
+                    for loser in pending:
+                        loser.cancel()
+                    return _to_result(future.result())
+                last_error = error
+
+            if not pending and candidates:
+                launch()
+
+        assert last_error is not None
+        raise last_error
+
+    # ---------- Async path ----------
+
+    async def _atimed_invoke(
+        self,
+        index: int,
+        messages: list[BaseMessage],
+        stop: list[str] | None,
+        **kwargs: Any,
+    ) -> BaseMessage:
+        tracker = self._trackers[index]
+        start = time.perf_counter()
+        try:
+            message = await self.models[index].ainvoke(messages, stop=stop, **kwargs)
+        except asyncio.CancelledError:
+            tracker.record_cancelled(time.perf_counter() - start)
+            raise
+        except Exception:
+            tracker.record_failure()
+            raise
+
+        tracker.record_success(time.perf_counter() - start)
+        return message
+
+    async def _agenerate(
+        self,
+        messages: list[BaseMessage],
+        stop: list[str] | None = None,
+        run_manager: AsyncCallbackManagerForLLMRun | None = None,
+        **kwargs: Any,
+    ) -> ChatResult:
+        candidates = self.ranked()
+        hedges_left = 1 if self.hedge else 0
+        pending: dict[asyncio.Task[BaseMessage], int] = {}
+        last_error: BaseException | None = None
+
+        def launch() -> None:
+            index = candidates.pop(0)
+            task = asyncio.create_task(
+                self._atimed_invoke(index, messages, stop, **kwargs)
+            )
+            pending[task] = index
+
+        launch()
+        try:
+            while pending:
+                can_hedge = hedges_left > 0 and bool(candidates)
+                timeout = self.hedge_delay(next(iter(pending.values())))
+                done, _ = await asyncio.wait(
+                    pending,
+                    timeout=timeout if can_hedge else None,
+                    return_when=asyncio.FIRST_COMPLETED,
+                )
+
+                if not done:
+                    hedges_left -= 1
+                    self._count_hedge()
+                    launch()
+                    continue
+
+                for task in done:
+                    pending.pop(task)
+                    error = task.exception()
+                    if error is None:
+                        return _to_result(task.result())
+                    last_error = error
+
+                if not pending and candidates:
+                    launch()
+        finally:
+            for loser in pending:
+                loser.cancel()
+
+        assert last_error is not None
+        raise last_error
+
+
+def _to_result(message: BaseMessage) -> ChatResult:
+    return ChatResult(generations=[ChatGeneration(message=message)])
+
+
+def model_label(model: BaseChatModel) -> str:
+    """Human readable name for a wrapped model."""
+
+    return (
+        getattr(model, "model_name", None)
+        or getattr(model, "model", None)
+        or model.get_name()
+    )
+
+
+def build_router(hedge: bool = True) -> RoutingChatModel:
+    """Create a router over the Gemini and OpenAI models used in the project."""
+
+    from langchain_google_genai import ChatGoogleGenerativeAI
+    from langchain_openai import ChatOpenAI
+
+    return RoutingChatModel(
+        models=[
+            ChatGoogleGenerativeAI(model="gemini-2.5-flash", temperature=0.5),
+            ChatOpenAI(model="gpt-5-nano", temperature=0.5),
+        ],
+        hedge=hedge,
+    )
+
+
+# =========================
+# Fake Models
+# =========================
+
+
+def latency_distribution(
+    median: float,
+    spread: float = 0.25,
+    slow_probability: float = 0.0,
+    slow_latency: float = 0.0,
+    seed: int = 0,
+) -> Callable[[], float]:
+    """
+    Build a latency sampler: log-normal around `median`, plus rare slow calls.
+    """
+
+    rng = random.Random(seed)
+
+    def sample() -> float:
+        if rng.random() < slow_probability:
+            return slow_latency
+        return median * rng.lognormvariate(0, spread)
+
+    return sample
+
+
+class LatencyFakeChatModel(BaseChatModel):
+    """Offline chat model whose latency follows a programmable distribution."""
+
+    sampler: Callable[[], float]
+    failure_probability: float = 0.0
+    reply: str = "OK"
+
+    @property
+    def _llm_type(self) -> str:
+        return "latency-fake-chat-model"
+
+    def _reply(self) -> ChatResult:
+        if random.random() < self.failure_probability:
+            raise RuntimeError(f"{self.get_name()} is unavailable")
+
+        message = AIMessage(content=f"{self.reply} from {self.get_name()}")
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+    def _generate(
+        self,
+        messages: list[BaseMessage],
+        stop: list[str] | None = None,
+        run_manager: CallbackManagerForLLMRun | None = None,
+        **kwargs: Any,
+    ) -> ChatResult:
+        time.sleep(self.sampler())
+        return self._reply()
+
+    async def _agenerate(
+        self,
+        messages: list[BaseMessage],
+        stop: list[str] | None = None,
+        run_manager: AsyncCallbackManagerForLLMRun | None = None,
+        **kwargs: Any,
+    ) -> ChatResult:
+        await asyncio.sleep(self.sampler())
+        return self._reply()
+
+
+def build_fake_models() -> list[BaseChatModel]:
+    """A fast but spiky provider and a slightly slower, steady one."""
+
+    return [
+        LatencyFakeChatModel(
+            name="gemini-2.5-flash",
+            sampler=latency_distribution(
+                median=0.02, slow_probability=0.05, slow_latency=0.5, seed=1
+            ),
+        ),
+        LatencyFakeChatModel(
+            name="gpt-5-nano",
+            sampler=latency_distribution(median=0.03, spread=0.1, seed=2),
+        ),
+    ]
+
+
+# =========================
+# Demo Runner
+# =========================
+
+
+async def measure(model: BaseChatModel, requests: int) -> list[float]:
+    """Send `requests` prompts with bounded concurrency and collect latencies."""
+
+    semaphore = asyncio.Semaphore(DEMO_CONCURRENCY)
+
+    async def one() -> float:
+        async with semaphore:
+            start = time.perf_counter()
+            await model.ainvoke("Hello World")
+            return time.perf_counter() - start
+
+    return await asyncio.gather(*(one() for _ in range(requests)))
+
+
+def run_demo() -> None:
+    """Compare client-side latency percentiles across routing strategies."""
+
+    strategies: list[tuple[str, BaseChatModel]] = [
+        ("single model (gemini)", build_fake_models()[0]),
+        ("routed", RoutingChatModel(models=build_fake_models())),
+        ("routed + hedged", RoutingChatModel(models=build_fake_models(), hedge=True)),
+    ]
+
+    for label, model in strategies:
+        latencies = asyncio.run(measure(model, DEMO_REQUESTS))
+        summary = "  ".join(
+            f"p{int(q * 100)}={percentile(latencies, q) * 1000:6.1f}ms"
+            for q in (0.5, 0.95, 0.99)
+        )
+        print(f"{label:<24} {summary}")
+
+        if isinstance(model, RoutingChatModel):
+            print(f"{'':<24} hedges fired: {model.hedges_fired}")
+            for name, stats in model.latency_report().items():
+                cancelled = int(stats.pop("cancelled"))
+                rolling = "  ".join(
+                    f"{key}={value * 1000:6.1f}ms" for key, value in stats.items()
+                )
+                rolling += f"  cancelled={cancelled}"
+                if cancelled:
+                    rolling += " (tail percentiles are lower bounds)"
+                print(f"{'':<24} {name:<18} {rolling}")
+
+
+# =========================
+# Entrypoint
+# =========================
+
+
+def main() -> None:
+    """Main entrypoint for the application."""
+
+    run_demo()
+
+
+if __name__ == "__main__":
+    main()
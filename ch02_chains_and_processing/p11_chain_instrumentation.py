@@ -0,0 +1,537 @@
+"""
+Per-Stage Chain Instrumentation
+-------------------------------
+
+Callback handler that measures every Runnable step of a chain:
+- Wall time (start → end of the step)
+- Queue time (gap between the moment the step could have started, i.e. its
+  parent started or its previous sibling finished, and its actual start)
+- Input/output tokens reported by chat models
+- Model cache hits (LangChain zeroes `total_cost` on cached generations)
+
+Samples are folded into fixed-bucket histograms per step name, so memory
+does not grow with traffic and recording costs a dict lookup plus a bisect.
+Aggregates expose p50/p95/p99 and can be exported as JSON or served in the
+Prometheus text format from a local HTTP endpoint.
+
+Step names come from the Runnable name; use `.with_config(run_name=...)` to
+give anonymous lambdas a readable name.
+
+Running this script instruments the ch02 translate → summarize and
+map-reduce pipelines with fake models and prints the per-step breakdown.
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import threading
+import time
+from bisect import bisect_left
+from dataclasses import dataclass, field
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Any
+from uuid import UUID
+
+from langchain_core.callbacks import BaseCallbackHandler, CallbackManagerForLLMRun
+from langchain_core.documents import Document
+from langchain_core.language_models import BaseChatModel
+from langchain_core.messages import AIMessage, BaseMessage
+from langchain_core.output_parsers import StrOutputParser
+from langchain_core.outputs import ChatGeneration, ChatResult, LLMResult
+from langchain_core.prompts import PromptTemplate
+from langchain_core.runnables import RunnableConfig, RunnableLambda, RunnableParallel
+
+# =========================
+# Configuration
+# =========================
+
+# Exponential buckets from 0.1ms up to ~105s.
+DEFAULT_BUCKETS: tuple[float, ...] = tuple(0.0001 * 2**i for i in range(21))
+QUANTILES: tuple[float, ...] = (0.5, 0.95, 0.99)
+METRIC_PREFIX = "langchain_step"
+
+DEMO_RUNS = 50
+DEMO_LATENCY_SECONDS = 0.005
+
+
+# =========================
+# Histograms
+# =========================
+
+
+class Histogram:
+    """Fixed-bucket latency histogram with interpolated quantiles."""
+
+    def __init__(self, buckets: tuple[float, ...] = DEFAULT_BUCKETS) -> None:
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.total = 0.0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.total += value
+
+    def quantile(self, q: float) -> float:
+        """Estimate the `q` quantile by interpolating inside its bucket."""
+
+        if not self.count:
+            return 0.0
+
+        rank = q * self.count
+        seen = 0
+        for index, bucket_count in enumerate(self.counts):
+            if seen + bucket_count >= rank and bucket_count:
+                lower = self.buckets[index - 1] if index else 0.0
+                upper = self.buckets[index] if index < len(self.buckets) else lower * 2
+                return lower + (upper - lower) * (rank - seen) / bucket_count
+            seen += bucket_count
+
+        return self.buckets[-1]
+
+    def summary(self) -> dict[str, float]:
+        return {
+            "count": self.count,
+            "mean": self.total / self.count if self.count else 0.0,
+            **{f"p{int(q * 100)}": self.quantile(q) for q in QUANTILES},
+        }
+
+
+@dataclass
+class StepStats:
+    """Aggregated measurements for every run of a single step name."""
+
+    wall: Histogram = field(default_factory=Histogram)
+    queue: Histogram = field(default_factory=Histogram)
+    errors: int = 0
+    input_tokens: int = 0
+    output_tokens: int = 0
+    cache_hits: int = 0
+
+
+@dataclass
+class _OpenRun:
+    name: str
+    parent_run_id: UUID | None
+    started_at: float
+    queued: float
+    last_child_end: float = 0.0
+
+
+# =========================
+# Callback Handler
+# =========================
+
+
+class ChainInstrumentation(BaseCallbackHandler):
+    """Record wall time, queue time, tokens and cache hits per Runnable step."""
+
+    # Run in the caller's thread/task instead of hopping to an executor.
+    run_inline = True
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._open: dict[UUID, _OpenRun] = {}
+        self.steps: dict[str, StepStats] = {}
+
+    # ---------- Recording ----------
+
+    def _start(
+        self,
+        serialized: dict[str, Any] | None,
+        run_id: UUID,
+        parent_run_id: UUID | None,
+        kwargs: dict[str, Any],
+    ) -> None:
+        name = kwargs.get("name") or (serialized or {}).get("name") or "unknown"
+        now = time.perf_counter()
+
+        with self._lock:
+            parent = self._open.get(parent_run_id) if parent_run_id else None
+            ready_at = now
+            if parent is not None:
+                ready_at = max(parent.started_at, parent.last_child_end)
+
+            self._open[run_id] = _OpenRun(
+                name, parent_run_id, now, max(0.0, now - ready_at)
+            )
+
+    def _end(
+        self,
+        run_id: UUID,
+        error: bool = False,
+        input_tokens: int = 0,
+        output_tokens: int = 0,
+        cache_hit: bool = False,
+    ) -> None:
+        now = time.perf_counter()
+
+        with self._lock:
+            run = self._open.pop(run_id, None)
+            if run is None:
+                return
+
+            parent = self._open.get(run.parent_run_id) if run.parent_run_id else None
+            if parent is not None:
+                parent.last_child_end = max(parent.last_child_end, now)
+
+            stats = self.steps.get(run.name)
+            if stats is None:
+                stats = self.steps[run.name] = StepStats()
+
+            stats.wall.observe(now - run.started_at)
+            stats.queue.observe(run.queued)
+            stats.errors += error
+            stats.input_tokens += input_tokens
+            stats.output_tokens += output_tokens
+            stats.cache_hits += cache_hit
+
+    # ---------- Chains, tools and retrievers ----------
+
+    def on_chain_start(
+        self,
+        serialized: dict[str, Any],
+        inputs: Any,
+        *,
+        run_id: UUID,
+        parent_run_id: UUID | None = None,
+        **kwargs: Any,
+    ) -> None:
+        self._start(serialized, run_id, parent_run_id, kwargs)
+
+    def on_chain_end(self, outputs: Any, *, run_id: UUID, **kwargs: Any) -> None:
+        self._end(run_id)
+
+    def on_chain_error(
+        self, error: BaseException, *, run_id: UUID, **kwargs: Any
+    ) -> None:
+        self._end(run_id, error=True)
+
+    def on_tool_start(
+        self,
+        serialized: dict[str, Any],
+        input_str: str,
+        *,
+        run_id: UUID,
+        parent_run_id: UUID | None = None,
+        **kwargs: Any,
+    ) -> None:
+        self._start(serialized, run_id, parent_run_id, kwargs)
+
+    def on_tool_end(self, output: Any, *, run_id: UUID, **kwargs: Any) -> None:
+        self._end(run_id)
+
+    def on_tool_error(
+        self, error: BaseException, *, run_id: UUID, **kwargs: Any
+    ) -> None:
+        self._end(run_id, error=True)
+
+    def on_retriever_start(
+        self,
+        serialized: dict[str, Any],
+        query: str,
+        *,
+        run_id: UUID,
+        parent_run_id: UUID | None = None,
+        **kwargs: Any,
+    ) -> None:
+        self._start(serialized, run_id, parent_run_id, kwargs)
+
+    def on_retriever_end(self, documents: Any, *, run_id: UUID, **kwargs: Any) -> None:
+        self._end(run_id)
+
+    def on_retriever_error(
+        self, error: BaseException, *, run_id: UUID, **kwargs: Any
+    ) -> None:
+        self._end(run_id, error=True)
+
+    # ---------- Models ----------
+
+    def on_llm_start(
+        self,
+        serialized: dict[str, Any],
+        prompts: list[str],
+        *,
+        run_id: UUID,
+        parent_run_id: UUID | None = None,
+        **kwargs: Any,
+    ) -> None:
+        self._start(serialized, run_id, parent_run_id, kwargs)
+
+    def on_chat_model_start(
+        self,
+        serialized: dict[str, Any],
+        messages: list[list[BaseMessage]],
+        *,
+        run_id: UUID,
+        parent_run_id: UUID | None = None,
+        **kwargs: Any,
+    ) -> None:
+        self._start(serialized, run_id, parent_run_id, kwargs)
+
+    def on_llm_end(self, response: LLMResult, *, run_id: UUID, **kwargs: Any) -> None:
+        input_tokens, output_tokens, cache_hit = 0, 0, False
+
+        for generations in response.generations:
+            for generation in generations:
+                message = getattr(generation, "message", None)
+                usage = getattr(message, "usage_metadata", None)
+                if not usage:
+                    continue
+                input_tokens += usage.get("input_tokens", 0)
+                output_tokens += usage.get("output_tokens", 0)
+                cache_hit = cache_hit or usage.get("total_cost", None) == 0
+
+        self._end(
+            run_id,
+            input_tokens=input_tokens,
+            output_tokens=output_tokens,
+            cache_hit=cache_hit,
+        )
+
+    def on_llm_error(
+        self, error: BaseException, *, run_id: UUID, **kwargs: Any
+    ) -> None:
+        self._end(run_id, error=True)
+
+    # ---------- Export ----------
+
+    def snapshot(self) -> dict[str, dict[str, Any]]:
+        """Aggregated metrics per step, with latencies in seconds."""
+
+        with self._lock:
+            return {
+                name: {
+                    "wall_seconds": stats.wall.summary(),
+                    "queue_seconds": stats.queue.summary(),
+                    "errors": stats.errors,
+                    "input_tokens": stats.input_tokens,
+                    "output_tokens": stats.output_tokens,
+                    "cache_hits": stats.cache_hits,
+                }
+                for name, stats in self.steps.items()
+            }
+
+    def write_json(self, path: Path) -> None:
+        """Dump the current snapshot to a JSON file."""
+
+        path.write_text(json.dumps(self.snapshot(), indent=2), encoding="utf-8")
+
+    def to_prometheus(self) -> str:
+        """Render all metrics in the Prometheus text exposition format."""
+
+        lines: list[str] = []
+        with self._lock:
+            steps = list(self.steps.items())
+
+            for metric, attribute in (("wall", "wall"), ("queue", "queue")):
+                base = f"{METRIC_PREFIX}_{metric}_seconds"
+                lines.append(f"# TYPE {base} histogram")
+                for name, stats in steps:
+                    histogram: Histogram = getattr(stats, attribute)
+                    cumulative = 0
+                    for bound, count in zip(
+                        histogram.buckets, histogram.counts, strict=False
+                    ):
+                        cumulative += count
+                        lines.append(
+                            f'{base}_bucket{{step="{name}",le="{bound:g}"}} '
+                            f"{cumulative}"
+                        )
+                    lines.append(
+                        f'{base}_bucket{{step="{name}",le="+Inf"}} {histogram.count}'
+                    )
+                    lines.append(f'{base}_sum{{step="{name}"}} {histogram.total}')
+                    lines.append(f'{base}_count{{step="{name}"}} {histogram.count}')
+
+            for counter in ("errors", "input_tokens", "output_tokens", "cache_hits"):
+                base = f"{METRIC_PREFIX}_{counter}_total"
+                lines.append(f"# TYPE {base} counter")
+                for name, stats in steps:
+                    lines.append(f'{base}{{step="{name}"}} {getattr(stats, counter)}')
+
+        return "\n".join(lines) + "\n"
+
+    def serve_prometheus(
+        self, port: int = 9464, host: str = "127.0.0.1"
+    ) -> ThreadingHTTPServer:
+        """Serve `/metrics` from a daemon thread and return the server."""
+
+        instrumentation = self
+
+        class MetricsHandler(BaseHTTPRequestHandler):
+            def do_GET(self) -> None:  # noqa: N802 (http.server API)
+                body = instrumentation.to_prometheus().encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format: str, *args: Any) -> None:
+                return
+
+        server = ThreadingHTTPServer((host, port), MetricsHandler)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        return server
+
+
+# =========================
+# Fake Model
+# =========================
+
+
+class UsageFakeChatModel(BaseChatModel):
+    """Offline chat model that sleeps and reports word-based token usage."""
+
+    latency: float = DEMO_LATENCY_SECONDS
+
+    @property
+    def _llm_type(self) -> str:
+        return "usage-fake-chat-model"
+
+    def _generate(
+        self,
+        messages: list[BaseMessage],
+        stop: list[str] | None = None,
+        run_manager: CallbackManagerForLLMRun | None = None,
+        **kwargs: Any,
+    ) -> ChatResult:
+        time.sleep(self.latency)
+        prompt = " ".join(str(message.content) for message in messages)
+        reply = " ".join(prompt.split()[:4])
+        message = AIMessage(
+            content=reply,
+            usage_metadata={
+                "input_tokens": len(prompt.split()),
+                "output_tokens": len(reply.split()),
+                "total_tokens": len(prompt.split()) + len(reply.split()),
+            },
+        )
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+
+# =========================
+# Demo Runner
+# =========================
+
+
+def run_demo(instrumentation: ChainInstrumentation, runs: int) -> None:
+    """Instrument the ch02 pipelines with fake models."""
+
+    config = RunnableConfig(callbacks=[instrumentation])
+    llm = UsageFakeChatModel()
+
+    # p04_processing_pipeline.py
+    template_translate = PromptTemplate.from_template(
+        "Translate the following text to English:\n ```{initial_text}```"
+    )
+    template_summary = PromptTemplate.from_template(
+        "Summarize the following text in 4 words:\n ```{text}```"
+    )
+    translate = (template_translate | llm | StrOutputParser()).with_config(
+        run_name="translate"
+    )
+    pipeline = (
+        RunnableParallel[dict[str, str]](text=translate)
+        | template_summary
+        | llm
+        | StrOutputParser()
+    )
+
+    # p07_summarizing_pipeline.py
+    map_prompt = PromptTemplate.from_template(
+        "Write a concise summary of the following text:\n{context}"
+    )
+    map_chain = map_prompt | llm | StrOutputParser()
+
+    def to_map_inputs(docs: list[Document]) -> list[dict[str, str]]:
+        return [{"context": d.page_content} for d in docs]
+
+    def to_reduce_input(summaries: list[str]) -> dict[str, str]:
+        return {"context": "\n".join(summaries)}
+
+    prepare_map_inputs = RunnableLambda(to_map_inputs).with_config(
+        run_name="prepare_map_inputs"
+    )
+    map_stage = (prepare_map_inputs | map_chain.map()).with_config(run_name="map_stage")
+    reduce_prompt = PromptTemplate.from_template(
+        "Combine the following summaries into a single concise summary:\n{context}"
+    )
+    reduce_chain = (reduce_prompt | llm | StrOutputParser()).with_config(
+        run_name="reduce_chain"
+    )
+    prepare_reduce_input = RunnableLambda(to_reduce_input).with_config(
+        run_name="prepare_reduce_input"
+    )
+    map_reduce = map_stage | prepare_reduce_input | reduce_chain
+
+    documents = [
+        Document(page_content=f"Dawn threads a pale gold through alley {i}.")
+        for i in range(8)
+    ]
+
+    for _ in range(runs):
+        pipeline.invoke(
+            {"initial_text": "LangChain é um framework para aplicações de IA"},
+            config=config,
+        )
+        map_reduce.invoke(documents, config=config)
+
+
+def print_report(instrumentation: ChainInstrumentation) -> None:
+    """Print p50/p95/p99 wall and queue time per step."""
+
+    print(
+        f"{'step':<28}{'calls':>7}{'wall p50':>11}{'p95':>9}{'p99':>9}"
+        f"{'queue p95':>11}{'tok in':>8}{'tok out':>8}"
+    )
+    for name, stats in instrumentation.snapshot().items():
+        wall, queue = stats["wall_seconds"], stats["queue_seconds"]
+        print(
+            f"{name:<28}{wall['count']:>7}"
+            f"{wall['p50'] * 1000:>9.2f}ms{wall['p95'] * 1000:>7.2f}ms"
+            f"{wall['p99'] * 1000:>7.2f}ms{queue['p95'] * 1000:>9.2f}ms"
+            f"{stats['input_tokens']:>8}{stats['output_tokens']:>8}"
+        )
+
+
+# =========================
+# Entrypoint
+# =========================
+
+
+def main() -> None:
+    """Main entrypoint for the application."""
+
+    parser = argparse.ArgumentParser(description="Per-stage chain instrumentation")
+    parser.add_argument("--runs", type=int, default=DEMO_RUNS)
+    parser.add_argument("--json", type=Path, help="write the snapshot to a file")
+    parser.add_argument("--serve", type=int, metavar="PORT", help="serve /metrics")
+    args = parser.parse_args()
+
+    instrumentation = ChainInstrumentation()
+    if args.serve:
+        instrumentation.serve_prometheus(args.serve)
+
+    run_demo(instrumentation, args.runs)
+    print_report(instrumentation)
+
+    if args.json:
+        instrumentation.write_json(args.json)
+        print(f"\nSnapshot written to {args.json}")
+
+    if args.serve:
+        print(f"\nServing metrics on http://127.0.0.1:{args.serve}/metrics")
+        print("Press Ctrl+C to stop.")
+        try:
+            threading.Event().wait()
+        except KeyboardInterrupt:
+            pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,676 @@
+"""
+Offline Chain Overhead Benchmark
+--------------------------------
+
+Runs the chains from the ch01–ch04 scripts with deterministic fake chat
+models (configurable latency and token throughput) and measures, without
+any network access:
+- Per-invoke framework overhead (fake model with zero latency)
+- `batch` throughput across several `max_concurrency` levels
+- Memory allocated per in-flight request (`abatch` + tracemalloc)
+
+Scripts that expose a chain builder (`p08_processing_pipeline_batch`,
+`p01_react_agent_and_tools`, `p02_history_based_on_sliding_window`) are
+imported and benchmarked as-is. The early ch01/ch02 scripts call their
+model at import time, so their chains are mirrored here.
+
+Every metric is also expressed relative to the bare model call
+(`ch01.p01_hello_world`): measurement rounds of the scenario and of that
+reference alternate, and the ratio of their best rounds is kept.
+Only those ratios are stored in the baseline and compared, so the check does
+not depend on the speed of the machine; the script exits with a non-zero
+status when a ratio regresses beyond the tolerance.
+
+Usage:
+    uv run ch02_chains_and_processing/p12_chain_overhead_benchmark.py
+    uv run ch02_chains_and_processing/p12_chain_overhead_benchmark.py \\
+        --save-baseline
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import gc
+import importlib
+import json
+import platform
+import statistics
+import sys
+import time
+import tracemalloc
+from collections import defaultdict
+from collections.abc import Callable, Generator, Iterator
+from contextlib import AbstractContextManager, closing, contextmanager
+from dataclasses import dataclass
+from pathlib import Path
+from types import ModuleType
+from typing import Any
+
+from langchain_core.callbacks import (
+    AsyncCallbackManagerForLLMRun,
+    CallbackManagerForLLMRun,
+)
+from langchain_core.chat_history import InMemoryChatMessageHistory
+from langchain_core.documents import Document
+from langchain_core.language_models import BaseChatModel
+from langchain_core.messages import AIMessage, BaseMessage
+from langchain_core.output_parsers import StrOutputParser
+from langchain_core.outputs import ChatGeneration, ChatResult
+from langchain_core.prompts import (
+    ChatPromptTemplate,
+    MessagesPlaceholder,
+    PromptTemplate,
+)
+from langchain_core.runnables import (
+    Runnable,
+    RunnableConfig,
+    RunnableLambda,
+    RunnableParallel,
+    RunnableWithMessageHistory,
+    chain,
+)
+
+# ==========================================================
+# Configuration
+# ==========================================================
+
+ROOT = Path(__file__).resolve().parents[1]
+BASELINE_PATH = Path(__file__).resolve().with_name("p12_chain_overhead_baseline.json")
+REFERENCE_SCENARIO = "ch01.p01_hello_world"
+REGRESSION_TOLERANCE = 0.25
+
+OVERHEAD_WARMUP = 20
+OVERHEAD_ITERATIONS = 200
+MEASUREMENT_ROUNDS = 5
+
+BATCH_SIZE = 64
+BATCH_CONCURRENCY_LEVELS = (1, 4, 16, 64)
+BATCH_LATENCY_SECONDS = 0.005
+
+MEMORY_IN_FLIGHT = 128
+MEMORY_LATENCY_SECONDS = 0.05
+
+FAKE_TOKENS_PER_SECOND = 0.0  # 0 disables the per-token delay
+
+
+# ==========================================================
+# Type Aliases
+# ==========================================================
+
+type Metrics = dict[str, float]
+
+
+# ==========================================================
+# Fake Chat Model
+# ==========================================================
+
+
+class DeterministicFakeChatModel(BaseChatModel):
+    """
+    Offline chat model with deterministic replies and programmable timing.
+
+    Latency is `latency + output_tokens / tokens_per_second`; replies cycle
+    through `responses` and report word-based token usage.
+    """
+
+    responses: list[str] = ["Why did the developer go broke? Too many calls."]
+    latency: float = 0.0
+    tokens_per_second: float = FAKE_TOKENS_PER_SECOND
+
+    @property
+    def _llm_type(self) -> str:
+        return "deterministic-fake-chat-model"
+
+    def _reply(self, messages: list[BaseMessage]) -> tuple[ChatResult, float]:
+        prompt_tokens = sum(len(str(m.content).split()) for m in messages)
+        text = self.responses[prompt_tokens % len(self.responses)]
+        output_tokens = len(text.split())
+
+        delay = self.latency
+        if self.tokens_per_second:
+            delay += output_tokens / self.tokens_per_second
+
+        message = AIMessage(
+            content=text,
+            usage_metadata={
+                "input_tokens": prompt_tokens,
+                "output_tokens": output_tokens,
+                "total_tokens": prompt_tokens + output_tokens,
+            },
+        )
+        return ChatResult(generations=[ChatGeneration(message=message)]), delay
+
+    def _generate(
+        self,
+        messages: list[BaseMessage],
+        stop: list[str] | None = None,
+        run_manager: CallbackManagerForLLMRun | None = None,
+        **kwargs: Any,
+    ) -> ChatResult:
+        result, delay = self._reply(messages)
+        if delay:
+            time.sleep(delay)
+        return result
+
+    async def _agenerate(
+        self,
+        messages: list[BaseMessage],
+        stop: list[str] | None = None,
+        run_manager: AsyncCallbackManagerForLLMRun | None = None,
+        **kwargs: Any,
+    ) -> ChatResult:
+        result, delay = self._reply(messages)
+        if delay:
+            await asyncio.sleep(delay)
+        return result
+
+
+# ==========================================================
+# Scenarios (chains from ch01–ch04)
+# ==========================================================
+
+
+@dataclass(frozen=True)
+class Scenario:
+    """
+    A chain builder plus a representative input.
+
+    `session_scoped` chains keep per-session state, so every concurrent
+    request gets its own `session_id`.
+    """
+
+    name: str
+    build: Callable[[BaseChatModel], Runnable | AbstractContextManager[Runnable]]
+    payload: Any
+    uses_model: bool = True
+    session_scoped: bool = False
+
+    @contextmanager
+    def open(self, model: BaseChatModel) -> Iterator[Runnable]:
+        """Build the chain; builders that start threads or stores are closed."""
+
+        built = self.build(model)
+        if isinstance(built, AbstractContextManager):
+            with built as runnable:
+                yield runnable
+        else:
+            yield built
+
+    def configs(
+        self, count: int, max_concurrency: int | None = None
+    ) -> list[RunnableConfig]:
+        configs = [
+            RunnableConfig(max_concurrency=max_concurrency) for _ in range(count)
+        ]
+        if self.session_scoped:
+            for i, config in enumerate(configs):
+                config["configurable"] = {"session_id": f"benchmark-{i}"}
+        return configs
+
+
+def import_script(chapter: str, module: str) -> ModuleType:
+    """Import a chapter script, with its sibling imports resolvable."""
+
+    directory = str(ROOT / chapter)
+    if directory not in sys.path:
+        sys.path.insert(0, directory)
+    return importlib.import_module(module)
+
+
+def build_hello_world(model: BaseChatModel) -> Runnable:
+    return model
+
+
+def build_chat_prompt_template(model: BaseChatModel) -> Runnable:
+    chat_prompt = ChatPromptTemplate(
+        [
+            (
+                "system",
+                "you are an assistant that answers questions in a {style} style",
+            ),
+            ("user", "{question}"),
+        ]
+    )
+    return chat_prompt | model
+
+
+def build_starting_with_chains(model: BaseChatModel) -> Runnable:
+    question_template = PromptTemplate(
+        input_variables=["name"],
+        template="Hi, I'm {name}! Tell me a joke with my name!",
+    )
+    return question_template | model
+
+
+def build_chains_with_decorators(model: BaseChatModel) -> Runnable:
+    @chain
+    def square(number: int) -> dict[str, int]:
+        return {"square_result": number**2}
+
+    question_template_2 = PromptTemplate(
+        input_variables=["square_result"],
+        template="Tell me about the number {square_result}",
+    )
+    return square | question_template_2 | model
+
+
+def build_runnable_lambda(model: BaseChatModel) -> Runnable:
+    return RunnableLambda(lambda text: int(text.strip()))
+
+
+def build_processing_pipeline(model: BaseChatModel) -> Runnable:
+    template_translate = PromptTemplate(
+        input_variables=["initial_text"],
+        template="Translate the following text to English:\n ```{initial_text}```",
+    )
+    template_summary = PromptTemplate(
+        input_variables=["text"],
+        template="Summarize the following text in 4 words:\n ```{text}```",
+    )
+    translate = template_translate | model | StrOutputParser()
+    return (
+        RunnableParallel[dict[str, str]](text=translate)
+        | template_summary
+        | model
+        | StrOutputParser()
+    )
+
+
+def build_processing_pipeline_batch(model: BaseChatModel) -> Runnable:
+    script = import_script(
+        "ch02_chains_and_processing", "p08_processing_pipeline_batch"
+    )
+    return script.build_pipeline(model)
+
+
+def build_summarizing(model: BaseChatModel) -> Runnable:
+    prompt = ChatPromptTemplate.from_template("Summarize the following text:\n\n{text}")
+    return prompt | model | StrOutputParser()
+
+
+def build_summarizing_with_map_reduce(model: BaseChatModel) -> Runnable:
+    map_chain = (
+        ChatPromptTemplate.from_template(
+            "Summarize the following text chunk:\n\n{text}"
+        )
+        | model
+        | StrOutputParser()
+    )
+    reduce_chain = (
+        ChatPromptTemplate.from_template(
+            "The following are partial summaries of a longer text:\n\n{summaries}"
+            "\n\nCreate a final consolidated summary of the entire text."
+        )
+        | model
+        | StrOutputParser()
+    )
+
+    def summarize(documents: list[Document]) -> str:
+        partial_summaries = [
+            map_chain.invoke({"text": doc.page_content}) for doc in documents
+        ]
+        return reduce_chain.invoke({"summaries": "\n\n".join(partial_summaries)})
+
+    return RunnableLambda(summarize)
+
+
+def build_summarizing_pipeline(model: BaseChatModel) -> Runnable:
+    map_prompt = PromptTemplate.from_template(
+        "Write a concise summary of the following text:\n{context}"
+    )
+    map_chain = map_prompt | model | StrOutputParser()
+    reduce_prompt = PromptTemplate.from_template(
+        "Combine the following summaries into a single concise summary:\n{context}"
+    )
+    reduce_chain = reduce_prompt | model | StrOutputParser()
+
+    def to_map_inputs(docs: list[Document]) -> list[dict[str, str]]:
+        return [{"context": d.page_content} for d in docs]
+
+    def to_reduce_input(summaries: list[str]) -> dict[str, str]:
+        return {"context": "\n".join(summaries)}
+
+    return (
+        RunnableLambda(to_map_inputs)
+        | map_chain.map()
+        | RunnableLambda(to_reduce_input)
+        | reduce_chain
+    )
+
+
+def build_react_agent(model: BaseChatModel) -> Runnable:
+    chapter = "ch03_agents_and_tools"
+    script = import_script(chapter, "p01_react_agent_and_tools")
+    fakes = import_script(chapter, "p05_parallel_tool_calling_agent")
+
+    # Asks for the calculator once, then answers from the observation.
+    react_model = fakes.ScriptedReActModel(latency=getattr(model, "latency", 0.0))
+    return script.build_agent_executor(react_model, verbose=False)
+
+
+def build_history_storage(model: BaseChatModel) -> Runnable:
+    prompt = ChatPromptTemplate.from_messages(
+        [
+            ("system", "You are a helpful assistant."),
+            MessagesPlaceholder(variable_name="history"),
+            ("human", "{input}"),
+        ]
+    )
+    conversational_chain = RunnableWithMessageHistory(
+        runnable=prompt | model,
+        # A fresh history per call keeps iterations independent.
+        get_session_history=lambda session_id: InMemoryChatMessageHistory(),
+        input_messages_key="input",
+        history_messages_key="history",
+    )
+    return conversational_chain.with_config(
+        configurable={"session_id": "benchmark-session"}
+    )
+
+
+@contextmanager
+def build_sliding_window(model: BaseChatModel) -> Iterator[Runnable]:
+    chapter = "ch04_memory_management"
+    script = import_script(chapter, "p02_history_based_on_sliding_window")
+    backends = import_script(chapter, "p03_tiered_session_store")
+
+    # The store runs a flusher thread; one per measurement, stopped after it.
+    store = script.build_session_store(backends.SQLiteBackend(":memory:"))
+    try:
+        yield script.build_conversational_chain(model, store=store)
+    finally:
+        store.close()
+
+
+DOCUMENTS = [
+    Document(page_content=f"Dawn threads a pale gold through alley number {i}.")
+    for i in range(4)
+]
+
+SCENARIOS: list[Scenario] = [
+    Scenario("ch01.p01_hello_world", build_hello_world, "Hello World"),
+    Scenario(
+        "ch01.p04_chat_prompt_template",
+        build_chat_prompt_template,
+        {"style": "funny", "question": "Who is Alan Turing?"},
+    ),
+    Scenario(
+        "ch02.p01_starting_with_chains", build_starting_with_chains, {"name": "Higor"}
+    ),
+    Scenario("ch02.p02_chains_with_decorators", build_chains_with_decorators, 10),
+    Scenario("ch02.p03_runnable_lambda", build_runnable_lambda, "10", uses_model=False),
+    Scenario(
+        "ch02.p04_processing_pipeline",
+        build_processing_pipeline,
+        {"initial_text": "LangChain é um framework para aplicações de IA"},
+    ),
+    Scenario(
+        "ch02.p08_processing_pipeline_batch",
+        build_processing_pipeline_batch,
+        {"initial_text": "LangChain é um framework para aplicações de IA"},
+    ),
+    Scenario("ch02.p05_summarizing", build_summarizing, {"text": "Dawn threads gold."}),
+    Scenario(
+        "ch02.p06_summarizing_with_map_reduce",
+        build_summarizing_with_map_reduce,
+        DOCUMENTS,
+    ),
+    Scenario("ch02.p07_summarizing_pipeline", build_summarizing_pipeline, DOCUMENTS),
+    Scenario(
+        "ch03.p01_react_agent_and_tools",
+        build_react_agent,
+        {"input": "How much is 10+10?"},
+    ),
+    Scenario("ch04.p01_history_storage", build_history_storage, {"input": "Hello!"}),
+    Scenario(
+        "ch04.p02_history_based_on_sliding_window",
+        build_sliding_window,
+        {"input": "What is my name?"},
+        session_scoped=True,
+    ),
+]
+
+
+# ==========================================================
+# Measurements
+# ==========================================================
+
+
+def overhead_rounds(scenario: Scenario, iterations: int) -> Generator[Metrics]:
+    """Per-invoke wall time with a zero-latency model, in microseconds."""
+
+    with scenario.open(DeterministicFakeChatModel()) as runnable:
+        config = scenario.configs(1)[0]
+        for _ in range(OVERHEAD_WARMUP):
+            runnable.invoke(scenario.payload, config=config)
+
+        while True:
+            samples: list[float] = []
+            for _ in range(iterations):
+                start = time.perf_counter()
+                runnable.invoke(scenario.payload, config=config)
+                samples.append((time.perf_counter() - start) * 1e6)
+
+            samples.sort()
+            yield {
+                "overhead_p50_us": statistics.median(samples),
+                "overhead_p95_us": samples[int(0.95 * (len(samples) - 1))],
+            }
+
+
+def batch_rounds(scenario: Scenario, batch_size: int) -> Generator[Metrics]:
+    """Requests per second of `batch` for each concurrency level."""
+
+    model = DeterministicFakeChatModel(latency=BATCH_LATENCY_SECONDS)
+    with scenario.open(model) as runnable:
+        inputs = [scenario.payload] * batch_size
+
+        while True:
+            metrics: Metrics = {}
+            for concurrency in BATCH_CONCURRENCY_LEVELS:
+                configs = scenario.configs(batch_size, max_concurrency=concurrency)
+                start = time.perf_counter()
+                runnable.batch(inputs, config=configs)
+                elapsed = time.perf_counter() - start
+                metrics[f"batch_c{concurrency}_rps"] = batch_size / elapsed
+            yield metrics
+
+
+def measure_memory(scenario: Scenario, in_flight: int) -> Metrics:
+    """Peak traced memory per concurrent `abatch` request, in KiB."""
+
+    model = DeterministicFakeChatModel(latency=MEMORY_LATENCY_SECONDS)
+    with scenario.open(model) as runnable:
+        inputs = [scenario.payload] * in_flight
+        configs = scenario.configs(in_flight, max_concurrency=in_flight)
+
+        # Warm up lazy imports and caches outside of the traced window.
+        asyncio.run(runnable.abatch(inputs[:2], config=configs[:2]))
+        gc.collect()
+
+        tracemalloc.start()
+        baseline, _ = tracemalloc.get_traced_memory()
+        asyncio.run(runnable.abatch(inputs, config=configs))
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+    return {"memory_per_request_kib": (peak - baseline) / in_flight / 1024}
+
+
+def higher_is_better(metric: str) -> bool:
+    return metric.endswith("_rps")
+
+
+def paired(
+    rounds: Generator[Metrics], reference: Generator[Metrics]
+) -> tuple[Metrics, Metrics]:
+    """
+    Alternate rounds of a scenario and of the reference scenario.
+
+    Returns the best value of each metric and its ratio to the reference's
+    best. Interference from the machine only ever slows a round down, so the
+    best rounds of both sides, taken over the same stretch of time, are the
+    most stable estimate of their relative cost.
+    """
+
+    values: defaultdict[str, list[float]] = defaultdict(list)
+    units: defaultdict[str, list[float]] = defaultdict(list)
+    with closing(rounds), closing(reference):
+        for _ in range(MEASUREMENT_ROUNDS):
+            unit = next(reference)
+            for metric, value in next(rounds).items():
+                values[metric].append(value)
+                units[metric].append(unit[metric])
+
+    def best(samples: list[float], metric: str) -> float:
+        return max(samples) if higher_is_better(metric) else min(samples)
+
+    return (
+        {metric: best(samples, metric) for metric, samples in values.items()},
+        {
+            metric: best(samples, metric) / best(units[metric], metric)
+            for metric, samples in values.items()
+        },
+    )
+
+
+def run_suite(
+    scenarios: list[Scenario], quick: bool
+) -> tuple[dict[str, Metrics], dict[str, Metrics]]:
+    """Run all measurements; returns absolute metrics and reference ratios."""
+
+    iterations = OVERHEAD_ITERATIONS // 4 if quick else OVERHEAD_ITERATIONS
+    iterations //= MEASUREMENT_ROUNDS
+    batch_size = BATCH_SIZE // 4 if quick else BATCH_SIZE
+    in_flight = MEMORY_IN_FLIGHT // 4 if quick else MEMORY_IN_FLIGHT
+
+    reference = next(s for s in SCENARIOS if s.name == REFERENCE_SCENARIO)
+    reference_memory = measure_memory(reference, in_flight)
+
+    results: dict[str, Metrics] = {}
+    ratios: dict[str, Metrics] = {}
+    for scenario in scenarios:
+        print(f"Running {scenario.name}...", file=sys.stderr)
+        metrics, relative = paired(
+            overhead_rounds(scenario, iterations),
+            overhead_rounds(reference, iterations),
+        )
+        if scenario.uses_model:
+            batch, batch_ratios = paired(
+                batch_rounds(scenario, batch_size),
+                batch_rounds(reference, batch_size),
+            )
+            memory = measure_memory(scenario, in_flight)
+            metrics |= batch | memory
+            relative |= batch_ratios | {
+                metric: value / reference_memory[metric]
+                for metric, value in memory.items()
+            }
+        results[scenario.name] = metrics
+        ratios[scenario.name] = relative
+
+    return results, ratios
+
+
+# ==========================================================
+# Baseline Comparison
+# ==========================================================
+
+
+def compare(
+    results: dict[str, Metrics],
+    ratios: dict[str, Metrics],
+    baseline: dict[str, Metrics],
+    tolerance: float,
+) -> list[str]:
+    """Print a comparison table of ratios and return the regressed metric names."""
+
+    regressions: list[str] = []
+    print(
+        f"\n{'scenario / metric':<64}{'value':>12}{'ratio':>9}"
+        f"{'baseline':>10}{'delta':>9}"
+    )
+
+    for name, metrics in results.items():
+        for metric, value in metrics.items():
+            label = f"{name} / {metric}"
+            ratio = ratios.get(name, {}).get(metric)
+            reference = baseline.get(name, {}).get(metric)
+            if ratio is None or not reference:
+                shown = "-" if ratio is None else f"{ratio:.2f}"
+                print(f"{label:<64}{value:>12.2f}{shown:>9}{'-':>10}{'-':>9}")
+                continue
+
+            delta = (ratio - reference) / reference
+            worse = -delta if higher_is_better(metric) else delta
+            flag = " !" if worse > tolerance else ""
+            if flag:
+                regressions.append(label)
+            print(
+                f"{label:<64}{value:>12.2f}{ratio:>9.2f}{reference:>10.2f}"
+                f"{delta:>+8.0%}{flag}"
+            )
+
+    return regressions
+
+
+def load_baseline(path: Path) -> dict[str, Metrics]:
+    if not path.exists():
+        return {}
+
+    return json.loads(path.read_text(encoding="utf-8"))["ratios"]
+
+
+def save_baseline(path: Path, ratios: dict[str, Metrics]) -> None:
+    payload = {
+        "python": platform.python_version(),
+        "reference": REFERENCE_SCENARIO,
+        "ratios": {
+            name: {metric: round(value, 3) for metric, value in metrics.items()}
+            for name, metrics in ratios.items()
+        },
+    }
+    path.write_text(json.dumps(payload, indent=2) + "\n", encoding="utf-8")
+
+
+# ==========================================================
+# Entrypoint
+# ==========================================================
+
+
+def main() -> None:
+    """Main entrypoint for the application."""
+
+    parser = argparse.ArgumentParser(description="Offline chain overhead benchmark")
+    parser.add_argument("--baseline", type=Path, default=BASELINE_PATH)
+    parser.add_argument("--save-baseline", action="store_true")
+    parser.add_argument("--tolerance", type=float, default=REGRESSION_TOLERANCE)
+    parser.add_argument("--quick", action="store_true", help="fewer iterations")
+    parser.add_argument("--only", help="run scenarios whose name contains this")
+    args = parser.parse_args()
+
+    # The reference scenario is the unit of every ratio, not a scenario itself.
+    scenarios = [
+        s
+        for s in SCENARIOS
+        if s.name != REFERENCE_SCENARIO and (not args.only or args.only in s.name)
+    ]
+    results, ratios = run_suite(scenarios, args.quick)
+
+    if args.save_baseline:
+        save_baseline(args.baseline, ratios)
+        print(f"Baseline written to {args.baseline}")
+        return
+
+    regressions = compare(results, ratios, load_baseline(args.baseline), args.tolerance)
+    if regressions:
+        print(
+            f"\n{len(regressions)} metric(s) regressed by more than "
+            f"{args.tolerance:.0%}."
+        )
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,55 +1,13 @@
 from dotenv import load_dotenv
-from langchain.tools import tool
 from langchain_classic.agents import AgentExecutor, create_react_agent
+from langchain_core.language_models import BaseChatModel
 from langchain_core.prompts import PromptTemplate
-from langchain_openai import ChatOpenAI
+from p03_bounded_calculator_engine import calculator
+from p04_knowledge_lookup_index import web_search_mock
+from p06_tool_result_cache import cached, normalize_expression
+from p08_prompt_registry import default_registry
 
-load_dotenv()
-
-
-@tool("calculator", return_direct=True)
-def calculator(expression: str) -> str:
-    """
-    Evaluate a simple mathematical expression and return the result.
-    """
-
-    try:
-        result = eval(expression)
-    except Exception as e:
-        return f"Error: {e}"
-
-    return str(result)
-
-
-@tool("web_search_mock")
-def web_search_mock(query: str) -> str:
-    """
-    Mocked web search tool. Returns a hardcoded result.
-    """
-
-    data = {
-        "Brazil": "Brasília",
-        "France": "Paris",
-        "Germany": "Berlin",
-        "Italy": "Rome",
-        "Spain": "Madrid",
-        "United States": "Washington, D.C.",
-    }
-
-    for country, capital in data.items():
-        if country.lower() in query.lower():
-            return f"The capital of {country} is {capital}."
-
-    return "I don't know the capital of that country."
-
-
-llm = ChatOpenAI(
-    model="gpt-5-mini",
-    disable_streaming=True,
-)
-tools = [calculator, web_search_mock]
-
-prompt = PromptTemplate.from_template(
+REACT_PROMPT = PromptTemplate.from_template(
     """
 Answer the following questions as best you can. You have access to the following tools.
 Only use the information you get from the tools, even if you know the answer.
@@ -80,21 +38,42 @@ Question: {input}
 Thought:{agent_scratchpad}"""
 )
 
-agent_chain = create_react_agent(
-    llm=llm,
-    tools=tools,
-    prompt=prompt,
-    stop_sequence=False,
-)
-agent_executor = AgentExecutor.from_agent_and_tools(
-    agent=agent_chain,
-    tools=tools,
-    verbose=True,
-    handle_parsing_errors="Invalid format. Either provide an "
-    "Action with Action Input, or a Final Answer only.",
-    max_iterations=3,
-)
 
-print(agent_executor.invoke({"input": "What is the capital of Iran?"}))
-print(agent_executor.invoke({"input": "What is the capital of France?"}))
-print(agent_executor.invoke({"input": "How much is 10+10?"}))
+def build_agent_executor(llm: BaseChatModel, verbose: bool = True) -> AgentExecutor:
+    tools = [
+        cached(normalize=normalize_expression)(calculator),
+        cached(ttl=300)(web_search_mock),
+    ]
+    prompt = default_registry().register("local/react-tools-only", REACT_PROMPT)
+
+    agent_chain = create_react_agent(
+        llm=llm,
+        tools=tools,
+        prompt=prompt,
+        stop_sequence=False,
+    )
+    return AgentExecutor.from_agent_and_tools(
+        agent=agent_chain,
+        tools=tools,
+        verbose=verbose,
+        handle_parsing_errors="Invalid format. Either provide an "
+        "Action with Action Input, or a Final Answer only.",
+        max_iterations=3,
+    )
+
+
+if __name__ == "__main__":
+    from langchain_openai import ChatOpenAI
+
+    load_dotenv()
+
+    agent_executor = build_agent_executor(
+        ChatOpenAI(
+            model="gpt-5-mini",
+            disable_streaming=True,
+        )
+    )
+
+    print(agent_executor.invoke({"input": "What is the capital of Iran?"}))
+    print(agent_executor.invoke({"input": "What is the capital of France?"}))
+    print(agent_executor.invoke({"input": "How much is 10+10?"}))
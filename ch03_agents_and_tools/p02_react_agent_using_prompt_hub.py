@@ -1,55 +1,23 @@
 from dotenv import load_dotenv
-from langchain.tools import tool
-from langchain_classic import hub
 from langchain_classic.agents import AgentExecutor, create_react_agent
 from langchain_openai import ChatOpenAI
+from p03_bounded_calculator_engine import calculator
+from p04_knowledge_lookup_index import web_search_mock
+from p06_tool_result_cache import cached, normalize_expression
+from p08_prompt_registry import default_registry
 
 load_dotenv()
 
-
-@tool("calculator", return_direct=True)
-def calculator(expression: str) -> str:
-    """
-    Evaluate a simple mathematical expression and return the result.
-    """
-
-    try:
-        result = eval(expression)
-    except Exception as e:
-        return f"Error: {e}"
-
-    return str(result)
-
-
-@tool("web_search_mock")
-def web_search_mock(query: str) -> str:
-    """
-    Mocked web search tool. Returns a hardcoded result.
-    """
-
-    data = {
-        "Brazil": "Brasília",
-        "France": "Paris",
-        "Germany": "Berlin",
-        "Italy": "Rome",
-        "Spain": "Madrid",
-        "United States": "Washington, D.C.",
-    }
-
-    for country, capital in data.items():
-        if country.lower() in query.lower():
-            return f"The capital of {country} is {capital}."
-
-    return "I don't know the capital of that country."
-
-
 llm = ChatOpenAI(
     model="gpt-3.5-turbo",
     temperature=0.5,
 )
-tools = [calculator, web_search_mock]
+tools = [
+    cached(normalize=normalize_expression)(calculator),
+    cached(ttl=300)(web_search_mock),
+]
 
-prompt = hub.pull("hwchase17/react")
+prompt = default_registry().get("hwchase17/react")
 
 agent_chain = create_react_agent(
     llm=llm,
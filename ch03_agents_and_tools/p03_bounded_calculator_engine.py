@@ -0,0 +1,359 @@
+"""
+Bounded-Cost Calculator Engine
+------------------------------
+
+Replacement for the raw `eval(expression)` used by the `calculator` tool:
+- Parses with `ast` and accepts only numbers, arithmetic operators and a
+  small whitelist of math functions/constants
+- Rejects operations whose result would exceed the operand-size limits
+  *before* computing them (e.g. `9**9**9`), and enforces a time budget
+- Memoizes compiled expressions, so repeated inputs skip parsing
+- Evaluates many expressions at once, compiling each distinct one only once
+
+Every operation is bounded, so a single request cannot monopolize a CPU core.
+"""
+
+from __future__ import annotations
+
+import ast
+import math
+import operator
+import time
+from collections.abc import Callable, Iterable
+from functools import lru_cache
+
+from langchain.tools import tool
+
+# =========================
+# Configuration
+# =========================
+
+MAX_EXPRESSION_LENGTH = 256
+MAX_NODES = 64
+MAX_INT_BITS = 4096
+MAX_EXPONENT = 10_000
+MAX_ROUND_DIGITS = 15
+MAX_ABS_FLOAT = 1e300
+TIME_BUDGET_SECONDS = 0.05
+COMPILED_CACHE_SIZE = 4096
+
+type Number = int | float
+type Compiled = Callable[[float], Number]
+
+
+# =========================
+# Errors
+# =========================
+
+
+class CalculatorError(ValueError):
+    """Raised when an expression is invalid or too expensive to evaluate."""
+
+
+class UnsupportedExpressionError(CalculatorError):
+    """The expression uses syntax outside of the arithmetic whitelist."""
+
+
+class LimitExceededError(CalculatorError):
+    """An operand or intermediate result is larger than allowed."""
+
+
+class TimeBudgetExceededError(CalculatorError):
+    """Evaluation took longer than the configured time budget."""
+
+
+# =========================
+# Whitelists
+# =========================
+
+FUNCTIONS: dict[str, Callable[..., Number]] = {
+    "abs": abs,
+    "round": round,
+    "min": min,
+    "max": max,
+    "sqrt": math.sqrt,
+    "log": math.log,
+    "log10": math.log10,
+    "exp": math.exp,
+    "sin": math.sin,
+    "cos": math.cos,
+    "tan": math.tan,
+    "floor": math.floor,
+    "ceil": math.ceil,
+}
+
+CONSTANTS: dict[str, float] = {"pi": math.pi, "e": math.e}
+
+BINARY_OPERATORS: dict[type[ast.operator], Callable[[Number, Number], Number]] = {
+    ast.Add: operator.add,
+    ast.Sub: operator.sub,
+    ast.Mult: operator.mul,
+    ast.Div: operator.truediv,
+    ast.FloorDiv: operator.floordiv,
+    ast.Mod: operator.mod,
+    ast.Pow: operator.pow,
+}
+
+UNARY_OPERATORS: dict[type[ast.unaryop], Callable[[Number], Number]] = {
+    ast.UAdd: operator.pos,
+    ast.USub: operator.neg,
+}
+
+
+# =========================
+# Limits
+# =========================
+
+
+def check_result(value: Number) -> Number:
+    """Validate the size of an intermediate result."""
+
+    if isinstance(value, bool) or not isinstance(value, int | float):
+        raise UnsupportedExpressionError("Only numeric results are supported.")
+
+    if isinstance(value, int) and value.bit_length() > MAX_INT_BITS:
+        raise LimitExceededError("Result is too large.")
+
+    if isinstance(value, float) and (math.isinf(value) or abs(value) > MAX_ABS_FLOAT):
+        raise LimitExceededError("Result is too large.")
+
+    return value
+
+
+def check_operation(op: type[ast.operator], left: Number, right: Number) -> None:
+    """Reject operations whose result size can be predicted to be too large."""
+
+    if op is ast.Pow:
+        if abs(right) > MAX_EXPONENT:
+            raise LimitExceededError(f"Exponent is larger than {MAX_EXPONENT}.")
+
+        # A `b`-bit base raised to `n` has at least `(b - 1) * n + 1` bits.
+        if isinstance(left, int) and isinstance(right, int) and right > 0:
+            if (abs(left).bit_length() - 1) * right >= MAX_INT_BITS:
+                raise LimitExceededError("Result is too large.")
+
+    elif op is ast.Mult and isinstance(left, int) and isinstance(right, int):
+        if left.bit_length() + right.bit_length() > MAX_INT_BITS:
+            raise LimitExceededError("Result is too large.")
+
+
+def check_call(name: str, values: list[Number]) -> None:
+    """Reject calls whose cost depends on an argument's magnitude."""
+
+    # round(x, -n) scales by 10**n as a big integer inside one builtin call,
+    # where the deadline cannot interrupt it.
+    if name == "round" and len(values) == 2 and abs(values[1]) > MAX_ROUND_DIGITS:
+        raise LimitExceededError(f"round() digits must be within ±{MAX_ROUND_DIGITS}.")
+
+
+def check_deadline(deadline: float) -> None:
+    if time.perf_counter() > deadline:
+        raise TimeBudgetExceededError("Evaluation exceeded its time budget.")
+
+
+# =========================
+# Compiler
+# =========================
+
+
+def _compile_node(node: ast.AST) -> Compiled:
+    """Turn a validated AST node into a closure that takes a deadline."""
+
+    if isinstance(node, ast.Constant):
+        value = node.value
+        if isinstance(value, bool) or not isinstance(value, int | float):
+            raise UnsupportedExpressionError(f"Unsupported literal: {value!r}")
+        check_result(value)
+        return lambda deadline: value
+
+    if isinstance(node, ast.Name):
+        if node.id not in CONSTANTS:
+            raise UnsupportedExpressionError(f"Unknown name: {node.id}")
+        constant = CONSTANTS[node.id]
+        return lambda deadline: constant
+
+    if isinstance(node, ast.UnaryOp):
+        unary = UNARY_OPERATORS.get(type(node.op))
+        if unary is None:
+            raise UnsupportedExpressionError("Unsupported unary operator.")
+        operand = _compile_node(node.operand)
+        return lambda deadline: unary(operand(deadline))
+
+    if isinstance(node, ast.BinOp):
+        op_type = type(node.op)
+        binary = BINARY_OPERATORS.get(op_type)
+        if binary is None:
+            raise UnsupportedExpressionError("Unsupported binary operator.")
+        left, right = _compile_node(node.left), _compile_node(node.right)
+
+        def evaluate_binary(deadline: float) -> Number:
+            left_value, right_value = left(deadline), right(deadline)
+            check_deadline(deadline)
+            check_operation(op_type, left_value, right_value)
+            try:
+                return check_result(binary(left_value, right_value))
+            except (ArithmeticError, ValueError) as error:
+                if isinstance(error, CalculatorError):
+                    raise
+                raise CalculatorError(str(error)) from error
+
+        return evaluate_binary
+
+    if isinstance(node, ast.Call):
+        if not isinstance(node.func, ast.Name) or node.func.id not in FUNCTIONS:
+            raise UnsupportedExpressionError("Unsupported function call.")
+        if node.keywords:
+            raise UnsupportedExpressionError("Keyword arguments are not supported.")
+        name = node.func.id
+        function = FUNCTIONS[name]
+        arguments = [_compile_node(argument) for argument in node.args]
+
+        def evaluate_call(deadline: float) -> Number:
+            values = [argument(deadline) for argument in arguments]
+            check_deadline(deadline)
+            check_call(name, values)
+            try:
+                return check_result(function(*values))
+            except (ArithmeticError, ValueError, TypeError) as error:
+                if isinstance(error, CalculatorError):
+                    raise
+                raise CalculatorError(str(error)) from error
+
+        return evaluate_call
+
+    raise UnsupportedExpressionError(f"Unsupported syntax: {type(node).__name__}")
+
+
+def normalize(expression: str) -> str:
+    """Canonical form used as the memoization key."""
+
+    return " ".join(expression.strip().strip("`'\"").split())
+
+
+@lru_cache(maxsize=COMPILED_CACHE_SIZE)
+def _compile_normalized(expression: str) -> Compiled:
+    if not expression:
+        raise UnsupportedExpressionError("Empty expression.")
+
+    if len(expression) > MAX_EXPRESSION_LENGTH:
+        raise LimitExceededError(
+            f"Expression is longer than {MAX_EXPRESSION_LENGTH} characters."
+        )
+
+    try:
+        tree = ast.parse(expression, mode="eval")
+    except SyntaxError as error:
+        raise UnsupportedExpressionError(f"Invalid expression: {error.msg}") from None
+
+    if sum(1 for _ in ast.walk(tree)) > MAX_NODES:
+        raise LimitExceededError(f"Expression has more than {MAX_NODES} nodes.")
+
+    return _compile_node(tree.body)
+
+
+def compile_expression(expression: str) -> Compiled:
+    """Parse, validate and compile an expression (memoized)."""
+
+    return _compile_normalized(normalize(expression))
+
+
+# =========================
+# Evaluation
+# =========================
+
+
+def evaluate(expression: str, time_budget: float = TIME_BUDGET_SECONDS) -> Number:
+    """Evaluate a single arithmetic expression within the limits."""
+
+    compiled = compile_expression(expression)
+    return compiled(time.perf_counter() + time_budget)
+
+
+def evaluate_many(
+    expressions: Iterable[str],
+    time_budget: float = TIME_BUDGET_SECONDS,
+) -> list[Number | CalculatorError]:
+    """
+    Evaluate a batch of expressions, sharing work between duplicates.
+
+    Each distinct expression is compiled and evaluated once; errors are
+    returned in place instead of aborting the whole batch.
+    """
+
+    keys = [normalize(expression) for expression in expressions]
+    results: dict[str, Number | CalculatorError] = {}
+
+    for key in dict.fromkeys(keys):
+        try:
+            compiled = _compile_normalized(key)
+            results[key] = compiled(time.perf_counter() + time_budget)
+        except CalculatorError as error:
+            results[key] = error
+
+    return [results[key] for key in keys]
+
+
+# =========================
+# Tool
+# =========================
+
+
+@tool("calculator", return_direct=True)
+def calculator(expression: str) -> str:
+    """
+    Evaluate a simple mathematical expression and return the result.
+    """
+
+    try:
+        result = evaluate(expression)
+    except CalculatorError as e:
+        return f"Error: {e}"
+
+    return str(result)
+
+
+# =========================
+# Demo Runner
+# =========================
+
+
+def run_demo() -> None:
+    """Show accepted and rejected expressions with their latency."""
+
+    expressions = [
+        "10+10",
+        "2 ** 10 / 4",
+        "sqrt(16) + pi",
+        "9**9**9",
+        "10**10**10",
+        "round(1, -10**8)",
+        "__import__('os').system('ls')",
+        "1/0",
+    ]
+
+    for expression in expressions:
+        start = time.perf_counter()
+        output = calculator.invoke(expression)
+        elapsed = (time.perf_counter() - start) * 1e6
+        print(f"{expression:<34} → {output:<40} ({elapsed:,.0f}µs)")
+
+    batch = [f"{i % 50} * 3 + 1" for i in range(10_000)]
+    start = time.perf_counter()
+    evaluate_many(batch)
+    elapsed = time.perf_counter() - start
+    print(f"\nevaluate_many: {len(batch):,} expressions in {elapsed * 1000:.1f}ms")
+
+
+# =========================
+# Entrypoint
+# =========================
+
+
+def main() -> None:
+    """Main entrypoint for the application."""
+
+    run_demo()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,369 @@
+"""
+Indexed Knowledge Lookup Tool
+-----------------------------
+
+Drop-in replacement for the linear `web_search_mock` scan:
+- Compiles a key → value table (e.g. country → capital) into an
+  Aho–Corasick automaton, so a query is matched against every key in
+  O(query length) instead of O(entries × query length)
+- Serializes the automaton into a flat binary file that is memory-mapped
+  at startup, so large tables load without being parsed again
+- Keeps the original semantics: case-insensitive substring match, with the
+  earliest table entry winning when several keys appear in the query
+
+Set `KNOWLEDGE_INDEX_PATH` to a compiled index to serve a larger table.
+
+Usage:
+    uv run ch03_agents_and_tools/p04_knowledge_lookup_index.py compile \\
+        capitals.csv capitals.idx
+    uv run ch03_agents_and_tools/p04_knowledge_lookup_index.py bench
+"""
+
+from __future__ import annotations
+
+import argparse
+import csv
+import mmap
+import os
+import random
+import struct
+import sys
+import tempfile
+import time
+from array import array
+from bisect import bisect_left
+from collections import deque
+from collections.abc import Mapping
+from pathlib import Path
+
+from langchain.tools import tool
+from langchain_core.tools import BaseTool
+
+# ==========================================================
+# Configuration
+# ==========================================================
+
+MAGIC = b"KLIX"
+VERSION = 1
+HEADER = struct.Struct("<4sIIIII")
+NO_MATCH = 0xFFFFFFFF
+
+ANSWER_TEMPLATE = "The capital of {key} is {value}."
+NOT_FOUND_ANSWER = "I don't know the capital of that country."
+
+CAPITALS: dict[str, str] = {
+    "Brazil": "Brasília",
+    "France": "Paris",
+    "Germany": "Berlin",
+    "Italy": "Rome",
+    "Spain": "Madrid",
+    "United States": "Washington, D.C.",
+}
+
+BENCH_SIZES = (10, 1_000, 10_000, 100_000)
+BENCH_QUERIES = 200
+
+
+# ==========================================================
+# Index Compilation
+# ==========================================================
+
+
+def _uint32(values: list[int]) -> bytes:
+    data = array("I", values)
+    if sys.byteorder == "big":
+        data.byteswap()
+    return data.tobytes()
+
+
+def compile_index(table: Mapping[str, str]) -> bytes:
+    """
+    Build the Aho–Corasick automaton for `table` and serialize it.
+
+    Layout (little-endian uint32 arrays after the header):
+    edge_start[states + 1], edge_char[edges], edge_target[edges],
+    fail[states], output[states], key_offsets[entries + 1],
+    value_offsets[entries + 1], then the UTF-8 string blob.
+    """
+
+    entries = [(key, value) for key, value in table.items() if key]
+    children: list[dict[int, int]] = [{}]
+    output = [NO_MATCH]
+
+    for entry_index, (key, _) in enumerate(entries):
+        node = 0
+        for char in key.lower():
+            code = ord(char)
+            child = children[node].get(code)
+            if child is None:
+                child = len(children)
+                children[node][code] = child
+                children.append({})
+                output.append(NO_MATCH)
+            node = child
+        output[node] = min(output[node], entry_index)
+
+    # Breadth-first pass computing failure links; each state inherits the
+    # best (earliest) entry reachable through its suffixes.
+    fail = [0] * len(children)
+    queue = deque(children[0].values())
+    while queue:
+        node = queue.popleft()
+        output[node] = min(output[node], output[fail[node]])
+        for code, child in children[node].items():
+            state = fail[node]
+            while state and code not in children[state]:
+                state = fail[state]
+            fail[child] = children[state].get(code, 0)
+            queue.append(child)
+
+    edge_start = [0]
+    edge_char: list[int] = []
+    edge_target: list[int] = []
+    for transitions in children:
+        for code in sorted(transitions):
+            edge_char.append(code)
+            edge_target.append(transitions[code])
+        edge_start.append(len(edge_char))
+
+    blob = bytearray()
+    key_offsets, value_offsets = [0], [0]
+    for key, _ in entries:
+        blob += key.encode("utf-8")
+        key_offsets.append(len(blob))
+    value_offsets[0] = len(blob)
+    for _, value in entries:
+        blob += value.encode("utf-8")
+        value_offsets.append(len(blob))
+
+    header = HEADER.pack(
+        MAGIC, VERSION, len(children), len(edge_char), len(entries), len(blob)
+    )
+    return b"".join(
+        [
+            header,
+            _uint32(edge_start),
+            _uint32(edge_char),
+            _uint32(edge_target),
+            _uint32(fail),
+            _uint32(output),
+            _uint32(key_offsets),
+            _uint32(value_offsets),
+            bytes(blob),
+        ]
+    )
+
+
+def load_table(path: Path) -> dict[str, str]:
+    """Load a two-column (key, value) CSV file, skipping a header row."""
+
+    with path.open(encoding="utf-8", newline="") as file:
+        rows = csv.reader(file)
+        table = {row[0]: row[1] for row in rows if len(row) >= 2}
+
+    table.pop("key", None)
+    return table
+
+
+# ==========================================================
+# Memory-Mapped Index
+# ==========================================================
+
+
+class KnowledgeIndex:
+    """Read-only view over a compiled index (bytes or a memory-mapped file)."""
+
+    def __init__(self, buffer: bytes | mmap.mmap) -> None:
+        magic, version, states, edges, entries, blob_size = HEADER.unpack_from(buffer)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError("Not a compiled knowledge index.")
+
+        self._buffer = buffer
+        view = memoryview(buffer)
+        offset = HEADER.size
+
+        def take(count: int) -> memoryview:
+            nonlocal offset
+            chunk = view[offset : offset + 4 * count].cast("I")
+            offset += 4 * count
+            return chunk
+
+        self._edge_start = take(states + 1)
+        self._edge_char = take(edges)
+        self._edge_target = take(edges)
+        self._fail = take(states)
+        self._output = take(states)
+        self._key_offsets = take(entries + 1)
+        self._value_offsets = take(entries + 1)
+        self._blob = view[offset : offset + blob_size]
+        self.size = entries
+
+    @classmethod
+    def from_table(cls, table: Mapping[str, str]) -> KnowledgeIndex:
+        return cls(compile_index(table))
+
+    @classmethod
+    def open(cls, path: Path) -> KnowledgeIndex:
+        """Memory-map a compiled index file; pages load lazily on access."""
+
+        with path.open("rb") as file:
+            mapped = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        return cls(mapped)
+
+    def _goto(self, state: int, code: int) -> int:
+        low, high = self._edge_start[state], self._edge_start[state + 1]
+        position = bisect_left(self._edge_char, code, low, high)
+        if position < high and self._edge_char[position] == code:
+            return self._edge_target[position]
+        return 0
+
+    def _entry(self, index: int) -> tuple[str, str]:
+        key = self._blob[self._key_offsets[index] : self._key_offsets[index + 1]]
+        value = self._blob[self._value_offsets[index] : self._value_offsets[index + 1]]
+        return bytes(key).decode("utf-8"), bytes(value).decode("utf-8")
+
+    def find(self, query: str) -> tuple[str, str] | None:
+        """Return the earliest table entry whose key occurs in `query`."""
+
+        state, best = 0, NO_MATCH
+        for char in query.lower():
+            code = ord(char)
+            target = self._goto(state, code)
+            while not target and state:
+                state = self._fail[state]
+                target = self._goto(state, code)
+            state = target
+            best = min(best, self._output[state])
+
+        return None if best == NO_MATCH else self._entry(best)
+
+
+def build_lookup_tool(index: KnowledgeIndex) -> BaseTool:
+    """Create the `web_search_mock` tool backed by a compiled index."""
+
+    @tool("web_search_mock")
+    def web_search_mock(query: str) -> str:
+        """
+        Mocked web search tool. Returns a hardcoded result.
+        """
+
+        match = index.find(query)
+        if match is None:
+            return NOT_FOUND_ANSWER
+
+        key, value = match
+        return ANSWER_TEMPLATE.format(key=key, value=value)
+
+    return web_search_mock
+
+
+def default_index() -> KnowledgeIndex:
+    """Use `KNOWLEDGE_INDEX_PATH` when set, else the built-in capitals table."""
+
+    path = os.getenv("KNOWLEDGE_INDEX_PATH", "").strip()
+    if path:
+        return KnowledgeIndex.open(Path(path))
+
+    return KnowledgeIndex.from_table(CAPITALS)
+
+
+web_search_mock = build_lookup_tool(default_index())
+
+
+# ==========================================================
+# Benchmark
+# ==========================================================
+
+
+def linear_lookup(table: Mapping[str, str], query: str) -> tuple[str, str] | None:
+    """The original `web_search_mock` algorithm, for comparison."""
+
+    for key, value in table.items():
+        if key.lower() in query.lower():
+            return key, value
+    return None
+
+
+def synthetic_table(size: int, rng: random.Random) -> dict[str, str]:
+    syllables = ["ka", "lo", "mi", "ra", "su", "te", "vo", "an", "el", "is", "or"]
+    table: dict[str, str] = {}
+    while len(table) < size:
+        name = "".join(rng.choices(syllables, k=5)).capitalize()
+        table[f"{name}ia"] = f"{name} City"
+    return table
+
+
+def run_benchmark(directory: Path) -> None:
+    """Compare linear scan and indexed lookup latency across table sizes."""
+
+    rng = random.Random(42)
+    print(
+        f"{'entries':>9}{'build':>10}{'file':>10}{'open':>10}"
+        f"{'linear':>12}{'indexed':>12}"
+    )
+
+    for size in BENCH_SIZES:
+        table = synthetic_table(size, rng)
+        keys = list(table)
+        queries = [
+            f"What is the capital of {rng.choice(keys)} these days?"
+            for _ in range(BENCH_QUERIES)
+        ]
+
+        start = time.perf_counter()
+        path = directory / f"bench_{size}.idx"
+        path.write_bytes(compile_index(table))
+        build = time.perf_counter() - start
+
+        start = time.perf_counter()
+        index = KnowledgeIndex.open(path)
+        opened = time.perf_counter() - start
+
+        start = time.perf_counter()
+        expected = [linear_lookup(table, query) for query in queries]
+        linear = (time.perf_counter() - start) / len(queries)
+
+        start = time.perf_counter()
+        found = [index.find(query) for query in queries]
+        indexed = (time.perf_counter() - start) / len(queries)
+
+        assert found == expected
+        print(
+            f"{size:>9,}{build:>9.2f}s{path.stat().st_size / 1e6:>8.1f}MB"
+            f"{opened * 1000:>8.2f}ms{linear * 1e6:>10.1f}µs{indexed * 1e6:>10.1f}µs"
+        )
+
+
+# ==========================================================
+# Entrypoint
+# ==========================================================
+
+
+def main() -> None:
+    """Main entrypoint for the application."""
+
+    parser = argparse.ArgumentParser(description="Indexed knowledge lookup tool")
+    commands = parser.add_subparsers(dest="command")
+
+    compile_command = commands.add_parser("compile", help="compile a CSV table")
+    compile_command.add_argument("table", type=Path)
+    compile_command.add_argument("output", type=Path)
+
+    bench_command = commands.add_parser("bench", help="latency vs. table size")
+    bench_command.add_argument("--dir", type=Path, default=Path(tempfile.gettempdir()))
+
+    args = parser.parse_args()
+
+    if args.command == "compile":
+        table = load_table(args.table)
+        args.output.write_bytes(compile_index(table))
+        print(f"Compiled {len(table)} entries into {args.output}.")
+    elif args.command == "bench":
+        run_benchmark(args.dir)
+    else:
+        for query in ("What is the capital of France?", "Capital of Iran?"):
+            print(f"{query} → {web_search_mock.invoke(query)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,506 @@
+"""
+Parallel Tool-Calling Agent
+---------------------------
+
+Agent runner built on native tool calling (`bind_tools`) instead of the
+text-based ReAct loop of `create_react_agent` + `AgentExecutor`:
+- Every tool call requested in a single model turn runs concurrently
+  (thread pool for `invoke`, asyncio for `ainvoke`)
+- Each tool has its own timeout, counted from when the call was submitted;
+  a timed-out call becomes an error observation instead of stalling the
+  whole turn, and a hung worker thread is left behind with its retired pool
+  instead of holding a slot that later turns need
+- `return_direct` keeps the `AgentExecutor` semantics: when a turn consists
+  of a single call to a `return_direct` tool, its output is the answer
+
+Running this script compares LLM turns and wall-clock time against the
+ReAct `AgentExecutor` on multi-part questions, using scripted fake models.
+Pass `--live` to run the agent against OpenAI instead.
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import re
+import threading
+import time
+from collections.abc import Callable, Sequence
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from typing import Any
+
+from dotenv import load_dotenv
+from langchain_classic.agents import AgentExecutor, create_react_agent
+from langchain_core.callbacks import (
+    AsyncCallbackManagerForLLMRun,
+    BaseCallbackHandler,
+    CallbackManagerForLLMRun,
+)
+from langchain_core.language_models import BaseChatModel, LanguageModelInput
+from langchain_core.messages import (
+    AIMessage,
+    BaseMessage,
+    HumanMessage,
+    SystemMessage,
+    ToolCall,
+    ToolMessage,
+)
+from langchain_core.outputs import ChatGeneration, ChatResult
+from langchain_core.prompts import PromptTemplate
+from langchain_core.runnables import Runnable
+from langchain_core.tools import BaseTool, StructuredTool
+from p03_bounded_calculator_engine import calculator
+from p04_knowledge_lookup_index import CAPITALS, web_search_mock
+
+# ==========================================================
+# Configuration
+# ==========================================================
+
+MAX_ITERATIONS = 3
+DEFAULT_TOOL_TIMEOUT_SECONDS = 10.0
+MAX_PARALLEL_TOOLS = 8
+
+SYSTEM_PROMPT = (
+    "Answer the user's question using only the information you get from "
+    "the tools. Call every tool you need in a single turn when the calls "
+    "do not depend on each other. If the tools do not provide the "
+    "information, say you don't know."
+)
+
+FAKE_LLM_LATENCY_SECONDS = 0.2
+FAKE_TOOL_LATENCY_SECONDS = 0.1
+
+QUESTIONS = [
+    "What are the capitals of France, Germany and Italy?",
+    "What is the capital of Spain and how much is 12*7?",
+    "What are the capitals of Brazil and the United States?",
+]
+
+REACT_PROMPT = PromptTemplate.from_template(
+    """
+Answer the following questions as best you can. You have access to the following tools.
+
+{tools}
+
+Use the following format:
+
+Question: the input question you must answer
+Thought: you should always think about what to do
+Action: the action to take, should be one of [{tool_names}]
+Action Input: the input to the action
+Observation: the result of the action
+... (this Thought/Action/Action Input/Observation can repeat N times)
+Thought: I now know the final answer
+Final Answer: the final answer to the original input question
+
+Begin!
+
+Question: {input}
+Thought:{agent_scratchpad}"""
+)
+
+
+# ==========================================================
+# Parallel Agent
+# ==========================================================
+
+
+class ParallelToolAgent:
+    """Tool-calling agent that runs all calls of a turn concurrently."""
+
+    def __init__(
+        self,
+        llm: BaseChatModel,
+        tools: Sequence[BaseTool],
+        max_iterations: int = MAX_ITERATIONS,
+        tool_timeouts: dict[str, float] | None = None,
+        default_timeout: float = DEFAULT_TOOL_TIMEOUT_SECONDS,
+        system_prompt: str = SYSTEM_PROMPT,
+    ) -> None:
+        self.tools = {tool.name: tool for tool in tools}
+        self.llm: Runnable[Any, BaseMessage] = llm.bind_tools(list(tools))
+        self.max_iterations = max_iterations
+        self.tool_timeouts = tool_timeouts or {}
+        self.default_timeout = default_timeout
+        self.system_prompt = system_prompt
+        self._executor = ThreadPoolExecutor(max_workers=MAX_PARALLEL_TOOLS)
+        self._executor_lock = threading.Lock()
+
+    # ---------- Helpers ----------
+
+    def _timeout(self, name: str) -> float:
+        return self.tool_timeouts.get(name, self.default_timeout)
+
+    def _initial_messages(self, question: str) -> list[BaseMessage]:
+        return [SystemMessage(self.system_prompt), HumanMessage(question)]
+
+    def _direct_answer(
+        self, calls: list[ToolCall], observations: list[ToolMessage]
+    ) -> str | None:
+        """Mirror `AgentExecutor`: a lone `return_direct` call ends the run."""
+
+        if len(calls) != 1:
+            return None
+
+        tool = self.tools.get(calls[0]["name"])
+        if tool is None or not tool.return_direct:
+            return None
+
+        return str(observations[0].content)
+
+    def _result(
+        self, question: str, output: str, turns: int, calls: int
+    ) -> dict[str, Any]:
+        return {
+            "input": question,
+            "output": output,
+            "turns": turns,
+            "tool_calls": calls,
+        }
+
+    # ---------- Sync path ----------
+
+    def _submit(self, tool: BaseTool, args: Any) -> Future[Any]:
+        with self._executor_lock:
+            return self._executor.submit(tool.invoke, args)
+
+    def _retire_executor(self) -> None:
+        """
+        Replace the pool after a running call timed out.
+
+        The worker thread cannot be interrupted, so the old pool is shut
+        down without waiting and keeps the hung thread; new calls get a
+        fresh pool with every slot free.
+        """
+
+        with self._executor_lock:
+            self._executor.shutdown(wait=False)
+            self._executor = ThreadPoolExecutor(max_workers=MAX_PARALLEL_TOOLS)
+
+    def _run_tools(self, calls: list[ToolCall]) -> list[ToolMessage]:
+        contents: list[str] = [""] * len(calls)
+        pending: dict[Future[Any], int] = {}
+        deadlines: dict[Future[Any], float] = {}
+
+        for index, call in enumerate(calls):
+            tool = self.tools.get(call["name"])
+            if tool is None:
+                contents[index] = f"Error: unknown tool {call['name']}"
+                continue
+            future = self._submit(tool, call["args"])
+            pending[future] = index
+            deadlines[future] = time.monotonic() + self._timeout(call["name"])
+
+        retire = False
+        while pending:
+            next_deadline = min(deadlines[future] for future in pending)
+            done, _ = wait(
+                pending,
+                timeout=max(0.0, next_deadline - time.monotonic()),
+                return_when=FIRST_COMPLETED,
+            )
+            for future in done:
+                index = pending.pop(future)
+                try:
+                    contents[index] = str(future.result())
+                except Exception as error:
+                    contents[index] = f"Error: {error}"
+
+            now = time.monotonic()
+            for future in [f for f in pending if deadlines[f] <= now]:
+                index = pending.pop(future)
+                # A call still queued is dropped; a running one keeps its thread.
+                retire |= not future.cancel()
+                contents[index] = f"Error: {calls[index]['name']} timed out"
+
+        if retire:
+            self._retire_executor()
+
+        return [
+            ToolMessage(content, tool_call_id=call["id"])
+            for call, content in zip(calls, contents, strict=True)
+        ]
+
+    def invoke(self, question: str) -> dict[str, Any]:
+        """Answer `question`, running the tools of each turn in threads."""
+
+        messages = self._initial_messages(question)
+        total_calls = 0
+
+        for turn in range(1, self.max_iterations + 1):
+            response = self.llm.invoke(messages)
+            calls = getattr(response, "tool_calls", [])
+            if not calls:
+                return self._result(question, str(response.content), turn, total_calls)
+
+            observations = self._run_tools(calls)
+            total_calls += len(calls)
+            if (direct := self._direct_answer(calls, observations)) is not None:
+                return self._result(question, direct, turn, total_calls)
+
+            messages += [response, *observations]
+
+        return self._result(
+            question, "Agent stopped due to iteration limit.", turn, total_calls
+        )
+
+    # ---------- Async path ----------
+
+    async def _arun_tool(self, call: ToolCall) -> ToolMessage:
+        tool = self.tools.get(call["name"])
+        if tool is None:
+            content = f"Error: unknown tool {call['name']}"
+        else:
+            try:
+                result = await asyncio.wait_for(
+                    tool.ainvoke(call["args"]), timeout=self._timeout(call["name"])
+                )
+                content = str(result)
+            except TimeoutError:
+                content = f"Error: {call['name']} timed out"
+            except Exception as error:
+                content = f"Error: {error}"
+
+        return ToolMessage(content, tool_call_id=call["id"])
+
+    async def ainvoke(self, question: str) -> dict[str, Any]:
+        """Answer `question`, running the tools of each turn as asyncio tasks."""
+
+        messages = self._initial_messages(question)
+        total_calls = 0
+
+        for turn in range(1, self.max_iterations + 1):
+            response = await self.llm.ainvoke(messages)
+            calls = getattr(response, "tool_calls", [])
+            if not calls:
+                return self._result(question, str(response.content), turn, total_calls)
+
+            observations = list(
+                await asyncio.gather(*(self._arun_tool(call) for call in calls))
+            )
+            total_calls += len(calls)
+            if (direct := self._direct_answer(calls, observations)) is not None:
+                return self._result(question, direct, turn, total_calls)
+
+            messages += [response, *observations]
+
+        return self._result(
+            question, "Agent stopped due to iteration limit.", turn, total_calls
+        )
+
+
+# ==========================================================
+# Scripted Fake Models
+# ==========================================================
+
+
+def plan_calls(question: str) -> list[tuple[str, str]]:
+    """Tool calls a well-behaved model would make for a multi-part question."""
+
+    calls = [
+        ("web_search_mock", f"capital of {country}")
+        for country in CAPITALS
+        if country.lower() in question.lower()
+    ]
+    calls += [
+        ("calculator", expression.strip())
+        for expression in re.findall(r"\d[\d\s.+\-*/()]*[\d)]", question)
+        if any(op in expression for op in "+-*/")
+    ]
+    return calls
+
+
+class ScriptedToolCallingModel(BaseChatModel):
+    """Requests every planned tool call in one turn, then answers."""
+
+    latency: float = FAKE_LLM_LATENCY_SECONDS
+
+    @property
+    def _llm_type(self) -> str:
+        return "scripted-tool-calling-model"
+
+    def bind_tools(
+        self,
+        tools: Sequence[dict[str, Any] | type | Callable[..., Any] | BaseTool],
+        *,
+        tool_choice: str | None = None,
+        **kwargs: Any,
+    ) -> Runnable[LanguageModelInput, AIMessage]:
+        return self
+
+    def _generate(
+        self,
+        messages: list[BaseMessage],
+        stop: list[str] | None = None,
+        run_manager: CallbackManagerForLLMRun | None = None,
+        **kwargs: Any,
+    ) -> ChatResult:
+        time.sleep(self.latency)
+        observations = [m for m in messages if isinstance(m, ToolMessage)]
+
+        if observations:
+            message = AIMessage(" ".join(str(m.content) for m in observations))
+        else:
+            question = str(messages[-1].content)
+            message = AIMessage(
+                "",
+                tool_calls=[
+                    {"name": name, "args": {"query": arg}, "id": f"call_{i}"}
+                    if name == "web_search_mock"
+                    else {"name": name, "args": {"expression": arg}, "id": f"call_{i}"}
+                    for i, (name, arg) in enumerate(plan_calls(question))
+                ],
+            )
+
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+
+class ScriptedReActModel(BaseChatModel):
+    """Emits one ReAct action per turn, then a final answer."""
+
+    latency: float = FAKE_LLM_LATENCY_SECONDS
+
+    @property
+    def _llm_type(self) -> str:
+        return "scripted-react-model"
+
+    def _reply(self, messages: list[BaseMessage]) -> ChatResult:
+        prompt = str(messages[-1].content)
+        question = prompt.rsplit("Question:", 1)[1].split("\n", 1)[0]
+        plan = plan_calls(question)
+        step = prompt.count("Observation:") - 1  # the template mentions it once
+
+        if step < len(plan):
+            name, arg = plan[step]
+            text = f"I need {name}.\nAction: {name}\nAction Input: {arg}"
+        else:
+            text = "I now know the final answer\nFinal Answer: done"
+
+        input_tokens, output_tokens = len(prompt) // 4, len(text) // 4
+        message = AIMessage(
+            text,
+            usage_metadata={
+                "input_tokens": input_tokens,
+                "output_tokens": output_tokens,
+                "total_tokens": input_tokens + output_tokens,
+            },
+        )
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+    def _generate(
+        self,
+        messages: list[BaseMessage],
+        stop: list[str] | None = None,
+        run_manager: CallbackManagerForLLMRun | None = None,
+        **kwargs: Any,
+    ) -> ChatResult:
+        time.sleep(self.latency)
+        return self._reply(messages)
+
+    async def _agenerate(
+        self,
+        messages: list[BaseMessage],
+        stop: list[str] | None = None,
+        run_manager: AsyncCallbackManagerForLLMRun | None = None,
+        **kwargs: Any,
+    ) -> ChatResult:
+        await asyncio.sleep(self.latency)
+        return self._reply(messages)
+
+
+def slow(tool: BaseTool, latency: float) -> BaseTool:
+    """Wrap a tool so it takes `latency` seconds, like a real lookup would."""
+
+    def run(*args: Any, **kwargs: Any) -> Any:
+        time.sleep(latency)
+        return tool.invoke(args[0] if args else kwargs)
+
+    return StructuredTool.from_function(
+        func=run,
+        name=tool.name,
+        description=tool.description,
+        args_schema=tool.args_schema,
+        return_direct=tool.return_direct,
+    )
+
+
+# ==========================================================
+# Comparison
+# ==========================================================
+
+
+class LLMCallCounter(BaseCallbackHandler):
+    """Count chat model calls, i.e. agent turns."""
+
+    def __init__(self) -> None:
+        self.calls = 0
+
+    def on_chat_model_start(self, *args: Any, **kwargs: Any) -> None:
+        self.calls += 1
+
+
+def run_comparison() -> None:
+    """Compare ReAct `AgentExecutor` with the parallel tool-calling agent."""
+
+    tools = [
+        slow(calculator, FAKE_TOOL_LATENCY_SECONDS),
+        slow(web_search_mock, FAKE_TOOL_LATENCY_SECONDS),
+    ]
+
+    react_executor = AgentExecutor.from_agent_and_tools(
+        agent=create_react_agent(
+            llm=ScriptedReActModel(), tools=tools, prompt=REACT_PROMPT
+        ),
+        tools=tools,
+        max_iterations=len(CAPITALS) + 2,
+    )
+    parallel_agent = ParallelToolAgent(ScriptedToolCallingModel(), tools)
+
+    print(f"{'question':<56}{'agent':<10}{'turns':>6}{'wall':>9}")
+    for question in QUESTIONS:
+        counter = LLMCallCounter()
+        start = time.perf_counter()
+        react_executor.invoke({"input": question}, config={"callbacks": [counter]})
+        react_elapsed = time.perf_counter() - start
+
+        start = time.perf_counter()
+        result = parallel_agent.invoke(question)
+        parallel_elapsed = time.perf_counter() - start
+
+        print(f"{question:<56}{'react':<10}{counter.calls:>6}{react_elapsed:>8.2f}s")
+        print(f"{'':<56}{'parallel':<10}{result['turns']:>6}{parallel_elapsed:>8.2f}s")
+
+
+def build_live_agent() -> ParallelToolAgent:
+    """Create the agent with the OpenAI model used by the ch03 scripts."""
+
+    from langchain_openai import ChatOpenAI
+
+    llm = ChatOpenAI(model="gpt-5-mini", disable_streaming=True)
+    return ParallelToolAgent(llm, [calculator, web_search_mock])
+
+
+# ==========================================================
+# Entrypoint
+# ==========================================================
+
+
+def main() -> None:
+    """Main entrypoint for the application."""
+
+    parser = argparse.ArgumentParser(description="Parallel tool-calling agent")
+    parser.add_argument("--live", action="store_true", help="use OpenAI")
+    args = parser.parse_args()
+
+    if not args.live:
+        run_comparison()
+        return
+
+    load_dotenv()
+    agent = build_live_agent()
+    for question in [*QUESTIONS, "How much is 10+10?"]:
+        print(agent.invoke(question))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,346 @@
+"""
+Cross-Invocation Tool Result Cache
+----------------------------------
+
+Per-tool result cache shared by every agent invocation in the process:
+- Declared per tool, on top of `@tool`:
+    - `@cached()` for pure tools (results never expire)
+    - `@cached(ttl=300)` for lookup tools (results expire after the TTL)
+- Cache keys are built from normalized arguments (trimmed, collapsed
+  whitespace), so trivially different inputs share an entry; case is kept,
+  since a tool may treat `pi` and `PI` differently
+- Calculator expressions are keyed by their parsed form, so `10+10` and
+  `10 + 10` share an entry while any change in meaning does not
+- `Error: ...` observations are never stored, so a transient failure is
+  retried on the next call instead of being replayed to the agent
+- Each tool cache is bounded and evicts the least recently used entries
+
+A hit returns the stored observation to the agent without executing the
+tool and dispatches a `tool_cache_hit` custom event, so the hit shows up in
+the run trace (LangSmith, callbacks) next to the tool call.
+"""
+
+from __future__ import annotations
+
+import ast
+import json
+import threading
+import time
+from collections import OrderedDict
+from collections.abc import Callable
+from dataclasses import dataclass
+from typing import Any
+
+from langchain_core.callbacks import (
+    AsyncCallbackManagerForToolRun,
+    BaseCallbackHandler,
+    CallbackManagerForToolRun,
+)
+from langchain_core.callbacks.manager import (
+    adispatch_custom_event,
+    dispatch_custom_event,
+)
+from langchain_core.tools import BaseTool
+from p03_bounded_calculator_engine import MAX_EXPRESSION_LENGTH, normalize
+from pydantic import PrivateAttr
+
+# ==========================================================
+# Configuration
+# ==========================================================
+
+DEFAULT_MAX_ENTRIES = 1024
+CACHE_HIT_EVENT = "tool_cache_hit"
+ERROR_PREFIX = "Error:"
+
+DEMO_RUNS = 30
+DEMO_TOOL_LATENCY_SECONDS = 0.05
+DEMO_QUESTIONS = [
+    "What is the capital of France?",
+    "What is the capital of  FRANCE?",
+    "How much is 10+10?",
+    "How much is 10 + 10?",
+]
+
+
+# ==========================================================
+# LRU Cache
+# ==========================================================
+
+
+@dataclass
+class CacheStats:
+    hits: int = 0
+    misses: int = 0
+    evictions: int = 0
+
+
+class ToolResultCache:
+    """Thread-safe LRU cache with optional per-entry expiration."""
+
+    def __init__(self, max_entries: int = DEFAULT_MAX_ENTRIES) -> None:
+        self.max_entries = max_entries
+        self._entries: OrderedDict[str, tuple[Any, float | None]] = OrderedDict()
+        self._lock = threading.Lock()
+        self.stats = CacheStats()
+
+    def get(self, key: str) -> tuple[bool, Any]:
+        """Return `(True, value)` on a fresh hit, `(False, None)` otherwise."""
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                value, expires_at = entry
+                if expires_at is None or expires_at > time.monotonic():
+                    self._entries.move_to_end(key)
+                    self.stats.hits += 1
+                    return True, value
+                del self._entries[key]
+
+            self.stats.misses += 1
+            return False, None
+
+    def set(self, key: str, value: Any, ttl: float | None) -> None:
+        expires_at = None if ttl is None else time.monotonic() + ttl
+
+        with self._lock:
+            self._entries[key] = (value, expires_at)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.stats.evictions += 1
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+# ==========================================================
+# Key Normalization
+# ==========================================================
+
+
+def normalize_value(value: Any) -> Any:
+    """Trim and collapse whitespace in strings, recursively."""
+
+    if isinstance(value, str):
+        return " ".join(value.split())
+    if isinstance(value, dict):
+        return {key: normalize_value(item) for key, item in value.items()}
+    if isinstance(value, list | tuple):
+        return [normalize_value(item) for item in value]
+    return value
+
+
+def normalize_expression(value: Any) -> Any:
+    """
+    Canonical source of a calculator expression.
+
+    Expressions that parse to the same syntax tree evaluate the same way, so
+    they share a key; anything the calculator would reject before parsing,
+    or that does not parse, keeps its collapsed text.
+    """
+
+    if isinstance(value, dict):
+        return {key: normalize_expression(item) for key, item in value.items()}
+    if isinstance(value, str):
+        expression = normalize(value)
+        if len(expression) > MAX_EXPRESSION_LENGTH:
+            return expression
+        try:
+            return ast.unparse(ast.parse(expression, mode="eval"))
+        except (SyntaxError, ValueError):
+            return expression
+    return value
+
+
+def is_error(value: Any) -> bool:
+    """Tools report failures as `Error: ...` observations."""
+
+    return isinstance(value, str) and value.startswith(ERROR_PREFIX)
+
+
+# ==========================================================
+# Cached Tool
+# ==========================================================
+
+
+class CachedTool(BaseTool):
+    """Wrap a tool so that repeated calls are served from a shared cache."""
+
+    tool: BaseTool
+    ttl: float | None = None
+    normalize: Callable[[Any], Any] = normalize_value
+    max_entries: int = DEFAULT_MAX_ENTRIES
+
+    _cache: ToolResultCache = PrivateAttr()
+
+    def model_post_init(self, context: Any) -> None:
+        self._cache = ToolResultCache(self.max_entries)
+
+    @property
+    def cache(self) -> ToolResultCache:
+        return self._cache
+
+    def _arguments(self, args: tuple[Any, ...], kwargs: dict[str, Any]) -> Any:
+        # A plain string input is the value of the tool's single argument.
+        if args:
+            return args[0]
+        return kwargs
+
+    def _key(self, arguments: Any) -> str:
+        if isinstance(arguments, str):
+            arguments = {next(iter(self.tool.args), "input"): arguments}
+        return json.dumps(self.normalize(arguments), sort_keys=True, default=str)
+
+    def _hit_event(self, key: str) -> dict[str, Any]:
+        return {"tool": self.name, "key": key, "ttl": self.ttl}
+
+    def _run(
+        self,
+        *args: Any,
+        run_manager: CallbackManagerForToolRun | None = None,
+        **kwargs: Any,
+    ) -> Any:
+        arguments = self._arguments(args, kwargs)
+        key = self._key(arguments)
+
+        found, value = self._cache.get(key)
+        if found:
+            dispatch_custom_event(CACHE_HIT_EVENT, self._hit_event(key))
+            return value
+
+        callbacks = run_manager.get_child() if run_manager else None
+        value = self.tool.invoke(arguments, config={"callbacks": callbacks})
+        if not is_error(value):
+            self._cache.set(key, value, self.ttl)
+        return value
+
+    async def _arun(
+        self,
+        *args: Any,
+        run_manager: AsyncCallbackManagerForToolRun | None = None,
+        **kwargs: Any,
+    ) -> Any:
+        arguments = self._arguments(args, kwargs)
+        key = self._key(arguments)
+
+        found, value = self._cache.get(key)
+        if found:
+            await adispatch_custom_event(CACHE_HIT_EVENT, self._hit_event(key))
+            return value
+
+        callbacks = run_manager.get_child() if run_manager else None
+        value = await self.tool.ainvoke(arguments, config={"callbacks": callbacks})
+        if not is_error(value):
+            self._cache.set(key, value, self.ttl)
+        return value
+
+
+def cached(
+    ttl: float | None = None,
+    max_entries: int = DEFAULT_MAX_ENTRIES,
+    normalize: Callable[[Any], Any] = normalize_value,
+) -> Callable[[BaseTool], CachedTool]:
+    """
+    Declare a tool as cacheable.
+
+    Args:
+        ttl: Seconds before an entry expires; `None` caches forever, which
+            is only correct for pure tools.
+        max_entries: LRU bound for this tool's cache.
+        normalize: Function applied to the arguments before building the key.
+    """
+
+    def decorator(tool: BaseTool) -> CachedTool:
+        return CachedTool(
+            tool=tool,
+            name=tool.name,
+            description=tool.description,
+            args_schema=tool.args_schema,
+            return_direct=tool.return_direct,
+            ttl=ttl,
+            max_entries=max_entries,
+            normalize=normalize,
+        )
+
+    return decorator
+
+
+class CacheHitRecorder(BaseCallbackHandler):
+    """Collect `tool_cache_hit` events emitted during a run."""
+
+    def __init__(self) -> None:
+        self.hits: list[dict[str, Any]] = []
+
+    def on_custom_event(self, name: str, data: Any, **kwargs: Any) -> None:
+        if name == CACHE_HIT_EVENT:
+            self.hits.append(data)
+
+
+# ==========================================================
+# Demo Runner
+# ==========================================================
+
+
+def run_demo() -> None:
+    """Run repeated questions through a ReAct agent with cached tools."""
+
+    # Imported here: the agents that use the cache must not load the demo fakes.
+    from langchain_classic.agents import AgentExecutor, create_react_agent
+    from p03_bounded_calculator_engine import calculator
+    from p04_knowledge_lookup_index import web_search_mock
+    from p05_parallel_tool_calling_agent import (
+        REACT_PROMPT,
+        ScriptedReActModel,
+        slow,
+    )
+
+    tools = [
+        cached(normalize=normalize_expression)(
+            slow(calculator, DEMO_TOOL_LATENCY_SECONDS)
+        ),
+        cached(ttl=300)(slow(web_search_mock, DEMO_TOOL_LATENCY_SECONDS)),
+    ]
+    agent_executor = AgentExecutor.from_agent_and_tools(
+        agent=create_react_agent(
+            llm=ScriptedReActModel(latency=0), tools=tools, prompt=REACT_PROMPT
+        ),
+        tools=tools,
+        max_iterations=3,
+        return_intermediate_steps=True,
+    )
+
+    start = time.perf_counter()
+    for run in range(DEMO_RUNS):
+        question = DEMO_QUESTIONS[run % len(DEMO_QUESTIONS)]
+        recorder = CacheHitRecorder()
+        result = agent_executor.invoke(
+            {"input": question}, config={"callbacks": [recorder]}
+        )
+        if run < len(DEMO_QUESTIONS):
+            _, observation = result["intermediate_steps"][-1]
+            status = "hit" if recorder.hits else "miss"
+            print(f"{question:<34} → {observation:<32} [{status}]")
+    elapsed = time.perf_counter() - start
+
+    print(f"\n{DEMO_RUNS} runs in {elapsed:.2f}s")
+    for tool in tools:
+        stats = tool.cache.stats
+        print(
+            f"{tool.name:<16} hits={stats.hits:<4} misses={stats.misses:<4} "
+            f"entries={len(tool.cache)}"
+        )
+
+
+# ==========================================================
+# Entrypoint
+# ==========================================================
+
+
+def main() -> None:
+    """Main entrypoint for the application."""
+
+    run_demo()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,309 @@
+"""
+LLM-Free Fast Path Router
+-------------------------
+
+Pre-agent router that answers trivially answerable queries without calling
+the model:
+- Each registered tool comes with a cheap local matcher (regular expressions
+  over the tool's input shape) that extracts the tool input from the query
+  and scores its confidence
+- When the best match reaches the confidence threshold, the tool is called
+  directly and its output becomes the answer
+- Anything else (multi-part questions, unknown keys, free text) falls back
+  to the agent unchanged
+
+A pure arithmetic question such as "How much is 10+10?" is answered in
+microseconds instead of going through a full ReAct cycle.
+"""
+
+from __future__ import annotations
+
+import argparse
+import re
+import time
+from collections import Counter
+from collections.abc import Callable, Sequence
+from dataclasses import dataclass
+from typing import Any
+
+from dotenv import load_dotenv
+from langchain_classic.agents import AgentExecutor, create_react_agent
+from langchain_core.runnables import Runnable, RunnableConfig, RunnableLambda
+from langchain_core.tools import BaseTool
+from p03_bounded_calculator_engine import (
+    CalculatorError,
+    calculator,
+    compile_expression,
+)
+from p04_knowledge_lookup_index import KnowledgeIndex, default_index, web_search_mock
+from p05_parallel_tool_calling_agent import (
+    REACT_PROMPT,
+    LLMCallCounter,
+    ScriptedReActModel,
+)
+
+# ==========================================================
+# Configuration
+# ==========================================================
+
+DEFAULT_CONFIDENCE_THRESHOLD = 0.9
+
+ARITHMETIC_QUESTION = re.compile(
+    r"(?:(?P<lead>how much is|what is|what's|calculate|compute|evaluate)\s+)?"
+    r"(?P<expression>[\w\s.+\-*/%(),]*\d[\w\s.+\-*/%(),]*?)\s*(?P<end>[?=.!]*)",
+    re.IGNORECASE,
+)
+ARITHMETIC_CUES = frozenset({"how much is", "calculate", "compute", "evaluate"})
+# Dates, phone numbers and ranges: digit groups joined only by dashes.
+DASHED_NUMBERS = re.compile(r"\d+(?:\s*-\s*\d+)+")
+CAPITAL_QUESTION = re.compile(
+    r"(?:(?:what is|what's|tell me)\s+)?the\s+capital\s+(?:city\s+)?of\s+"
+    r"(?P<key>[^?.!]+?)\s*[?.!]*",
+    re.IGNORECASE,
+)
+
+DEMO_ROUNDS = 3
+DEMO_TRAFFIC = [
+    "How much is 10+10?",
+    "12 * 7",
+    "What is the capital of France?",
+    "what's the capital of brazil",
+    "What is the capital of Iran?",
+    "What is the capital of Spain and how much is 12*7?",
+]
+
+type Matcher = Callable[[str], tuple[Any, float] | None]
+
+
+# ==========================================================
+# Matchers
+# ==========================================================
+
+
+def arithmetic_matcher(question: str) -> tuple[str, float] | None:
+    """Match a question that is, or directly asks for, an arithmetic expression."""
+
+    match = ARITHMETIC_QUESTION.fullmatch(question.strip())
+    if match is None:
+        return None
+
+    expression = match["expression"]
+    if not any(op in expression for op in "+-*/%("):
+        return None
+
+    # "2024-10-15" is a date, not 1999: dashes alone only count as
+    # subtraction when the question explicitly asks for a calculation.
+    cued = (match["lead"] or "").lower() in ARITHMETIC_CUES or "=" in match["end"]
+    if not cued and DASHED_NUMBERS.fullmatch(expression.strip()):
+        return None
+
+    # Compilation is memoized and rejects anything outside the whitelist,
+    # so free text that merely contains digits never reaches the tool.
+    try:
+        compile_expression(expression)
+    except CalculatorError:
+        return None
+
+    return expression, 0.95 if match["lead"] else 1.0
+
+
+def capital_matcher(index: KnowledgeIndex | None = None) -> Matcher:
+    """Match "what is the capital of <key>" when <key> is exactly a known key."""
+
+    index = index or default_index()
+
+    def match(question: str) -> tuple[str, float] | None:
+        found = CAPITAL_QUESTION.fullmatch(question.strip())
+        if found is None:
+            return None
+
+        entry = index.find(found["key"])
+        if entry is None:
+            return None
+
+        # A key buried in a longer phrase ("Spain and ...") may hide a second
+        # request, so it only gets low confidence.
+        exact = entry[0].casefold() == found["key"].casefold()
+        return question, 0.95 if exact else 0.5
+
+    return match
+
+
+# ==========================================================
+# Router
+# ==========================================================
+
+
+@dataclass(frozen=True)
+class FastPathRule:
+    tool: BaseTool
+    matcher: Matcher
+
+
+@dataclass(frozen=True)
+class Route:
+    tool: BaseTool
+    tool_input: Any
+    confidence: float
+
+
+class FastPathRouter:
+    """Dispatch queries straight to a tool when a local matcher is confident."""
+
+    def __init__(
+        self,
+        rules: Sequence[FastPathRule],
+        threshold: float = DEFAULT_CONFIDENCE_THRESHOLD,
+    ) -> None:
+        self.rules = list(rules)
+        self.threshold = threshold
+        self.stats: Counter[str] = Counter()
+
+    def route(self, question: str) -> Route | None:
+        """Return the most confident route above the threshold, if any."""
+
+        best: Route | None = None
+        for rule in self.rules:
+            matched = rule.matcher(question)
+            if matched is None:
+                continue
+            tool_input, confidence = matched
+            if best is None or confidence > best.confidence:
+                best = Route(rule.tool, tool_input, confidence)
+
+        if best is None or best.confidence < self.threshold:
+            return None
+        return best
+
+    def _answer(self, inputs: dict[str, Any], route: Route, output: Any) -> dict:
+        self.stats[route.tool.name] += 1
+        return {**inputs, "output": output, "fast_path": route.tool.name}
+
+    def wrap(self, agent: Runnable[dict, dict]) -> Runnable[dict, dict]:
+        """Put the router in front of `agent`, keeping its input/output shape."""
+
+        def invoke(inputs: dict[str, Any], config: RunnableConfig) -> dict:
+            route = self.route(inputs["input"])
+            if route is None:
+                self.stats["agent"] += 1
+                return agent.invoke(inputs, config=config)
+
+            output = route.tool.invoke(route.tool_input, config=config)
+            return self._answer(inputs, route, output)
+
+        async def ainvoke(inputs: dict[str, Any], config: RunnableConfig) -> dict:
+            route = self.route(inputs["input"])
+            if route is None:
+                self.stats["agent"] += 1
+                return await agent.ainvoke(inputs, config=config)
+
+            output = await route.tool.ainvoke(route.tool_input, config=config)
+            return self._answer(inputs, route, output)
+
+        return RunnableLambda(invoke, afunc=ainvoke, name="FastPathRouter")
+
+
+def default_rules(
+    calculator_tool: BaseTool = calculator,
+    lookup_tool: BaseTool = web_search_mock,
+) -> list[FastPathRule]:
+    """Matchers for the ch03 `calculator` and `web_search_mock` tools."""
+
+    return [
+        FastPathRule(calculator_tool, arithmetic_matcher),
+        FastPathRule(lookup_tool, capital_matcher()),
+    ]
+
+
+# ==========================================================
+# Demo Runner
+# ==========================================================
+
+
+def build_agent(llm: Any, tools: list[BaseTool]) -> AgentExecutor:
+    return AgentExecutor.from_agent_and_tools(
+        agent=create_react_agent(llm=llm, tools=tools, prompt=REACT_PROMPT),
+        tools=tools,
+        handle_parsing_errors=True,
+        max_iterations=3,
+    )
+
+
+def run_demo(threshold: float) -> None:
+    """Compare agent-only and routed latency on mixed traffic."""
+
+    tools = [calculator, web_search_mock]
+    agent = build_agent(ScriptedReActModel(), tools)
+    router = FastPathRouter(default_rules(), threshold)
+    routed = router.wrap(agent)
+
+    print(f"{'question':<52}{'path':<18}{'agent':>10}{'routed':>12}")
+    totals = {"agent": 0.0, "routed": 0.0}
+    llm_calls = {"agent": LLMCallCounter(), "routed": LLMCallCounter()}
+
+    for round_index in range(DEMO_ROUNDS):
+        for question in DEMO_TRAFFIC:
+            start = time.perf_counter()
+            agent.invoke(
+                {"input": question}, config={"callbacks": [llm_calls["agent"]]}
+            )
+            agent_elapsed = time.perf_counter() - start
+
+            start = time.perf_counter()
+            result = routed.invoke(
+                {"input": question}, config={"callbacks": [llm_calls["routed"]]}
+            )
+            routed_elapsed = time.perf_counter() - start
+
+            totals["agent"] += agent_elapsed
+            totals["routed"] += routed_elapsed
+            if round_index == 0:
+                path = result.get("fast_path", "agent")
+                print(
+                    f"{question:<52}{path:<18}{agent_elapsed * 1000:>8.1f}ms"
+                    f"{routed_elapsed * 1e6:>10,.0f}µs"
+                )
+
+    print(
+        f"\n{DEMO_ROUNDS * len(DEMO_TRAFFIC)} queries: "
+        f"agent {totals['agent']:.2f}s / {llm_calls['agent'].calls} LLM calls, "
+        f"routed {totals['routed']:.2f}s / {llm_calls['routed'].calls} LLM calls"
+    )
+    print(f"Routes: {dict(router.stats)}")
+
+
+def run_live(threshold: float) -> None:
+    """Route the ch03 questions in front of an OpenAI-backed ReAct agent."""
+
+    from langchain_openai import ChatOpenAI
+
+    load_dotenv()
+    llm = ChatOpenAI(model="gpt-5-mini", disable_streaming=True)
+    agent = build_agent(llm, [calculator, web_search_mock])
+    routed = FastPathRouter(default_rules(), threshold).wrap(agent)
+
+    for question in DEMO_TRAFFIC:
+        print(routed.invoke({"input": question}))
+
+
+# ==========================================================
+# Entrypoint
+# ==========================================================
+
+
+def main() -> None:
+    """Main entrypoint for the application."""
+
+    parser = argparse.ArgumentParser(description="LLM-free fast path router")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_CONFIDENCE_THRESHOLD)
+    parser.add_argument("--live", action="store_true", help="use OpenAI")
+    args = parser.parse_args()
+
+    if args.live:
+        run_live(args.threshold)
+    else:
+        run_demo(args.threshold)
+
+
+if __name__ == "__main__":
+    main()
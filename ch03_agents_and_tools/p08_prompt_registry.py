@@ -0,0 +1,329 @@
+"""
+Local Prompt Registry
+---------------------
+
+Replacement for calling `hub.pull(...)` at import time:
+- Prompts are addressed as `owner/name[:version]`; hub prompts are stored
+  under their commit hash, local prompts (owner `local`) under a content hash
+- Every prompt is serialized into a versioned on-disk cache, with a `LATEST`
+  pointer per prompt, so later process starts load it offline
+- Loaded prompts are memoized in memory, so repeated lookups take
+  microseconds
+- `warm` fetches (or refreshes) hub prompts ahead of time, e.g. at deploy
+
+Once warmed, agent startup never touches the network. Set
+`PROMPT_REGISTRY_OFFLINE=1` to turn a cache miss into an error instead of a
+fetch, and `PROMPT_CACHE_DIR` to move the cache.
+
+Usage:
+    uv run ch03_agents_and_tools/p08_prompt_registry.py warm hwchase17/react
+    uv run ch03_agents_and_tools/p08_prompt_registry.py list
+    uv run ch03_agents_and_tools/p08_prompt_registry.py bench
+"""
+
+from __future__ import annotations
+
+import argparse
+import hashlib
+import json
+import os
+import re
+import tempfile
+import time
+import warnings
+from collections.abc import Callable, Iterable
+from dataclasses import dataclass
+from functools import cache
+from pathlib import Path
+
+from dotenv import load_dotenv
+from langchain_core._api import LangChainBetaWarning
+from langchain_core.load import dumpd, load
+from langchain_core.prompts import BasePromptTemplate, PromptTemplate
+
+# ==========================================================
+# Configuration
+# ==========================================================
+
+LOCAL_OWNER = "local"
+LATEST_FILE = "LATEST"
+# Reference parts become path components, so they may not contain separators
+# or start with a dot.
+SAFE_PART = re.compile(r"[A-Za-z0-9][A-Za-z0-9._-]*")
+DEFAULT_CACHE_DIR = Path.home() / ".cache" / "langchain-fundamentals" / "prompts"
+
+BENCH_LOOKUPS = 10_000
+
+type Fetcher = Callable[[str], BasePromptTemplate]
+
+
+# ==========================================================
+# Errors
+# ==========================================================
+
+
+class PromptNotCachedError(LookupError):
+    """The prompt is not in the cache and cannot be fetched."""
+
+
+# ==========================================================
+# References
+# ==========================================================
+
+
+@dataclass(frozen=True)
+class PromptRef:
+    owner: str
+    name: str
+    version: str | None = None
+
+    @classmethod
+    def parse(cls, ref: str) -> PromptRef:
+        """Parse `owner/name[:version]`; a bare `name` is a local prompt."""
+
+        path, _, version = ref.partition(":")
+        owner, _, name = path.rpartition("/")
+        parts = [owner or LOCAL_OWNER, name] + ([version] if version else [])
+        if not all(SAFE_PART.fullmatch(part) for part in parts):
+            raise ValueError(f"Invalid prompt reference: {ref!r}")
+        return cls(owner or LOCAL_OWNER, name, version or None)
+
+    @property
+    def is_local(self) -> bool:
+        return self.owner == LOCAL_OWNER
+
+    def __str__(self) -> str:
+        base = f"{self.owner}/{self.name}"
+        return f"{base}:{self.version}" if self.version else base
+
+
+def content_version(prompt: BasePromptTemplate) -> str:
+    """Stable short hash of a prompt's serialized form."""
+
+    payload = json.dumps(dumpd(prompt), sort_keys=True)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()[:12]
+
+
+def pull_from_hub(ref: str) -> BasePromptTemplate:
+    """Fetch a prompt from the LangChain Hub (imported lazily; it is slow)."""
+
+    from langchain_classic import hub
+
+    return hub.pull(ref)
+
+
+# ==========================================================
+# Registry
+# ==========================================================
+
+
+class PromptRegistry:
+    """Versioned on-disk prompt cache with in-memory memoization."""
+
+    def __init__(
+        self,
+        cache_dir: Path = DEFAULT_CACHE_DIR,
+        offline: bool = False,
+        fetch: Fetcher = pull_from_hub,
+    ) -> None:
+        self.cache_dir = cache_dir
+        self.offline = offline
+        self._fetch = fetch
+        self._loaded: dict[str, BasePromptTemplate] = {}
+
+    # ----- On-disk layout: <cache_dir>/<owner>/<name>/<version>.json -----
+
+    def _directory(self, ref: PromptRef) -> Path:
+        return self.cache_dir / ref.owner / ref.name
+
+    def _latest(self, ref: PromptRef) -> str | None:
+        try:
+            return (self._directory(ref) / LATEST_FILE).read_text().strip() or None
+        except FileNotFoundError:
+            return None
+
+    def _read(self, ref: PromptRef, version: str) -> BasePromptTemplate | None:
+        path = self._directory(ref) / f"{version}.json"
+        try:
+            data = json.loads(path.read_bytes())
+        except FileNotFoundError:
+            return None
+
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore", LangChainBetaWarning)
+            return load(data)
+
+    def _write(self, ref: PromptRef, prompt: BasePromptTemplate) -> str:
+        """Store `prompt` and point `LATEST` at it; returns its version."""
+
+        metadata = prompt.metadata or {}
+        version = ref.version or metadata.get("lc_hub_commit_hash")
+        version = version or content_version(prompt)
+        if not SAFE_PART.fullmatch(version):
+            raise ValueError(f"Invalid version for prompt {ref}: {version!r}")
+
+        directory = self._directory(ref)
+        directory.mkdir(parents=True, exist_ok=True)
+        path = directory / f"{version}.json"
+        if not path.exists():
+            _atomic_write(path, json.dumps(dumpd(prompt)))
+        if ref.version is None and self._latest(ref) != version:
+            _atomic_write(directory / LATEST_FILE, version)
+        return version
+
+    # ----- Public API -----
+
+    def get(self, ref: str) -> BasePromptTemplate:
+        """
+        Return a prompt, trying memory, then disk, then the hub.
+
+        An unpinned reference resolves to the cached `LATEST` version without
+        checking the hub for newer ones; use `warm` to refresh.
+        """
+
+        prompt = self._loaded.get(ref)
+        if prompt is not None:
+            return prompt
+
+        parsed = PromptRef.parse(ref)
+        version = parsed.version or self._latest(parsed)
+        prompt = self._read(parsed, version) if version else None
+
+        if prompt is None:
+            if parsed.is_local or self.offline:
+                raise PromptNotCachedError(f"Prompt {parsed} is not cached.")
+            prompt = self._fetch(str(parsed))
+            self._write(parsed, prompt)
+
+        self._loaded[ref] = prompt
+        return prompt
+
+    def register(self, name: str, prompt: BasePromptTemplate) -> BasePromptTemplate:
+        """
+        Store a locally defined prompt so it is looked up like a hub prompt.
+
+        Registering the same prompt again is a no-op, and the cache is only
+        written when the content changed, so callers may register on every
+        agent build.
+        """
+
+        parsed = PromptRef.parse(name)
+        if not parsed.is_local or parsed.version:
+            raise ValueError("Local prompts are registered as `local/<name>`.")
+        if self._loaded.get(str(parsed)) is prompt:
+            return prompt
+
+        self._write(parsed, prompt)
+
+        self._loaded[str(parsed)] = prompt
+        self._loaded[parsed.name] = prompt
+        return prompt
+
+    def warm(self, refs: Iterable[str]) -> dict[str, str]:
+        """Fetch hub prompts into the cache; returns the cached version per ref."""
+
+        versions: dict[str, str] = {}
+        for ref in refs:
+            parsed = PromptRef.parse(ref)
+            if parsed.is_local:
+                raise ValueError(f"Local prompt {parsed} cannot be warmed.")
+            versions[ref] = self._write(parsed, self._fetch(str(parsed)))
+            self._loaded.pop(ref, None)
+        return versions
+
+    def cached(self) -> list[tuple[str, list[str], str | None]]:
+        """List `(ref, versions, latest)` for every cached prompt."""
+
+        entries = []
+        for directory in sorted(self.cache_dir.glob("*/*")):
+            ref = PromptRef(directory.parent.name, directory.name)
+            versions = sorted(path.stem for path in directory.glob("*.json"))
+            entries.append((str(ref), versions, self._latest(ref)))
+        return entries
+
+
+def _atomic_write(path: Path, text: str) -> None:
+    """Write via a temporary file so concurrent readers never see partial data."""
+
+    with tempfile.NamedTemporaryFile(
+        "w", dir=path.parent, delete=False, encoding="utf-8"
+    ) as file:
+        file.write(text)
+    os.replace(file.name, path)
+
+
+@cache
+def default_registry() -> PromptRegistry:
+    """Process-wide registry configured from the environment."""
+
+    cache_dir = os.getenv("PROMPT_CACHE_DIR", "").strip()
+    return PromptRegistry(
+        cache_dir=Path(cache_dir) if cache_dir else DEFAULT_CACHE_DIR,
+        offline=os.getenv("PROMPT_REGISTRY_OFFLINE", "") == "1",
+    )
+
+
+# ==========================================================
+# Benchmark
+# ==========================================================
+
+
+def run_benchmark() -> None:
+    """Time lookups from disk (new process) and from memory (warm process)."""
+
+    prompt = PromptTemplate.from_template(
+        "Answer the question using the tools.\n\n{tools}\n\n"
+        "Question: {input}\nThought:{agent_scratchpad}"
+    )
+
+    with tempfile.TemporaryDirectory() as directory:
+        PromptRegistry(Path(directory)).register("local/bench", prompt)
+
+        start = time.perf_counter()
+        for _ in range(100):
+            PromptRegistry(Path(directory), offline=True).get("local/bench")
+        disk = (time.perf_counter() - start) / 100
+
+        registry = PromptRegistry(Path(directory), offline=True)
+        registry.get("local/bench")
+        start = time.perf_counter()
+        for _ in range(BENCH_LOOKUPS):
+            registry.get("local/bench")
+        memory = (time.perf_counter() - start) / BENCH_LOOKUPS
+
+    print(f"first lookup (disk):  {disk * 1e6:>8.1f}µs")
+    print(f"next lookups (memory): {memory * 1e6:>7.2f}µs")
+
+
+# ==========================================================
+# Entrypoint
+# ==========================================================
+
+
+def main() -> None:
+    """Main entrypoint for the application."""
+
+    parser = argparse.ArgumentParser(description="Local prompt registry")
+    commands = parser.add_subparsers(dest="command")
+
+    warm_command = commands.add_parser("warm", help="fetch hub prompts")
+    warm_command.add_argument("refs", nargs="+")
+    commands.add_parser("list", help="list cached prompts")
+    commands.add_parser("bench", help="lookup latency")
+
+    args = parser.parse_args()
+    registry = default_registry()
+
+    if args.command == "warm":
+        load_dotenv()
+        for ref, version in registry.warm(args.refs).items():
+            print(f"{ref} → {version}")
+    elif args.command == "list":
+        for ref, versions, latest in registry.cached():
+            print(f"{ref:<40} latest={latest} versions={', '.join(versions)}")
+    else:
+        run_benchmark()
+
+
+if __name__ == "__main__":
+    main()
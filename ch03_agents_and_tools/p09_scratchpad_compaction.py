@@ -0,0 +1,302 @@
+"""
+ReAct Scratchpad Compaction
+---------------------------
+
+`create_react_agent` resends the instructions plus the whole
+`{agent_scratchpad}` on every iteration, so prompt tokens per query grow
+quadratically with the number of steps. This variant manages the scratchpad:
+- The static prefix (instructions, rendered tools, question) is rendered
+  once and stays byte-identical across turns, so provider-side prompt
+  caching applies to it
+- The most recent steps are kept verbatim; older Thought/Action/Observation
+  triples keep the action but only a truncated observation
+- If the scratchpad still exceeds its token budget, the oldest compacted
+  steps drop their observation entirely
+
+Each step is compacted deterministically and at most twice, so the rendered
+scratchpad also stays a stable prefix between those transitions. Compaction
+trades some cacheable prefix for far fewer prompt tokens; the report shows
+both.
+
+Running this script reports prompt tokens per query, with and without
+compaction, on multi-step questions using a scripted fake model.
+"""
+
+from __future__ import annotations
+
+import argparse
+from collections.abc import Callable, Sequence
+from dataclasses import dataclass
+from typing import Any
+
+from langchain_classic.agents import AgentExecutor
+from langchain_classic.agents.format_scratchpad import format_log_to_str
+from langchain_classic.agents.output_parsers import ReActSingleInputOutputParser
+from langchain_core.agents import AgentAction
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.language_models import BaseLanguageModel
+from langchain_core.messages import BaseMessage
+from langchain_core.prompts import BasePromptTemplate
+from langchain_core.runnables import Runnable, RunnablePassthrough
+from langchain_core.tools import BaseTool, StructuredTool, render_text_description
+from p03_bounded_calculator_engine import calculator
+from p04_knowledge_lookup_index import web_search_mock
+from p05_parallel_tool_calling_agent import REACT_PROMPT, ScriptedReActModel
+
+# ==========================================================
+# Configuration
+# ==========================================================
+
+CHARS_PER_TOKEN = 4
+DEFAULT_BUDGET_TOKENS = 600
+DEFAULT_KEEP_RECENT = 1
+DEFAULT_OBSERVATION_CHARS = 160
+
+OBSERVATION_PREFIX = "Observation: "
+LLM_PREFIX = "Thought: "
+
+DEMO_QUESTIONS = [
+    "What are the capitals of France and Germany?",
+    "What are the capitals of France, Germany, Italy and Spain?",
+    "What are the capitals of Brazil, France, Germany, Italy, Spain and the "
+    "United States?",
+]
+DEMO_SNIPPET = (
+    "Related results: travel guides, history, population statistics, "
+    "climate tables, transport options, museums and landmarks, with "
+    "excerpts from encyclopedias and news articles about the city. "
+)
+
+
+# ==========================================================
+# Token Estimation
+# ==========================================================
+
+
+def approximate_tokens(text: str) -> int:
+    """Cheap, tokenizer-free estimate used for budgeting and reporting."""
+
+    return -(-len(text) // CHARS_PER_TOKEN)
+
+
+# ==========================================================
+# Scratchpad Policy
+# ==========================================================
+
+
+@dataclass(frozen=True)
+class ScratchpadPolicy:
+    """How to render `intermediate_steps` into `{agent_scratchpad}`."""
+
+    budget_tokens: int = DEFAULT_BUDGET_TOKENS
+    keep_recent: int = DEFAULT_KEEP_RECENT
+    observation_chars: int = DEFAULT_OBSERVATION_CHARS
+    count_tokens: Callable[[str], int] = approximate_tokens
+
+    def full(self, action: AgentAction, observation: Any) -> str:
+        return f"{action.log}\n{OBSERVATION_PREFIX}{observation}\n{LLM_PREFIX}"
+
+    # Compacted forms keep the step's own log and cut the observation, so a
+    # step's new form still shares its leading bytes with the previous one.
+
+    def compact(self, action: AgentAction, observation: Any) -> str:
+        text = " ".join(str(observation).split())
+        if len(text) > self.observation_chars:
+            text = text[: self.observation_chars].rstrip() + " [...]"
+        return f"{action.log}\n{OBSERVATION_PREFIX}{text}\n{LLM_PREFIX}"
+
+    def minimal(self, action: AgentAction, observation: Any) -> str:
+        return f"{action.log}\n{OBSERVATION_PREFIX}[omitted]\n{LLM_PREFIX}"
+
+    def format(self, steps: Sequence[tuple[AgentAction, Any]]) -> str:
+        """Render the steps verbatim, compacting older ones over the budget."""
+
+        full = [self.full(action, observation) for action, observation in steps]
+        used = sum(self.count_tokens(part) for part in full)
+        if used <= self.budget_tokens:
+            return "".join(full)
+
+        # Over budget: compact every step but the most recent ones, then strip
+        # the oldest until the budget is met. Both rules only ever move a step
+        # forward (full → compact → minimal) as the loop goes on, so each
+        # step's bytes change at most twice.
+        split = max(len(steps) - self.keep_recent, 0)
+        parts = full[split:]
+        older = [
+            self.compact(action, observation) for action, observation in steps[:split]
+        ]
+        used = sum(self.count_tokens(part) for part in older + parts)
+        for index, (action, observation) in enumerate(steps[:split]):
+            if used <= self.budget_tokens:
+                break
+            minimal = self.minimal(action, observation)
+            used -= self.count_tokens(older[index]) - self.count_tokens(minimal)
+            older[index] = minimal
+
+        return "".join(older + parts)
+
+
+def create_compacting_react_agent(
+    llm: BaseLanguageModel,
+    tools: Sequence[BaseTool],
+    prompt: BasePromptTemplate,
+    policy: ScratchpadPolicy | None = None,
+    stop_sequence: bool = True,
+) -> Runnable:
+    """
+    Same contract as `create_react_agent`, with a managed scratchpad.
+
+    Args:
+        policy: Scratchpad policy; `None` renders the full scratchpad, exactly
+            like `create_react_agent`.
+    """
+
+    missing_vars = {"tools", "tool_names", "agent_scratchpad"}.difference(
+        prompt.input_variables + list(prompt.partial_variables),
+    )
+    if missing_vars:
+        raise ValueError(f"Prompt missing required variables: {missing_vars}")
+
+    # Rendered once, so every turn shares the same static prefix.
+    prompt = prompt.partial(
+        tools=render_text_description(list(tools)),
+        tool_names=", ".join(tool.name for tool in tools),
+    )
+    format_steps = policy.format if policy else format_log_to_str
+    llm_with_stop = llm.bind(stop=["\nObservation"]) if stop_sequence else llm
+
+    return (
+        RunnablePassthrough.assign(
+            agent_scratchpad=lambda x: format_steps(x["intermediate_steps"]),
+        )
+        | prompt
+        | llm_with_stop
+        | ReActSingleInputOutputParser()
+    )
+
+
+# ==========================================================
+# Token Report
+# ==========================================================
+
+
+class PromptTokenMeter(BaseCallbackHandler):
+    """Record prompt size and the prefix shared with the previous turn."""
+
+    def __init__(self, count_tokens: Callable[[str], int] = approximate_tokens):
+        self.count_tokens = count_tokens
+        self.calls = 0
+        self.prompt_tokens = 0
+        self.shared_prefix_tokens = 0
+        self._previous = ""
+
+    def _record(self, prompt: str) -> None:
+        shared = 0
+        for left, right in zip(self._previous, prompt):
+            if left != right:
+                break
+            shared += 1
+
+        self.calls += 1
+        self.prompt_tokens += self.count_tokens(prompt)
+        self.shared_prefix_tokens += self.count_tokens(prompt[:shared])
+        self._previous = prompt
+
+    def on_llm_start(
+        self, serialized: dict[str, Any], prompts: list[str], **kwargs: Any
+    ) -> None:
+        for prompt in prompts:
+            self._record(prompt)
+
+    def on_chat_model_start(
+        self,
+        serialized: dict[str, Any],
+        messages: list[list[BaseMessage]],
+        **kwargs: Any,
+    ) -> None:
+        for batch in messages:
+            self._record("".join(str(message.content) for message in batch))
+
+
+# ==========================================================
+# Demo Runner
+# ==========================================================
+
+
+def verbose(tool: BaseTool, repeat: int) -> BaseTool:
+    """Wrap a tool so it returns a long observation, like a real web search."""
+
+    def run(*args: Any, **kwargs: Any) -> str:
+        result = tool.invoke(args[0] if args else kwargs)
+        return f"{result} {DEMO_SNIPPET * repeat}"
+
+    return StructuredTool.from_function(
+        func=run,
+        name=tool.name,
+        description=tool.description,
+        args_schema=tool.args_schema,
+        return_direct=tool.return_direct,
+    )
+
+
+def run_demo(policy: ScratchpadPolicy) -> None:
+    """Report prompt tokens per query with full and compacted scratchpads."""
+
+    tools = [calculator, verbose(web_search_mock, repeat=6)]
+    llm = ScriptedReActModel(latency=0)
+    executors = {
+        mode: AgentExecutor.from_agent_and_tools(
+            agent=create_compacting_react_agent(llm, tools, REACT_PROMPT, mode_policy),
+            tools=tools,
+            max_iterations=10,
+        )
+        for mode, mode_policy in (("full", None), ("compacted", policy))
+    }
+
+    print(
+        f"{'steps':>5}  {'mode':<10}{'calls':>6}{'prompt tok':>12}"
+        f"{'cacheable':>11}{'uncached':>10}"
+    )
+    for question in DEMO_QUESTIONS:
+        totals = {}
+        for mode, executor in executors.items():
+            meter = PromptTokenMeter()
+            executor.invoke({"input": question}, config={"callbacks": [meter]})
+            totals[mode] = meter.prompt_tokens
+            share = meter.shared_prefix_tokens / max(meter.prompt_tokens, 1)
+            print(
+                f"{meter.calls - 1:>5}  {mode:<10}{meter.calls:>6}"
+                f"{meter.prompt_tokens:>12,}{share:>10.0%}"
+                f"{meter.prompt_tokens - meter.shared_prefix_tokens:>10,}"
+            )
+        saved = 1 - totals["compacted"] / totals["full"]
+        print(f"{'':>5}  {'saved':<10}{'':>6}{saved:>12.0%}\n")
+
+
+# ==========================================================
+# Entrypoint
+# ==========================================================
+
+
+def main() -> None:
+    """Main entrypoint for the application."""
+
+    parser = argparse.ArgumentParser(description="ReAct scratchpad compaction")
+    parser.add_argument("--budget", type=int, default=DEFAULT_BUDGET_TOKENS)
+    parser.add_argument("--keep-recent", type=int, default=DEFAULT_KEEP_RECENT)
+    parser.add_argument(
+        "--observation-chars", type=int, default=DEFAULT_OBSERVATION_CHARS
+    )
+    args = parser.parse_args()
+
+    run_demo(
+        ScratchpadPolicy(
+            budget_tokens=args.budget,
+            keep_recent=args.keep_recent,
+            observation_chars=args.observation_chars,
+        )
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,358 @@
+"""
+Concurrent Batch Agent Runner
+-----------------------------
+
+Runs large question sets through the ReAct agent instead of calling
+`agent_executor.invoke` one question at a time:
+- Independent agent sessions run concurrently on one event loop, bounded by
+  a global concurrency limit
+- A single LLM client (one pooled HTTP connection pool) and a single
+  `AgentExecutor` are shared by every session
+- Each query gets a wall-time budget and a token budget on top of
+  `max_iterations`; a query that exceeds one is stopped and reported
+- Results are appended to a JSONL sink as soon as each query finishes
+
+Running without arguments prints a throughput report (questions per minute
+at several concurrency levels) using a scripted fake model.
+
+Usage:
+    uv run ch03_agents_and_tools/p10_batch_agent_runner.py run \\
+        questions.txt results.jsonl --concurrency 16
+    uv run ch03_agents_and_tools/p10_batch_agent_runner.py bench
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import random
+import tempfile
+import time
+from collections import Counter
+from collections.abc import Sequence
+from dataclasses import asdict, dataclass
+from pathlib import Path
+from typing import Any, TextIO
+
+from dotenv import load_dotenv
+from langchain_classic.agents import AgentExecutor, create_react_agent
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.language_models import BaseChatModel
+from langchain_core.outputs import LLMResult
+from p03_bounded_calculator_engine import calculator
+from p04_knowledge_lookup_index import CAPITALS, web_search_mock
+from p05_parallel_tool_calling_agent import REACT_PROMPT, ScriptedReActModel
+from p06_tool_result_cache import cached, normalize_expression
+from p11_agent_step_tracing import AgentStepTracer, TraceLog
+
+# ==========================================================
+# Configuration
+# ==========================================================
+
+DEFAULT_CONCURRENCY = 16
+DEFAULT_WALL_TIME_SECONDS = 60.0
+DEFAULT_MAX_TOKENS = 8_000
+MAX_ITERATIONS = 6
+HTTP_KEEPALIVE_SECONDS = 30.0
+
+BENCH_QUESTIONS = 100
+BENCH_LEVELS = (1, 4, 16, 64)
+FAKE_LLM_LATENCY_SECONDS = 0.2
+
+
+# ==========================================================
+# Budgets
+# ==========================================================
+
+
+class TokenBudgetExceededError(RuntimeError):
+    """A query used more tokens than its budget."""
+
+
+class TokenBudget(BaseCallbackHandler):
+    """Sum LLM token usage for one query and abort it over the budget."""
+
+    raise_error = True
+    run_inline = True
+
+    def __init__(self, max_tokens: int) -> None:
+        self.max_tokens = max_tokens
+        self.used = 0
+        self.llm_calls = 0
+
+    def on_llm_end(self, response: LLMResult, **kwargs: Any) -> None:
+        self.llm_calls += 1
+        for generations in response.generations:
+            for generation in generations:
+                usage = getattr(generation, "message", None)
+                usage = getattr(usage, "usage_metadata", None) or {}
+                self.used += usage.get("total_tokens", 0)
+
+        if self.used > self.max_tokens:
+            raise TokenBudgetExceededError(
+                f"Used {self.used} tokens, budget is {self.max_tokens}."
+            )
+
+
+# ==========================================================
+# Runner
+# ==========================================================
+
+
+@dataclass
+class QueryResult:
+    id: int
+    input: str
+    output: str | None
+    status: str
+    seconds: float
+    tokens: int
+    llm_calls: int
+    error: str | None = None
+
+
+class JsonlSink:
+    """Append one JSON object per finished query, flushed immediately."""
+
+    def __init__(self, file: TextIO) -> None:
+        self.file = file
+
+    def write(self, result: QueryResult) -> None:
+        self.file.write(json.dumps(asdict(result), ensure_ascii=False) + "\n")
+        self.file.flush()
+
+
+class BatchAgentRunner:
+    """Run many agent queries concurrently under shared limits."""
+
+    def __init__(
+        self,
+        agent_executor: AgentExecutor,
+        concurrency: int = DEFAULT_CONCURRENCY,
+        wall_time: float = DEFAULT_WALL_TIME_SECONDS,
+        max_tokens: int = DEFAULT_MAX_TOKENS,
+        callbacks: Sequence[BaseCallbackHandler] = (),
+    ) -> None:
+        self.agent_executor = agent_executor
+        self.callbacks = list(callbacks)
+        self.concurrency = concurrency
+        self.wall_time = wall_time
+        self.max_tokens = max_tokens
+
+    async def _run_one(
+        self, index: int, question: str, semaphore: asyncio.Semaphore
+    ) -> QueryResult:
+        async with semaphore:
+            budget = TokenBudget(self.max_tokens)
+            output, status, error = None, "ok", None
+            start = time.perf_counter()
+
+            try:
+                result = await asyncio.wait_for(
+                    self.agent_executor.ainvoke(
+                        {"input": question},
+                        config={"callbacks": [budget, *self.callbacks]},
+                    ),
+                    timeout=self.wall_time,
+                )
+                output = str(result["output"])
+            except TimeoutError:
+                status, error = "timeout", f"Exceeded {self.wall_time}s."
+            except TokenBudgetExceededError as e:
+                status, error = "token_budget", str(e)
+            except Exception as e:  # one failed query must not stop the batch
+                status, error = "error", f"{type(e).__name__}: {e}"
+
+            return QueryResult(
+                id=index,
+                input=question,
+                output=output,
+                status=status,
+                seconds=round(time.perf_counter() - start, 3),
+                tokens=budget.used,
+                llm_calls=budget.llm_calls,
+                error=error,
+            )
+
+    async def arun(
+        self, questions: Sequence[str], sink: JsonlSink | None = None
+    ) -> list[QueryResult]:
+        """Run every question; results are sunk in completion order."""
+
+        semaphore = asyncio.Semaphore(self.concurrency)
+        tasks = [
+            asyncio.create_task(self._run_one(index, question, semaphore))
+            for index, question in enumerate(questions)
+        ]
+
+        results = []
+        for task in asyncio.as_completed(tasks):
+            result = await task
+            if sink is not None:
+                sink.write(result)
+            results.append(result)
+
+        return sorted(results, key=lambda result: result.id)
+
+    def run(
+        self, questions: Sequence[str], sink: JsonlSink | None = None
+    ) -> list[QueryResult]:
+        return asyncio.run(self.arun(questions, sink))
+
+
+def build_agent_executor(llm: BaseChatModel) -> AgentExecutor:
+    """One executor, shared by every session; it holds no per-query state."""
+
+    tools = [
+        cached(normalize=normalize_expression)(calculator),
+        cached(ttl=300)(web_search_mock),
+    ]
+    return AgentExecutor.from_agent_and_tools(
+        agent=create_react_agent(llm=llm, tools=tools, prompt=REACT_PROMPT),
+        tools=tools,
+        handle_parsing_errors=True,
+        max_iterations=MAX_ITERATIONS,
+    )
+
+
+def build_live_llm(concurrency: int) -> BaseChatModel:
+    """OpenAI model with one HTTP connection pool sized for the batch."""
+
+    import httpx
+    from langchain_openai import ChatOpenAI
+
+    limits = httpx.Limits(
+        max_connections=concurrency,
+        max_keepalive_connections=concurrency,
+        keepalive_expiry=HTTP_KEEPALIVE_SECONDS,
+    )
+    return ChatOpenAI(
+        model="gpt-5-mini",
+        disable_streaming=True,
+        http_async_client=httpx.AsyncClient(limits=limits),
+    )
+
+
+def read_questions(path: Path) -> list[str]:
+    """One question per line, or JSONL objects with an `input` field."""
+
+    questions = []
+    for line in path.read_text(encoding="utf-8").splitlines():
+        line = line.strip()
+        if line.startswith("{"):
+            questions.append(json.loads(line)["input"])
+        elif line:
+            questions.append(line)
+    return questions
+
+
+# ==========================================================
+# Throughput Report
+# ==========================================================
+
+
+def synthetic_questions(count: int, seed: int = 42) -> list[str]:
+    rng = random.Random(seed)
+    countries = list(CAPITALS)
+    questions = []
+    for _ in range(count):
+        first, second = rng.sample(countries, 2)
+        questions.append(
+            rng.choice(
+                [
+                    f"What is the capital of {first}?",
+                    f"What are the capitals of {first} and {second}?",
+                    f"How much is {rng.randint(1, 99)}*{rng.randint(1, 99)}?",
+                ]
+            )
+        )
+    return questions
+
+
+def run_benchmark(count: int, levels: Sequence[int]) -> None:
+    """Questions per minute at several concurrency levels, fake model."""
+
+    executor = build_agent_executor(
+        ScriptedReActModel(latency=FAKE_LLM_LATENCY_SECONDS)
+    )
+    questions = synthetic_questions(count)
+
+    print(f"{'concurrency':>11}{'wall':>9}{'q/min':>10}{'p50':>8}{'p95':>8}  status")
+    for level in levels:
+        runner = BatchAgentRunner(executor, concurrency=level)
+        with tempfile.TemporaryFile("w+", encoding="utf-8") as file:
+            start = time.perf_counter()
+            results = runner.run(questions, JsonlSink(file))
+            elapsed = time.perf_counter() - start
+
+        latencies = sorted(result.seconds for result in results)
+        p50 = latencies[len(latencies) // 2]
+        p95 = latencies[int(len(latencies) * 0.95)]
+        statuses = Counter(result.status for result in results)
+        print(
+            f"{level:>11}{elapsed:>8.2f}s{len(results) / elapsed * 60:>10,.0f}"
+            f"{p50:>7.2f}s{p95:>7.2f}s  {dict(statuses)}"
+        )
+
+
+# ==========================================================
+# Entrypoint
+# ==========================================================
+
+
+def main() -> None:
+    """Main entrypoint for the application."""
+
+    parser = argparse.ArgumentParser(description="Concurrent batch agent runner")
+    commands = parser.add_subparsers(dest="command")
+
+    run_command = commands.add_parser("run", help="run a question file")
+    run_command.add_argument("questions", type=Path)
+    run_command.add_argument("output", type=Path)
+    run_command.add_argument("--concurrency", type=int, default=DEFAULT_CONCURRENCY)
+    run_command.add_argument(
+        "--wall-time", type=float, default=DEFAULT_WALL_TIME_SECONDS
+    )
+    run_command.add_argument("--max-tokens", type=int, default=DEFAULT_MAX_TOKENS)
+    run_command.add_argument("--fake", action="store_true", help="use a fake model")
+    run_command.add_argument("--trace", type=Path, help="append step traces here")
+
+    bench_command = commands.add_parser("bench", help="throughput report")
+    bench_command.add_argument("--questions", type=int, default=BENCH_QUESTIONS)
+    bench_command.add_argument(
+        "--levels", type=int, nargs="+", default=list(BENCH_LEVELS)
+    )
+
+    args = parser.parse_args()
+
+    if args.command != "run":
+        run_benchmark(
+            getattr(args, "questions", BENCH_QUESTIONS),
+            getattr(args, "levels", BENCH_LEVELS),
+        )
+        return
+
+    load_dotenv()
+    llm = ScriptedReActModel() if args.fake else build_live_llm(args.concurrency)
+    runner = BatchAgentRunner(
+        build_agent_executor(llm),
+        concurrency=args.concurrency,
+        wall_time=args.wall_time,
+        max_tokens=args.max_tokens,
+        # The trace log has every run; none is needed in memory.
+        callbacks=[AgentStepTracer(TraceLog(args.trace), max_runs=0)]
+        if args.trace
+        else [],
+    )
+
+    questions = read_questions(args.questions)
+    with args.output.open("a", encoding="utf-8") as file:
+        results = runner.run(questions, JsonlSink(file))
+
+    statuses = Counter(result.status for result in results)
+    print(f"{len(results)} questions → {args.output} {dict(statuses)}")
+
+
+if __name__ == "__main__":
+    main()
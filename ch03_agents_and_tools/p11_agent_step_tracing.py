@@ -0,0 +1,533 @@
+"""
+Agent Step Tracing
+------------------
+
+Structured, step-level tracing for the ch03 agents (`verbose=True` only
+prints text). A callback handler records, per agent iteration:
+- LLM time and input/output tokens
+- Output parsing failures (the `_Exception` steps `handle_parsing_errors`
+  feeds back to the model)
+- Tool name, tool time and cache status (`hit`/`miss` for tools wrapped with
+  `p06_tool_result_cache.cached`)
+
+Each finished run is appended as one compact JSON line to a local log. The
+`summarize` command aggregates many runs into a flame-style breakdown of
+where the wall time went (also exportable as folded stacks for
+flamegraph.pl / speedscope).
+
+Usage:
+    uv run ch03_agents_and_tools/p11_agent_step_tracing.py demo agent_trace.log
+    uv run ch03_agents_and_tools/p11_agent_step_tracing.py summarize agent_trace.log
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import threading
+import time
+import zlib
+from collections import defaultdict, deque
+from collections.abc import Iterable, Iterator
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any
+from uuid import UUID
+
+from langchain_classic.agents import AgentExecutor, create_react_agent
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.messages import AIMessage, BaseMessage, HumanMessage
+from langchain_core.outputs import ChatGeneration, ChatResult, LLMResult
+from p03_bounded_calculator_engine import calculator
+from p04_knowledge_lookup_index import web_search_mock
+from p05_parallel_tool_calling_agent import REACT_PROMPT, ScriptedReActModel, slow
+from p06_tool_result_cache import CACHE_HIT_EVENT, cached, normalize_expression
+
+# ==========================================================
+# Configuration
+# ==========================================================
+
+LOG_VERSION = 1
+PARSE_ERROR_TOOL = "_Exception"
+BAR_WIDTH = 30
+DEFAULT_MAX_RUNS = 1000  # finished runs kept in memory per tracer
+
+DEMO_RUNS = 60
+DEMO_QUESTIONS = [
+    "What is the capital of France?",
+    "What are the capitals of Germany and Italy?",
+    "How much is 12*7?",
+    "What is the capital of Spain and how much is 3*4?",
+    "What are the capitals of Brazil and the United States?",
+]
+
+
+# ==========================================================
+# Trace Records
+# ==========================================================
+
+
+@dataclass
+class StepTrace:
+    """One agent iteration: an LLM call plus the tool it chose, if any."""
+
+    llm_ms: float = 0.0
+    input_tokens: int = 0
+    output_tokens: int = 0
+    parse_error: bool = False
+    tool: str | None = None
+    tool_ms: float = 0.0
+    cache: str | None = None
+
+    def encode(self) -> list[Any]:
+        return [
+            round(self.llm_ms, 2),
+            self.input_tokens,
+            self.output_tokens,
+            int(self.parse_error),
+            self.tool,
+            round(self.tool_ms, 2),
+            self.cache,
+        ]
+
+    @classmethod
+    def decode(cls, row: list[Any]) -> StepTrace:
+        llm_ms, input_tokens, output_tokens, parse_error, tool, tool_ms, cache = row
+        return cls(
+            llm_ms, input_tokens, output_tokens, bool(parse_error), tool, tool_ms, cache
+        )
+
+
+@dataclass
+class RunTrace:
+    """One agent invocation."""
+
+    started_at: float
+    input: str
+    wall_ms: float = 0.0
+    error: str | None = None
+    steps: list[StepTrace] = field(default_factory=list)
+
+    def encode(self) -> str:
+        """Compact line: short keys, steps as positional arrays."""
+
+        record = {
+            "v": LOG_VERSION,
+            "t": round(self.started_at, 3),
+            "q": self.input,
+            "w": round(self.wall_ms, 2),
+            "s": [step.encode() for step in self.steps],
+        }
+        if self.error:
+            record["e"] = self.error
+        return json.dumps(record, ensure_ascii=False, separators=(",", ":"))
+
+    @classmethod
+    def decode(cls, line: str) -> RunTrace:
+        record = json.loads(line)
+        if record.get("v") != LOG_VERSION:
+            raise ValueError(f"Unsupported trace version: {record.get('v')}")
+        return cls(
+            started_at=record["t"],
+            input=record["q"],
+            wall_ms=record["w"],
+            error=record.get("e"),
+            steps=[StepTrace.decode(row) for row in record["s"]],
+        )
+
+
+class TraceLog:
+    """Append-only trace file, safe to share between threads."""
+
+    def __init__(self, path: Path) -> None:
+        self.path = path
+        self._lock = threading.Lock()
+
+    def append(self, run: RunTrace) -> None:
+        line = run.encode() + "\n"
+        with self._lock, self.path.open("a", encoding="utf-8") as file:
+            file.write(line)
+
+    def read(self) -> Iterator[RunTrace]:
+        with self.path.open(encoding="utf-8") as file:
+            for line in file:
+                if line.strip():
+                    yield RunTrace.decode(line)
+
+
+# ==========================================================
+# Tracer
+# ==========================================================
+
+
+class AgentStepTracer(BaseCallbackHandler):
+    """
+    Build a `RunTrace` per top-level agent run and append it to `log`.
+
+    Runs are keyed by their root run id, so one tracer can be shared by
+    concurrent invocations (e.g. the p10 batch runner). Only the last
+    `max_runs` finished runs are kept in `runs`; the log has all of them.
+    """
+
+    run_inline = True
+
+    def __init__(
+        self, log: TraceLog | None = None, max_runs: int = DEFAULT_MAX_RUNS
+    ) -> None:
+        self.log = log
+        self.runs: deque[RunTrace] = deque(maxlen=max_runs)
+        self._lock = threading.Lock()
+        self._root: dict[UUID, UUID] = {}
+        self._active: dict[UUID, RunTrace] = {}
+        self._started: dict[UUID, float] = {}
+        self._tool_runs: set[UUID] = set()
+        self._agent_tools: set[UUID] = set()
+
+    # ----- Run tree bookkeeping (callers hold `_lock`) -----
+
+    def _register(self, run_id: UUID, parent_run_id: UUID | None) -> RunTrace | None:
+        root = self._root.get(parent_run_id, parent_run_id) if parent_run_id else None
+        self._root[run_id] = root or run_id
+        self._started[run_id] = time.perf_counter()
+        return self._active.get(root or run_id)
+
+    def _finish(self, run_id: UUID) -> float:
+        self._root.pop(run_id, None)
+        started = self._started.pop(run_id, time.perf_counter())
+        return (time.perf_counter() - started) * 1000
+
+    def _trace(self, run_id: UUID) -> RunTrace | None:
+        return self._active.get(self._root.get(run_id, run_id))
+
+    # ----- Agent run -----
+
+    def on_chain_start(
+        self,
+        serialized: dict[str, Any] | None,
+        inputs: dict[str, Any] | Any,
+        *,
+        run_id: UUID,
+        parent_run_id: UUID | None = None,
+        **kwargs: Any,
+    ) -> None:
+        with self._lock:
+            self._register(run_id, parent_run_id)
+            if parent_run_id is None:
+                question = (
+                    inputs.get("input", "") if isinstance(inputs, dict) else inputs
+                )
+                self._active[run_id] = RunTrace(time.time(), str(question))
+
+    def _end_run(self, run_id: UUID, error: BaseException | None) -> None:
+        with self._lock:
+            elapsed = self._finish(run_id)
+            run = self._active.pop(run_id, None)
+            if run is None:
+                return
+
+            run.wall_ms = elapsed
+            if error is not None:
+                run.error = f"{type(error).__name__}: {error}"
+            self.runs.append(run)
+        if self.log is not None:
+            self.log.append(run)
+
+    def on_chain_end(self, outputs: Any, *, run_id: UUID, **kwargs: Any) -> None:
+        self._end_run(run_id, None)
+
+    def on_chain_error(
+        self, error: BaseException, *, run_id: UUID, **kwargs: Any
+    ) -> None:
+        self._end_run(run_id, error)
+
+    # ----- LLM calls: each one starts a new iteration -----
+
+    def _start_step(self, run_id: UUID, parent_run_id: UUID | None) -> None:
+        with self._lock:
+            run = self._register(run_id, parent_run_id)
+            if run is not None:
+                run.steps.append(StepTrace())
+
+    def on_llm_start(
+        self,
+        serialized: dict[str, Any],
+        prompts: list[str],
+        *,
+        run_id: UUID,
+        parent_run_id: UUID | None = None,
+        **kwargs: Any,
+    ) -> None:
+        self._start_step(run_id, parent_run_id)
+
+    def on_chat_model_start(
+        self,
+        serialized: dict[str, Any],
+        messages: list[list[BaseMessage]],
+        *,
+        run_id: UUID,
+        parent_run_id: UUID | None = None,
+        **kwargs: Any,
+    ) -> None:
+        self._start_step(run_id, parent_run_id)
+
+    def on_llm_end(self, response: LLMResult, *, run_id: UUID, **kwargs: Any) -> None:
+        with self._lock:
+            run = self._trace(run_id)
+            elapsed = self._finish(run_id)
+            if run is None or not run.steps:
+                return
+
+            step = run.steps[-1]
+            step.llm_ms = elapsed
+            for generations in response.generations:
+                for generation in generations:
+                    message = getattr(generation, "message", None)
+                    usage = getattr(message, "usage_metadata", None) or {}
+                    step.input_tokens += usage.get("input_tokens", 0)
+                    step.output_tokens += usage.get("output_tokens", 0)
+
+    def on_llm_error(
+        self, error: BaseException, *, run_id: UUID, **kwargs: Any
+    ) -> None:
+        with self._lock:
+            run = self._trace(run_id)
+            elapsed = self._finish(run_id)
+            if run is not None and run.steps:
+                run.steps[-1].llm_ms = elapsed
+
+    # ----- Tools -----
+
+    def on_tool_start(
+        self,
+        serialized: dict[str, Any],
+        input_str: str,
+        *,
+        run_id: UUID,
+        parent_run_id: UUID | None = None,
+        **kwargs: Any,
+    ) -> None:
+        with self._lock:
+            run = self._register(run_id, parent_run_id)
+            if run is None:
+                return
+
+            nested = parent_run_id in self._tool_runs
+            self._tool_runs.add(run_id)
+            if nested:
+                # A cached tool only runs the wrapped tool on a miss.
+                if run.steps and parent_run_id in self._agent_tools:
+                    run.steps[-1].cache = "miss"
+                return
+
+            self._agent_tools.add(run_id)
+            if not run.steps:
+                run.steps.append(StepTrace())
+
+            name = serialized.get("name") or kwargs.get("name")
+            if name == PARSE_ERROR_TOOL:
+                run.steps[-1].parse_error = True
+            elif run.steps[-1].tool is not None:
+                # Several tools in one iteration: keep one entry per tool.
+                run.steps.append(StepTrace(tool=name))
+            else:
+                run.steps[-1].tool = name
+
+    def _end_tool(self, run_id: UUID) -> None:
+        with self._lock:
+            run = self._trace(run_id)
+            elapsed = self._finish(run_id)
+            self._tool_runs.discard(run_id)
+            if run_id not in self._agent_tools:
+                return
+
+            self._agent_tools.discard(run_id)
+            if run is not None and run.steps and run.steps[-1].tool is not None:
+                run.steps[-1].tool_ms = elapsed
+
+    def on_tool_end(self, output: Any, *, run_id: UUID, **kwargs: Any) -> None:
+        self._end_tool(run_id)
+
+    def on_tool_error(
+        self, error: BaseException, *, run_id: UUID, **kwargs: Any
+    ) -> None:
+        self._end_tool(run_id)
+
+    def on_custom_event(
+        self, name: str, data: Any, *, run_id: UUID, **kwargs: Any
+    ) -> None:
+        with self._lock:
+            run = self._trace(run_id)
+            if name == CACHE_HIT_EVENT and run is not None and run.steps:
+                run.steps[-1].cache = "hit"
+
+
+# ==========================================================
+# Summarizer
+# ==========================================================
+
+
+def folded_stacks(runs: Iterable[RunTrace]) -> dict[str, float]:
+    """Aggregate wall time into `agent;iteration N;component` stacks (ms)."""
+
+    stacks: dict[str, float] = defaultdict(float)
+    for run in runs:
+        accounted = 0.0
+        iteration = 0
+        for step in run.steps:
+            if step.llm_ms or iteration == 0:
+                iteration += 1
+            frame = f"agent;iteration {iteration}"
+
+            if step.llm_ms:
+                llm = "llm (parse error)" if step.parse_error else "llm"
+                stacks[f"{frame};{llm}"] += step.llm_ms
+            if step.tool:
+                cache = f" [{step.cache}]" if step.cache else ""
+                stacks[f"{frame};tool {step.tool}{cache}"] += step.tool_ms
+            accounted += step.llm_ms + step.tool_ms
+
+        stacks["agent;executor overhead"] += max(run.wall_ms - accounted, 0.0)
+    return dict(stacks)
+
+
+def percentile(values: list[float], fraction: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(int(len(ordered) * fraction), len(ordered) - 1)]
+
+
+def summarize(runs: list[RunTrace]) -> str:
+    """Render a flame-style breakdown (frames nested by `;`) as text."""
+
+    if not runs:
+        return "No runs."
+
+    stacks = folded_stacks(runs)
+    totals: dict[str, float] = defaultdict(float)
+    for stack, ms in stacks.items():
+        frames = stack.split(";")
+        for depth in range(1, len(frames) + 1):
+            totals[";".join(frames[:depth])] += ms
+
+    walls = [run.wall_ms for run in runs]
+    steps = [step for run in runs for step in run.steps]
+    tool_steps = [step for step in steps if step.tool]
+    hits = sum(step.cache == "hit" for step in tool_steps)
+    cached_steps = sum(step.cache is not None for step in tool_steps)
+
+    lines = [
+        f"runs: {len(runs)}  errors: {sum(run.error is not None for run in runs)}  "
+        f"wall p50 {percentile(walls, 0.5):.1f}ms  p95 {percentile(walls, 0.95):.1f}ms",
+        f"llm calls: {sum(1 for step in steps if step.llm_ms)}  "
+        f"parse errors: {sum(step.parse_error for step in steps)}  "
+        f"tokens in/out: {sum(step.input_tokens for step in steps):,}/"
+        f"{sum(step.output_tokens for step in steps):,}  "
+        f"cache hits: {hits}/{cached_steps}",
+        "",
+    ]
+
+    grand_total = totals["agent"] or 1.0
+    for stack in sorted(totals, key=_frame_order):
+        frames = stack.split(";")
+        share = totals[stack] / grand_total
+        label = "  " * (len(frames) - 1) + frames[-1]
+        bar = "█" * round(share * BAR_WIDTH)
+        lines.append(
+            f"{label:<40}{totals[stack] / len(runs):>9.1f}ms/run{share:>7.1%}  {bar}"
+        )
+    return "\n".join(lines)
+
+
+def _frame_order(stack: str) -> list[tuple[int, str]]:
+    # Iterations sort numerically; overhead goes after every iteration.
+    order = []
+    for frame in stack.split(";"):
+        if frame.startswith("iteration "):
+            order.append((int(frame.split()[1]), frame))
+        elif frame == "executor overhead":
+            order.append((1_000_000, frame))
+        else:
+            order.append((0, frame))
+    return order
+
+
+# ==========================================================
+# Demo Runner
+# ==========================================================
+
+
+class FlakyReActModel(ScriptedReActModel):
+    """Scripted ReAct model that sometimes forgets the `Action:` line."""
+
+    def _reply(self, messages: list[BaseMessage]) -> ChatResult:
+        prompt = str(messages[-1].content)
+        question = prompt.rsplit("Question:", 1)[1].split("\n", 1)[0]
+        if zlib.crc32(question.encode()) % 2 and "Invalid Format" not in prompt:
+            message = AIMessage("I should look this up somewhere.")
+            return ChatResult(generations=[ChatGeneration(message=message)])
+
+        # Error observations do not count as steps of the plan.
+        cleaned = prompt.replace("Observation: Invalid Format", "Invalid Format")
+        return super()._reply([HumanMessage(cleaned)])
+
+
+def run_demo(path: Path) -> None:
+    """Trace a scripted agent over repeated questions, then summarize."""
+
+    tools = [
+        cached(normalize=normalize_expression)(slow(calculator, 0.01)),
+        cached(ttl=300)(slow(web_search_mock, 0.08)),
+    ]
+    agent_executor = AgentExecutor.from_agent_and_tools(
+        agent=create_react_agent(
+            llm=FlakyReActModel(latency=0.05), tools=tools, prompt=REACT_PROMPT
+        ),
+        tools=tools,
+        handle_parsing_errors=True,
+        max_iterations=6,
+    )
+
+    tracer = AgentStepTracer(TraceLog(path))
+    for run in range(DEMO_RUNS):
+        question = DEMO_QUESTIONS[run % len(DEMO_QUESTIONS)]
+        agent_executor.invoke({"input": question}, config={"callbacks": [tracer]})
+
+    print(f"Traced {DEMO_RUNS} runs into {path}.\n")
+    print(summarize(list(tracer.runs)))
+
+
+# ==========================================================
+# Entrypoint
+# ==========================================================
+
+
+def main() -> None:
+    """Main entrypoint for the application."""
+
+    parser = argparse.ArgumentParser(description="Agent step tracing")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    demo_command = commands.add_parser("demo", help="trace a scripted agent")
+    demo_command.add_argument("log", type=Path)
+
+    summarize_command = commands.add_parser("summarize", help="summarize a log")
+    summarize_command.add_argument("log", type=Path)
+    summarize_command.add_argument(
+        "--folded", action="store_true", help="print folded stacks instead"
+    )
+
+    args = parser.parse_args()
+
+    if args.command == "demo":
+        run_demo(args.log)
+        return
+
+    runs = list(TraceLog(args.log).read())
+    if args.folded:
+        for stack, ms in sorted(folded_stacks(runs).items()):
+            print(f"{stack} {round(ms * 1000)}")  # microseconds as sample weight
+    else:
+        print(summarize(runs))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,21 +1,21 @@
+from uuid import uuid4
+
 from dotenv import load_dotenv
-from langchain_core.chat_history import InMemoryChatMessageHistory
+from langchain_core.chat_history import BaseChatMessageHistory
 from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder
 from langchain_core.runnables import RunnableWithMessageHistory
 from langchain_openai import ChatOpenAI
+from p03_tiered_session_store import TieredSessionStore, backend_from_url
 
 load_dotenv()
 
 
-def get_session_history(session_id: str) -> InMemoryChatMessageHistory:
+def get_session_history(session_id: str) -> BaseChatMessageHistory:
     """
     Get or create a chat message history for a session.
     """
 
-    if session_id not in session_store:
-        session_store[session_id] = InMemoryChatMessageHistory()
-
-    return session_store[session_id]
+    return session_store.get_session_history(session_id)
 
 
 prompt = ChatPromptTemplate.from_messages(
@@ -32,7 +32,7 @@ llm = ChatOpenAI(
 )
 chain = prompt | llm
 
-session_store: dict[str, InMemoryChatMessageHistory] = {}
+session_store = TieredSessionStore(backend_from_url())
 
 conversational_chain = RunnableWithMessageHistory(
     runnable=chain,
@@ -41,7 +41,9 @@ conversational_chain = RunnableWithMessageHistory(
     history_messages_key="history",
 )
 
-config = {"configurable": {"session_id": "demo-session"}}
+# The store is persistent: a fresh session per run keeps earlier runs out of
+# this conversation's prompt.
+config = {"configurable": {"session_id": f"demo-session-{uuid4().hex[:8]}"}}
 
 
 # === Interactions ===
@@ -6,17 +6,27 @@ Features:
 - Modern typing (PEP 695)
 - Clean separation of concerns
 - Config constants
+- Bounded, persistent session store (see p03_tiered_session_store.py)
+- O(1) per-turn sliding window (see p04_incremental_sliding_window.py)
 - Proper main() entrypoint
 """
 
 from __future__ import annotations
 
+from functools import cache
+from uuid import uuid4
+
 from dotenv import load_dotenv
-from langchain_core.chat_history import InMemoryChatMessageHistory
-from langchain_core.messages import BaseMessage, trim_messages
+from langchain_core.chat_history import BaseChatMessageHistory
+from langchain_core.language_models import BaseChatModel
 from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder
-from langchain_core.runnables import RunnableLambda, RunnableWithMessageHistory
-from langchain_openai import ChatOpenAI
+from langchain_core.runnables import RunnableWithMessageHistory
+from p03_tiered_session_store import (
+    SessionBackend,
+    TieredSessionStore,
+    backend_from_url,
+)
+from p04_incremental_sliding_window import windowed
 
 # =========================
 # Configuration
@@ -25,60 +35,45 @@ from langchain_openai import ChatOpenAI
 MODEL_NAME = "gpt-5-nano"
 TEMPERATURE = 0.9
 MAX_HISTORY_TOKENS = 2
-SESSION_ID = "demo-session"
-
-
-# =========================
-# Type Aliases
-# =========================
-
-type SessionStore = dict[str, InMemoryChatMessageHistory]
-type Payload = dict[str, object]
+SESSION_ID_PREFIX = "demo-session"
 
 
 # =========================
 # Session Store
 # =========================
 
-session_store: SessionStore = {}
 
+def build_session_store(backend: SessionBackend) -> TieredSessionStore:
+    """
+    Session store whose histories only keep the last MAX_HISTORY_TOKENS
+    messages (one "token" per message) starting on a human turn, so the
+    prompt never sees more.
+    """
 
-# =========================
-# History Management
-# =========================
+    return TieredSessionStore(
+        backend,
+        history_factory=windowed(
+            MAX_HISTORY_TOKENS, start_on="human", include_system=True
+        ),
+    )
 
 
-def get_session_history(session_id: str) -> InMemoryChatMessageHistory:
-    """Retrieve or create session history."""
+@cache
+def session_store() -> TieredSessionStore:
+    """Session store, opened on first use so importing this module stays cheap."""
 
-    return session_store.setdefault(session_id, InMemoryChatMessageHistory())
+    return build_session_store(backend_from_url())
 
 
 # =========================
-# Input Preparation
+# History Management
 # =========================
 
 
-def prepare_inputs(payload: Payload) -> dict[str, object]:
-    """Trim conversation history before sending to model."""
-
-    raw_history = payload.get("history", [])
-    history: list[BaseMessage] = raw_history if isinstance(raw_history, list) else []
-
-    trimmed_history = trim_messages(
-        history,
-        token_counter=len,
-        max_tokens=MAX_HISTORY_TOKENS,
-        strategy="last",
-        start_on="human",
-        include_system=True,
-        allow_partial=False,
-    )
+def get_session_history(session_id: str) -> BaseChatMessageHistory:
+    """Retrieve or create session history."""
 
-    return {
-        "input": payload.get("input", ""),
-        "history": trimmed_history,
-    }
+    return session_store().get_session_history(session_id)
 
 
 # =========================
@@ -86,7 +81,10 @@ def prepare_inputs(payload: Payload) -> dict[str, object]:
 # =========================
 
 
-def build_conversational_chain() -> RunnableWithMessageHistory:
+def build_conversational_chain(
+    llm: BaseChatModel | None = None,
+    store: TieredSessionStore | None = None,
+) -> RunnableWithMessageHistory:
     """Create conversational chain with memory support."""
 
     prompt = ChatPromptTemplate.from_messages(
@@ -101,17 +99,21 @@ def build_conversational_chain() -> RunnableWithMessageHistory:
         ]
     )
 
-    llm = ChatOpenAI(
-        model=MODEL_NAME,
-        temperature=TEMPERATURE,
-    )
+    if llm is None:
+        from langchain_openai import ChatOpenAI
+
+        llm = ChatOpenAI(
+            model=MODEL_NAME,
+            temperature=TEMPERATURE,
+        )
 
-    prepare = RunnableLambda(prepare_inputs)
-    base_chain = prepare | prompt | llm
+    base_chain = prompt | llm
 
     return RunnableWithMessageHistory(
         runnable=base_chain,
-        get_session_history=get_session_history,
+        get_session_history=(
+            store.get_session_history if store is not None else get_session_history
+        ),
         input_messages_key="input",
         history_messages_key="history",
     )
@@ -125,7 +127,10 @@ def build_conversational_chain() -> RunnableWithMessageHistory:
 def run_demo(chain: RunnableWithMessageHistory) -> None:
     """Run example interactions."""
 
-    config = {"configurable": {"session_id": SESSION_ID}}
+    # The store is persistent: a fresh session per run keeps earlier runs out of
+    # this conversation's prompt.
+    session_id = f"{SESSION_ID_PREFIX}-{uuid4().hex[:8]}"
+    config = {"configurable": {"session_id": session_id}}
 
     interactions = [
         "My name is Higor. Reply only with 'OK' and do not mention my name.",
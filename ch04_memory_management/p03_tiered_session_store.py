@@ -0,0 +1,493 @@
+"""
+Tiered Session Store
+--------------------
+
+Bounded, persistent replacement for the `dict[str, InMemoryChatMessageHistory]`
+session store:
+- Hot tier: an LRU of at most `max_sessions` histories kept in memory
+- Write-behind persistence: new messages are buffered and flushed in batches
+  to SQLite or Postgres by a background thread, off the request path
+- Lazy rehydration: an evicted (or pre-restart) session is loaded from the
+  backend only when it is requested again
+
+`TieredSessionStore.get_session_history` plugs straight into
+`RunnableWithMessageHistory`. Memory stays flat no matter how many sessions
+exist, and the hot path never touches the database.
+
+Configure the backend with `SESSION_STORE_URL` (a SQLite file path or a
+`postgresql://` URL, e.g. the compose database).
+"""
+
+from __future__ import annotations
+
+import argparse
+import atexit
+import json
+import logging
+import os
+import random
+import sqlite3
+import tempfile
+import threading
+import time
+import tracemalloc
+from collections import OrderedDict
+from collections.abc import Callable, Mapping, Sequence
+from pathlib import Path
+from typing import Protocol
+
+from langchain_core.chat_history import (
+    BaseChatMessageHistory,
+    InMemoryChatMessageHistory,
+)
+from langchain_core.language_models import FakeListChatModel
+from langchain_core.messages import (
+    AIMessage,
+    BaseMessage,
+    HumanMessage,
+    message_to_dict,
+    messages_from_dict,
+)
+from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder
+from langchain_core.runnables import RunnableWithMessageHistory
+
+logger = logging.getLogger(__name__)
+
+# =========================
+# Configuration
+# =========================
+
+DEFAULT_MAX_SESSIONS = 10_000
+DEFAULT_FLUSH_INTERVAL_SECONDS = 0.5
+DEFAULT_FLUSH_BATCH_SIZE = 1_000
+DEFAULT_SQLITE_PATH = (
+    Path.home() / ".cache" / "langchain-fundamentals" / "sessions.sqlite3"
+)
+POSTGRES_TABLE = "chat_session_messages"
+
+BENCH_SESSIONS = 200_000
+BENCH_HOT_SESSIONS = 5_000
+
+
+# =========================
+# Backends
+# =========================
+
+
+class SessionBackend(Protocol):
+    """Durable storage for session messages."""
+
+    def load(self, session_id: str) -> list[BaseMessage]: ...
+
+    def append(self, batch: Mapping[str, Sequence[BaseMessage]]) -> None: ...
+
+    def clear(self, session_id: str) -> None: ...
+
+    def close(self) -> None: ...
+
+
+def _encode(message: BaseMessage) -> str:
+    return json.dumps(message_to_dict(message), ensure_ascii=False)
+
+
+class SQLiteBackend:
+    """Single-file backend; one transaction per flushed batch."""
+
+    def __init__(self, path: Path | str) -> None:
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        self._lock = threading.Lock()
+        with self._lock, self._connection:
+            self._connection.execute("PRAGMA journal_mode=WAL")
+            self._connection.execute(
+                "CREATE TABLE IF NOT EXISTS messages ("
+                " id INTEGER PRIMARY KEY AUTOINCREMENT,"
+                " session_id TEXT NOT NULL,"
+                " message TEXT NOT NULL)"
+            )
+            self._connection.execute(
+                "CREATE INDEX IF NOT EXISTS messages_session"
+                " ON messages (session_id, id)"
+            )
+
+    def load(self, session_id: str) -> list[BaseMessage]:
+        with self._lock:
+            rows = self._connection.execute(
+                "SELECT message FROM messages WHERE session_id = ? ORDER BY id",
+                (session_id,),
+            ).fetchall()
+        return messages_from_dict([json.loads(row[0]) for row in rows])
+
+    def append(self, batch: Mapping[str, Sequence[BaseMessage]]) -> None:
+        rows = [
+            (session_id, _encode(message))
+            for session_id, messages in batch.items()
+            for message in messages
+        ]
+        with self._lock, self._connection:
+            self._connection.executemany(
+                "INSERT INTO messages (session_id, message) VALUES (?, ?)", rows
+            )
+
+    def clear(self, session_id: str) -> None:
+        with self._lock, self._connection:
+            self._connection.execute(
+                "DELETE FROM messages WHERE session_id = ?", (session_id,)
+            )
+
+    def close(self) -> None:
+        with self._lock:
+            self._connection.close()
+
+
+class PostgresBackend:
+    """Backend on the compose Postgres database (psycopg 3)."""
+
+    def __init__(self, url: str, table: str = POSTGRES_TABLE) -> None:
+        import psycopg
+
+        # Accept SQLAlchemy-style URLs such as the ones used for PGVector.
+        self._connection = psycopg.connect(
+            url.replace("postgresql+psycopg://", "postgresql://"), autocommit=True
+        )
+        self._table = table
+        self._lock = threading.Lock()
+        with self._lock:
+            self._connection.execute(
+                f"CREATE TABLE IF NOT EXISTS {table} ("
+                " id BIGSERIAL PRIMARY KEY,"
+                " session_id TEXT NOT NULL,"
+                " message JSONB NOT NULL)"
+            )
+            self._connection.execute(
+                f"CREATE INDEX IF NOT EXISTS {table}_session"
+                f" ON {table} (session_id, id)"
+            )
+
+    def load(self, session_id: str) -> list[BaseMessage]:
+        with self._lock:
+            rows = self._connection.execute(
+                f"SELECT message FROM {self._table} WHERE session_id = %s ORDER BY id",
+                (session_id,),
+            ).fetchall()
+        return messages_from_dict([row[0] for row in rows])
+
+    def append(self, batch: Mapping[str, Sequence[BaseMessage]]) -> None:
+        rows = [
+            (session_id, _encode(message))
+            for session_id, messages in batch.items()
+            for message in messages
+        ]
+        with self._lock, self._connection.transaction():
+            with self._connection.cursor() as cursor:
+                cursor.executemany(
+                    f"INSERT INTO {self._table} (session_id, message)"
+                    " VALUES (%s, %s::jsonb)",
+                    rows,
+                )
+
+    def clear(self, session_id: str) -> None:
+        with self._lock:
+            self._connection.execute(
+                f"DELETE FROM {self._table} WHERE session_id = %s", (session_id,)
+            )
+
+    def close(self) -> None:
+        with self._lock:
+            self._connection.close()
+
+
+def backend_from_url(url: str | None = None) -> SessionBackend:
+    """`postgresql://...` selects Postgres; anything else is a SQLite path."""
+
+    url = (url if url is not None else os.getenv("SESSION_STORE_URL", "")).strip()
+    if url.startswith(("postgresql://", "postgresql+psycopg://", "postgres://")):
+        return PostgresBackend(url)
+    return SQLiteBackend(url or DEFAULT_SQLITE_PATH)
+
+
+# =========================
+# Tiered Store
+# =========================
+
+
+class WriteBehindHistory(BaseChatMessageHistory):
+    """In-memory history whose new messages are persisted by the store."""
+
+    def __init__(
+        self, session_id: str, store: TieredSessionStore, messages: list[BaseMessage]
+    ) -> None:
+        self.session_id = session_id
+        self.messages = messages
+        self._store = store
+
+    def add_messages(self, messages: Sequence[BaseMessage]) -> None:
+        self.messages.extend(messages)
+        self._store.persist(self.session_id, messages)
+
+    def clear(self) -> None:
+        self.messages = []
+        self._store.forget(self.session_id)
+
+
+type HistoryFactory = Callable[
+    [str, TieredSessionStore, list[BaseMessage]], BaseChatMessageHistory
+]
+
+
+class TieredSessionStore:
+    """
+    LRU hot tier over a write-behind persistent backend.
+
+    `history_factory(session_id, store, messages)` builds the in-memory
+    history of a rehydrated session; it must call `store.persist` for new
+    messages. Defaults to `WriteBehindHistory`.
+    """
+
+    def __init__(
+        self,
+        backend: SessionBackend,
+        max_sessions: int = DEFAULT_MAX_SESSIONS,
+        flush_interval: float = DEFAULT_FLUSH_INTERVAL_SECONDS,
+        flush_batch_size: int = DEFAULT_FLUSH_BATCH_SIZE,
+        history_factory: HistoryFactory | None = None,
+    ) -> None:
+        self.backend = backend
+        self.history_factory = history_factory or WriteBehindHistory
+        self.max_sessions = max_sessions
+        self.flush_interval = flush_interval
+        self.flush_batch_size = flush_batch_size
+        self.rehydrations = 0
+
+        self._hot: OrderedDict[str, BaseChatMessageHistory] = OrderedDict()
+        self._pending: dict[str, list[BaseMessage]] = {}
+        self._pending_count = 0
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._closed = False
+
+        self._flusher = threading.Thread(
+            target=self._flush_loop, name="session-write-behind", daemon=True
+        )
+        self._flusher.start()
+        atexit.register(self.close)
+
+    def get_session_history(self, session_id: str) -> BaseChatMessageHistory:
+        """`get_session_history` for `RunnableWithMessageHistory`."""
+
+        with self._lock:
+            history = self._hot.get(session_id)
+            if history is not None:
+                self._hot.move_to_end(session_id)
+                return history
+
+        # Cold session: load it outside the hot-tier lock, then merge the
+        # messages that are still waiting to be written. Holding the flush
+        # lock keeps a batch from being in flight (neither pending nor
+        # stored) while we read.
+        with self._flush_lock:
+            messages = self.backend.load(session_id)
+            with self._lock:
+                history = self._hot.get(session_id)
+                if history is None:
+                    messages.extend(self._pending.get(session_id, ()))
+                    history = self.history_factory(session_id, self, messages)
+                    self._hot[session_id] = history
+                    self.rehydrations += 1
+                    while len(self._hot) > self.max_sessions:
+                        self._hot.popitem(last=False)
+                return history
+
+    def persist(self, session_id: str, messages: Sequence[BaseMessage]) -> None:
+        """Buffer new messages of a session for the next flush."""
+
+        with self._lock:
+            self._pending.setdefault(session_id, []).extend(messages)
+            self._pending_count += len(messages)
+            full = self._pending_count >= self.flush_batch_size
+        if full:
+            self._wake.set()
+
+    def forget(self, session_id: str) -> None:
+        """Delete a session's stored messages, including unflushed ones."""
+
+        with self._flush_lock:
+            with self._lock:
+                self._pending_count -= len(self._pending.pop(session_id, ()))
+            self.backend.clear(session_id)
+
+    def flush(self) -> None:
+        """Write every buffered message to the backend."""
+
+        with self._flush_lock:
+            with self._lock:
+                batch, self._pending = self._pending, {}
+                self._pending_count = 0
+            if not batch:
+                return
+            try:
+                self.backend.append(batch)
+            except Exception:
+                # Put the batch back in front of newer writes and retry later.
+                with self._lock:
+                    for session_id, messages in batch.items():
+                        newer = self._pending.get(session_id, [])
+                        self._pending[session_id] = [*messages, *newer]
+                    self._pending_count = sum(map(len, self._pending.values()))
+                raise
+
+    def _flush_loop(self) -> None:
+        failing = False
+        while not self._closed:
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            try:
+                self.flush()
+            except Exception:  # keep the flusher alive; data stays pending
+                if not failing:
+                    logger.exception("Session store flush failed; retrying.")
+                failing = True
+            else:
+                if failing:
+                    logger.info("Session store flush recovered.")
+                failing = False
+
+    def close(self) -> None:
+        """Flush pending writes and stop the background thread."""
+
+        if self._closed:
+            return
+        self._closed = True
+        atexit.unregister(self.close)
+        self._wake.set()
+        self._flusher.join()
+        self.flush()
+        self.backend.close()
+
+    def __len__(self) -> int:
+        return len(self._hot)
+
+
+# =========================
+# Demo Runner
+# =========================
+
+
+def build_chain(store: TieredSessionStore) -> RunnableWithMessageHistory:
+    """The ch04 conversational chain with a fake model and the tiered store."""
+
+    prompt = ChatPromptTemplate.from_messages(
+        [
+            ("system", "You are a helpful assistant."),
+            MessagesPlaceholder(variable_name="history"),
+            ("human", "{input}"),
+        ]
+    )
+    llm = FakeListChatModel(responses=["Nice to meet you!", "Noted."])
+
+    return RunnableWithMessageHistory(
+        runnable=prompt | llm,
+        get_session_history=store.get_session_history,
+        input_messages_key="input",
+        history_messages_key="history",
+    )
+
+
+def run_restart_demo(path: Path) -> None:
+    """Show that a session survives a restart and is rehydrated lazily."""
+
+    config = {"configurable": {"session_id": "demo-session"}}
+
+    store = TieredSessionStore(SQLiteBackend(path))
+    build_chain(store).invoke({"input": "Hello, my name is Higor."}, config=config)  # type: ignore
+    store.close()
+
+    restarted = TieredSessionStore(SQLiteBackend(path))
+    print(f"After restart: {len(restarted)} hot sessions")
+    history = restarted.get_session_history("demo-session")
+    print(f"Rehydrated {len(history.messages)} messages:")
+    for message in history.messages:
+        print(f"  {message.type}: {message.content}")
+    restarted.close()
+
+
+def run_benchmark(path: Path, sessions: int, hot_sessions: int) -> None:
+    """Compare memory and hot-path latency with the unbounded dict."""
+
+    def turn(index: int) -> list[BaseMessage]:
+        return [HumanMessage(f"Hello, I am user {index}."), AIMessage("Hi there!")]
+
+    rng = random.Random(42)
+
+    tracemalloc.start()
+    unbounded: dict[str, InMemoryChatMessageHistory] = {}
+    for index in range(sessions):
+        history = unbounded.setdefault(f"s{index}", InMemoryChatMessageHistory())
+        history.add_messages(turn(index))
+    _, unbounded_peak = tracemalloc.get_traced_memory()
+    del unbounded
+    tracemalloc.stop()
+
+    tracemalloc.start()
+    store = TieredSessionStore(SQLiteBackend(path), max_sessions=hot_sessions)
+    start = time.perf_counter()
+    for index in range(sessions):
+        store.get_session_history(f"s{index}").add_messages(turn(index))
+    store.flush()
+    write_elapsed = time.perf_counter() - start
+    _, tiered_peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    hot_ids = [f"s{index}" for index in range(sessions - hot_sessions, sessions)]
+    latencies = []
+    for session_id in rng.choices(hot_ids, k=10_000):
+        start = time.perf_counter()
+        store.get_session_history(session_id)
+        latencies.append(time.perf_counter() - start)
+    latencies.sort()
+
+    cold_ids = [f"s{index}" for index in rng.sample(range(sessions // 2), 1_000)]
+    start = time.perf_counter()
+    for session_id in cold_ids:
+        store.get_session_history(session_id)
+    rehydrate = (time.perf_counter() - start) / len(cold_ids)
+    store.close()
+
+    print(f"{sessions:,} sessions, hot tier {hot_sessions:,}")
+    print(f"  unbounded dict peak memory:  {unbounded_peak / 1e6:>8.1f}MB")
+    print(f"  tiered store peak memory:    {tiered_peak / 1e6:>8.1f}MB")
+    print(
+        f"  write throughput:            {sessions / write_elapsed:>8,.0f} sessions/s"
+    )
+    print(
+        f"  hot lookup p50/p99:          {latencies[5_000] * 1e6:>8.2f}µs"
+        f" / {latencies[9_900] * 1e6:.2f}µs"
+    )
+    print(f"  cold rehydration:            {rehydrate * 1e6:>8.1f}µs")
+
+
+# =========================
+# Entrypoint
+# =========================
+
+
+def main() -> None:
+    """Main entrypoint for the application."""
+
+    parser = argparse.ArgumentParser(description="Tiered session store")
+    parser.add_argument("--sessions", type=int, default=BENCH_SESSIONS)
+    parser.add_argument("--hot-sessions", type=int, default=BENCH_HOT_SESSIONS)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        run_restart_demo(Path(directory) / "demo.sqlite3")
+        print()
+        run_benchmark(
+            Path(directory) / "bench.sqlite3", args.sessions, args.hot_sessions
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,256 @@
+"""
+Incremental Sliding-Window History
+----------------------------------
+
+O(1) per-turn replacement for re-running `trim_messages` over the whole
+history on every turn:
+- Messages live in a ring buffer (`deque`) together with their token count,
+  computed once when the message is added
+- A running total of the window's tokens is kept, so adding a message only
+  evicts from the left until the window fits again (amortized O(1))
+- Same result as `trim_messages(strategy="last", start_on="human",
+  include_system=True, allow_partial=False)`
+- The prompt only receives the window; the full history is never
+  materialized (older messages are still persisted by the session store)
+
+Plugs into `TieredSessionStore` (p03) through `windowed(...)`.
+"""
+
+from __future__ import annotations
+
+import argparse
+import random
+import time
+from collections import deque
+from collections.abc import Callable, Iterable, Sequence
+from functools import partial
+from typing import TYPE_CHECKING
+
+from langchain_core.chat_history import BaseChatMessageHistory
+from langchain_core.messages import (
+    AIMessage,
+    BaseMessage,
+    HumanMessage,
+    SystemMessage,
+    trim_messages,
+)
+from langchain_core.messages.utils import count_tokens_approximately
+
+if TYPE_CHECKING:
+    from p03_tiered_session_store import HistoryFactory, TieredSessionStore
+
+# =========================
+# Configuration
+# =========================
+
+BENCH_SESSION_LENGTHS = (10, 100, 1_000, 10_000)
+BENCH_MAX_TOKENS = 200
+
+type TokenCounter = Callable[[BaseMessage], int]
+
+
+# =========================
+# Token Counters
+# =========================
+
+
+def count_messages(message: BaseMessage) -> int:
+    """One "token" per message, like `trim_messages(token_counter=len)`."""
+
+    return 1
+
+
+def count_message_tokens(message: BaseMessage) -> int:
+    """Approximate tokens of a single message."""
+
+    return count_tokens_approximately([message])
+
+
+# =========================
+# Windowed History
+# =========================
+
+
+class WindowedChatMessageHistory(BaseChatMessageHistory):
+    """
+    Chat history that only keeps the most recent window of messages.
+
+    `on_add`/`on_clear` forward writes (e.g. to the session store);
+    `on_evict` receives the messages that fall out of the window, in order.
+    """
+
+    def __init__(
+        self,
+        max_tokens: int,
+        token_counter: TokenCounter = count_messages,
+        start_on: str | None = "human",
+        include_system: bool = True,
+        messages: Iterable[BaseMessage] = (),
+        on_add: Callable[[Sequence[BaseMessage]], None] | None = None,
+        on_clear: Callable[[], None] | None = None,
+        on_evict: Callable[[list[BaseMessage]], None] | None = None,
+    ) -> None:
+        self.max_tokens = max_tokens
+        self.token_counter = token_counter
+        self.start_on = start_on
+        self.include_system = include_system
+        self._on_add = on_add
+        self._on_clear = on_clear
+        self._on_evict = on_evict
+
+        self._system: tuple[BaseMessage, int] | None = None
+        self._window: deque[tuple[BaseMessage, int]] = deque()
+        self._total = 0
+        self._seen_first = False
+        self._append(messages)
+
+    @property
+    def messages(self) -> list[BaseMessage]:  # type: ignore[override]
+        """The current window, with the initial system message if kept."""
+
+        window = [message for message, _ in self._window]
+        return [self._system[0], *window] if self._system else window
+
+    @property
+    def window_tokens(self) -> int:
+        return self._total + (self._system[1] if self._system else 0)
+
+    def _append(self, messages: Iterable[BaseMessage]) -> None:
+        evicted: list[BaseMessage] = []
+        for message in messages:
+            tokens = self.token_counter(message)
+            first, self._seen_first = not self._seen_first, True
+
+            if first and self.include_system and isinstance(message, SystemMessage):
+                self._system = (message, tokens)
+                continue
+
+            self._window.append((message, tokens))
+            self._total += tokens
+
+        budget = self.max_tokens - (self._system[1] if self._system else 0)
+        while self._window and self._total > budget:
+            message, tokens = self._window.popleft()
+            self._total -= tokens
+            evicted.append(message)
+
+        # Every message is popped at most once, so this stays amortized O(1).
+        while (
+            self._window and self.start_on and self._window[0][0].type != self.start_on
+        ):
+            message, tokens = self._window.popleft()
+            self._total -= tokens
+            evicted.append(message)
+
+        if evicted and self._on_evict is not None:
+            self._on_evict(evicted)
+
+    def add_messages(self, messages: Sequence[BaseMessage]) -> None:
+        self._append(messages)
+        if self._on_add is not None:
+            self._on_add(messages)
+
+    def clear(self) -> None:
+        self._system = None
+        self._window.clear()
+        self._total = 0
+        self._seen_first = False
+        if self._on_clear is not None:
+            self._on_clear()
+
+
+def windowed(
+    max_tokens: int,
+    token_counter: TokenCounter = count_messages,
+    start_on: str | None = "human",
+    include_system: bool = True,
+) -> HistoryFactory:
+    """`history_factory` for `TieredSessionStore` that keeps only the window."""
+
+    def factory(
+        session_id: str, store: TieredSessionStore, messages: list[BaseMessage]
+    ) -> BaseChatMessageHistory:
+        return WindowedChatMessageHistory(
+            max_tokens,
+            token_counter,
+            start_on,
+            include_system,
+            messages=messages,
+            on_add=partial(store.persist, session_id),
+            on_clear=partial(store.forget, session_id),
+        )
+
+    return factory
+
+
+# =========================
+# Benchmark
+# =========================
+
+
+def random_turns(count: int, rng: random.Random) -> list[BaseMessage]:
+    messages: list[BaseMessage] = [SystemMessage("You are a helpful assistant.")]
+    for index in range(count):
+        words = " ".join(["word"] * rng.randint(1, 60))
+        messages.append(HumanMessage(f"Question {index}: {words}"))
+        messages.append(AIMessage(f"Answer {index}: {words}"))
+    return messages
+
+
+def trimmed(messages: list[BaseMessage], max_tokens: int) -> list[BaseMessage]:
+    return trim_messages(
+        messages,
+        token_counter=count_tokens_approximately,
+        max_tokens=max_tokens,
+        strategy="last",
+        start_on="human",
+        include_system=True,
+        allow_partial=False,
+    )
+
+
+def run_benchmark(max_tokens: int) -> None:
+    """Per-turn cost of re-trimming vs. the incremental window."""
+
+    rng = random.Random(42)
+    trimmed(random_turns(1, rng), max_tokens)  # warm up imports and caches
+    print(f"{'turns':>7}{'trim_messages':>16}{'incremental':>14}")
+
+    for length in BENCH_SESSION_LENGTHS:
+        messages = random_turns(length, rng)
+
+        # Re-trimming cost for the last turns of a session of this length.
+        samples = min(length, 20)
+        start = time.perf_counter()
+        for end in range(len(messages) - 2 * samples, len(messages), 2):
+            trimmed(messages[: end + 1], max_tokens)
+        retrim = (time.perf_counter() - start) / samples
+
+        history = WindowedChatMessageHistory(max_tokens, count_message_tokens)
+        start = time.perf_counter()
+        for index in range(0, len(messages), 2):
+            history.add_messages(messages[index : index + 2])
+            window = history.messages
+        incremental = (time.perf_counter() - start) / (len(messages) / 2)
+
+        assert window == trimmed(messages, max_tokens)
+        print(f"{length:>7}{retrim * 1e6:>14.1f}µs{incremental * 1e6:>12.1f}µs")
+
+
+# =========================
+# Entrypoint
+# =========================
+
+
+def main() -> None:
+    """Main entrypoint for the application."""
+
+    parser = argparse.ArgumentParser(description="Incremental sliding window")
+    parser.add_argument("--max-tokens", type=int, default=BENCH_MAX_TOKENS)
+    args = parser.parse_args()
+
+    run_benchmark(args.max_tokens)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,506 @@
+"""
+Rolling-Summary Memory
+----------------------
+
+Memory mode between "keep everything" and "drop old turns":
+- The prompt carries a small recent window (p04) plus one running summary
+  message of everything that fell out of it
+- Evicted turns are folded into the summary by a cheap model on a background
+  thread, never on the `chain.invoke` path
+- Evicted messages are batched per session: a session is summarized once
+  enough tokens are pending (or they have waited too long), and all ready
+  sessions go to the model in a single `batch` call
+- Only one batch runs at a time, so the batches of a session are folded
+  in order; a failed session is retried with exponential backoff, and a
+  summary computed before `clear()` is never written back
+
+Prompt tokens per turn stay bounded by window + summary, while early facts
+(like the user's name) are kept. Plugs into `TieredSessionStore` (p03)
+through `summarized(...)`.
+"""
+
+from __future__ import annotations
+
+import argparse
+import atexit
+import logging
+import re
+import threading
+import time
+from collections.abc import Callable, Iterable, Sequence
+from dataclasses import dataclass
+from functools import partial
+from typing import TYPE_CHECKING, Any
+
+from langchain_core.callbacks import CallbackManagerForLLMRun
+from langchain_core.chat_history import (
+    BaseChatMessageHistory,
+    InMemoryChatMessageHistory,
+)
+from langchain_core.language_models import BaseChatModel, FakeListChatModel
+from langchain_core.messages import (
+    AIMessage,
+    BaseMessage,
+    SystemMessage,
+    get_buffer_string,
+)
+from langchain_core.messages.utils import count_tokens_approximately
+from langchain_core.output_parsers import StrOutputParser
+from langchain_core.outputs import ChatGeneration, ChatResult
+from langchain_core.prompt_values import PromptValue
+from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder
+from langchain_core.runnables import RunnableLambda, RunnableWithMessageHistory
+from p04_incremental_sliding_window import (
+    TokenCounter,
+    WindowedChatMessageHistory,
+    count_message_tokens,
+)
+
+if TYPE_CHECKING:
+    from p03_tiered_session_store import HistoryFactory, TieredSessionStore
+
+logger = logging.getLogger(__name__)
+
+# =========================
+# Configuration
+# =========================
+
+SUMMARY_MODEL_NAME = "gpt-5-nano"
+DEFAULT_WINDOW_TOKENS = 300
+DEFAULT_BATCH_TOKENS = 400
+DEFAULT_MAX_DELAY_SECONDS = 2.0
+DEFAULT_INTERVAL_SECONDS = 0.1
+DEFAULT_MAX_CONCURRENCY = 4
+DEFAULT_SUMMARY_WORDS = 120
+DEFAULT_RETRY_DELAY_SECONDS = 1.0
+MAX_RETRY_DELAY_SECONDS = 60.0
+
+SUMMARY_PREFIX = "Summary of the earlier conversation:\n"
+
+SUMMARY_PROMPT = ChatPromptTemplate.from_messages(
+    [
+        (
+            "system",
+            "You maintain the running summary of a conversation. Merge the new "
+            "lines into the current summary. Keep every durable fact about the "
+            "user (name, location, preferences, decisions) and drop small talk. "
+            "Reply with the updated summary only, at most {max_words} words.",
+        ),
+        ("human", "Current summary:\n{summary}\n\nNew lines:\n{lines}"),
+    ]
+)
+
+BENCH_TURNS = 200
+FAKE_CHAT_LATENCY_SECONDS = 0.01
+FAKE_SUMMARY_LATENCY_SECONDS = 0.2
+
+
+# =========================
+# Background Summarizer
+# =========================
+
+
+@dataclass
+class Pending:
+    """Evicted messages of a session waiting to be folded into its summary."""
+
+    messages: list[BaseMessage]
+    tokens: int
+    since: float  # when the oldest message arrived
+    failures: int = 0
+    retry_at: float = 0.0
+
+
+class RollingSummarizer:
+    """Fold evicted messages into per-session summaries off the request path."""
+
+    def __init__(
+        self,
+        llm: BaseChatModel,
+        batch_tokens: int = DEFAULT_BATCH_TOKENS,
+        max_delay: float = DEFAULT_MAX_DELAY_SECONDS,
+        interval: float = DEFAULT_INTERVAL_SECONDS,
+        max_concurrency: int = DEFAULT_MAX_CONCURRENCY,
+        max_words: int = DEFAULT_SUMMARY_WORDS,
+        token_counter: TokenCounter = count_message_tokens,
+    ) -> None:
+        self.chain = (
+            SUMMARY_PROMPT.partial(max_words=str(max_words)) | llm | StrOutputParser()
+        )
+        self.batch_tokens = batch_tokens
+        self.max_delay = max_delay
+        self.interval = interval
+        self.max_concurrency = max_concurrency
+        self.token_counter = token_counter
+        self.calls = 0
+        self.batches = 0
+        self.folded = 0
+
+        self._pending: dict[RollingSummaryHistory, Pending] = {}
+        self._lock = threading.Lock()
+        self._run_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._closed = False
+
+        self._worker = threading.Thread(
+            target=self._loop, name="rolling-summarizer", daemon=True
+        )
+        self._worker.start()
+        atexit.register(self.close)
+
+    def submit(
+        self, history: RollingSummaryHistory, messages: Sequence[BaseMessage]
+    ) -> None:
+        """Queue evicted messages of a session; returns immediately."""
+
+        tokens = sum(map(self.token_counter, messages))
+        with self._lock:
+            pending = self._pending.setdefault(
+                history, Pending([], 0, time.monotonic())
+            )
+            pending.messages.extend(messages)
+            pending.tokens += tokens
+            ready = pending.tokens >= self.batch_tokens
+        if ready:
+            self._wake.set()
+
+    def discard(self, history: RollingSummaryHistory) -> None:
+        """Drop a session's pending messages and any summary still in flight."""
+
+        with self._lock:
+            history.generation += 1
+            self._pending.pop(history, None)
+
+    def _take(self, force: bool) -> list[tuple[RollingSummaryHistory, Pending, int]]:
+        """
+        Pop the sessions ready to be summarized, with their generation.
+
+        `force` skips the size and age thresholds, not a failure's backoff.
+        """
+
+        now = time.monotonic()
+        with self._lock:
+            ready = [
+                history
+                for history, pending in self._pending.items()
+                if now >= pending.retry_at
+                and (
+                    force
+                    or pending.tokens >= self.batch_tokens
+                    or now - pending.since >= self.max_delay
+                )
+            ]
+            return [
+                (history, self._pending.pop(history), history.generation)
+                for history in ready
+            ]
+
+    def _retry(self, history: RollingSummaryHistory, job: Pending) -> None:
+        """Queue a failed job again, in front of anything evicted since."""
+
+        newer = self._pending.pop(history, Pending([], 0, time.monotonic()))
+        failures = job.failures + 1
+        delay = min(
+            MAX_RETRY_DELAY_SECONDS, DEFAULT_RETRY_DELAY_SECONDS * 2 ** (failures - 1)
+        )
+        self._pending[history] = Pending(
+            [*job.messages, *newer.messages],
+            job.tokens + newer.tokens,
+            job.since,
+            failures,
+            time.monotonic() + delay,
+        )
+
+    def run_once(self, force: bool = False) -> int:
+        """Summarize every ready session in one batch; returns the job count."""
+
+        with self._run_lock:
+            jobs = self._take(force)
+            if not jobs:
+                return 0
+
+            inputs = [
+                {
+                    "summary": history.summary or "(empty)",
+                    "lines": get_buffer_string(job.messages),
+                }
+                for history, job, _ in jobs
+            ]
+            results = self.chain.batch(
+                inputs,
+                config={"max_concurrency": self.max_concurrency},
+                return_exceptions=True,
+            )
+            self.batches += 1
+            self.calls += len(jobs)
+
+            failed = 0
+            with self._lock:
+                for (history, job, generation), result in zip(
+                    jobs, results, strict=True
+                ):
+                    if history.generation != generation:
+                        continue  # cleared while in flight
+                    if isinstance(result, Exception):
+                        self._retry(history, job)
+                        failed += 1
+                    else:
+                        history.summary = result.strip()
+                        self.folded += len(job.messages)
+
+            if failed:
+                logger.warning(
+                    "Summary failed for %d of %d sessions; retrying with backoff: %s",
+                    failed,
+                    len(jobs),
+                    next(r for r in results if isinstance(r, Exception)),
+                )
+            return len(jobs)
+
+    def flush(self) -> None:
+        """
+        Fold everything pending now (blocks; for shutdown and tests).
+
+        Sessions backing off after a failure are left pending.
+        """
+
+        while self.run_once(force=True):
+            pass
+
+    def _loop(self) -> None:
+        while not self._closed:
+            self._wake.wait(self.interval)
+            self._wake.clear()
+            self.run_once()
+
+    def close(self) -> None:
+        if self._closed:
+            return
+        self._closed = True
+        self._wake.set()
+        self._worker.join()
+
+
+# =========================
+# Summary + Window History
+# =========================
+
+
+class RollingSummaryHistory(BaseChatMessageHistory):
+    """Recent window plus a running summary of the messages it evicted."""
+
+    def __init__(
+        self,
+        summarizer: RollingSummarizer,
+        max_tokens: int = DEFAULT_WINDOW_TOKENS,
+        token_counter: TokenCounter = count_message_tokens,
+        messages: Iterable[BaseMessage] = (),
+        on_add: Callable[[Sequence[BaseMessage]], None] | None = None,
+        on_clear: Callable[[], None] | None = None,
+    ) -> None:
+        self.summarizer = summarizer
+        self.summary: str | None = None
+        # Bumped by `clear()`; a summary of an older generation is discarded.
+        self.generation = 0
+        self._on_clear = on_clear
+        self.window = WindowedChatMessageHistory(
+            max_tokens,
+            token_counter,
+            messages=messages,
+            on_add=on_add,
+            on_evict=partial(summarizer.submit, self),
+        )
+
+    @property
+    def messages(self) -> list[BaseMessage]:  # type: ignore[override]
+        """The summary message (once there is one) followed by the window."""
+
+        window = self.window.messages
+        if not self.summary:
+            return window
+        return [SystemMessage(SUMMARY_PREFIX + self.summary), *window]
+
+    def add_messages(self, messages: Sequence[BaseMessage]) -> None:
+        self.window.add_messages(messages)
+
+    def clear(self) -> None:
+        self.summarizer.discard(self)
+        self.summary = None
+        self.window.clear()
+        if self._on_clear is not None:
+            self._on_clear()
+
+
+def summarized(
+    summarizer: RollingSummarizer,
+    max_tokens: int = DEFAULT_WINDOW_TOKENS,
+    token_counter: TokenCounter = count_message_tokens,
+) -> HistoryFactory:
+    """
+    `history_factory` for `TieredSessionStore`.
+
+    The summary lives in memory only: a rehydrated session re-summarizes the
+    stored messages that do not fit the window, in the background.
+    """
+
+    def factory(
+        session_id: str, store: TieredSessionStore, messages: list[BaseMessage]
+    ) -> BaseChatMessageHistory:
+        return RollingSummaryHistory(
+            summarizer,
+            max_tokens,
+            token_counter,
+            messages=messages,
+            on_add=partial(store.persist, session_id),
+            on_clear=partial(store.forget, session_id),
+        )
+
+    return factory
+
+
+def build_summarizer() -> RollingSummarizer:
+    """Summarizer backed by the cheap OpenAI model."""
+
+    from langchain_openai import ChatOpenAI
+
+    return RollingSummarizer(ChatOpenAI(model=SUMMARY_MODEL_NAME))
+
+
+# =========================
+# Offline Demo
+# =========================
+
+FACT = re.compile(r"\b(?:my|I)\b[^.?!,]*", re.IGNORECASE)
+
+
+class FactSummaryModel(BaseChatModel):
+    """Offline stand-in for the summary model: keeps first-person facts."""
+
+    latency: float = FAKE_SUMMARY_LATENCY_SECONDS
+    max_facts: int = 8
+
+    @property
+    def _llm_type(self) -> str:
+        return "fact-summary-model"
+
+    def _generate(
+        self,
+        messages: list[BaseMessage],
+        stop: list[str] | None = None,
+        run_manager: CallbackManagerForLLMRun | None = None,
+        **kwargs: Any,
+    ) -> ChatResult:
+        time.sleep(self.latency)
+        summary, _, lines = str(messages[-1].content).partition("\n\nNew lines:\n")
+
+        facts = [line[2:] for line in summary.splitlines() if line.startswith("- ")]
+        for line in lines.splitlines():
+            if line.startswith("Human: "):
+                facts += [
+                    f"the user said {fact.strip()}" for fact in FACT.findall(line)
+                ]
+        facts = list(dict.fromkeys(facts))[-self.max_facts :]
+
+        message = AIMessage("\n".join(f"- {fact}" for fact in facts))
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+
+def conversation(turns: int) -> list[str]:
+    inputs = ["Hi, my name is Higor.", "I live in Recife."]
+    inputs += [
+        f"Tell me a fun fact about topic {index}, in two sentences."
+        for index in range(turns - 3)
+    ]
+    return [*inputs, "Where do I live, and what is my name?"]
+
+
+def run_mode(
+    name: str, get_session_history: Callable[[str], BaseChatMessageHistory]
+) -> None:
+    """Run one conversation, measuring prompt tokens and invoke latency."""
+
+    prompt_tokens: list[int] = []
+    prompts: list[PromptValue] = []
+
+    def meter(value: PromptValue) -> PromptValue:
+        prompts.append(value)
+        prompt_tokens.append(count_tokens_approximately(value.to_messages()))
+        return value
+
+    prompt = ChatPromptTemplate.from_messages(
+        [
+            ("system", "You are a helpful assistant."),
+            MessagesPlaceholder(variable_name="history"),
+            ("human", "{input}"),
+        ]
+    )
+    llm = FakeListChatModel(
+        responses=["Here is a fun fact about that topic. " * 6],
+        sleep=FAKE_CHAT_LATENCY_SECONDS,
+    )
+    chain = RunnableWithMessageHistory(
+        runnable=prompt | RunnableLambda(meter) | llm,
+        get_session_history=get_session_history,
+        input_messages_key="input",
+        history_messages_key="history",
+    )
+
+    config = {"configurable": {"session_id": "demo-session"}}
+    latencies = []
+    for text in conversation(BENCH_TURNS):
+        start = time.perf_counter()
+        chain.invoke({"input": text}, config=config)  # type: ignore
+        latencies.append(time.perf_counter() - start)
+
+    final_prompt = prompts[-1].to_string()
+    recall = sum(fact in final_prompt for fact in ("Higor", "Recife")) / 2
+    latencies.sort()
+    print(
+        f"{name:<16}{prompt_tokens[-1]:>8,}{max(prompt_tokens):>8,}"
+        f"{latencies[len(latencies) // 2] * 1e3:>8.1f}ms"
+        f"{latencies[int(len(latencies) * 0.95)] * 1e3:>7.1f}ms{recall:>8.0%}"
+    )
+
+
+def run_demo(window_tokens: int) -> None:
+    """Compare full history, sliding window and rolling summary."""
+
+    print(f"{BENCH_TURNS} turns, window {window_tokens} tokens")
+    print(f"{'mode':<16}{'final':>8}{'max':>8}{'p50':>10}{'p95':>9}{'recall':>8}")
+
+    full = InMemoryChatMessageHistory()
+    run_mode("full history", lambda session_id: full)
+
+    window = WindowedChatMessageHistory(window_tokens, count_message_tokens)
+    run_mode("sliding window", lambda session_id: window)
+
+    summarizer = RollingSummarizer(FactSummaryModel())
+    summary = RollingSummaryHistory(summarizer, window_tokens)
+    run_mode("rolling summary", lambda session_id: summary)
+    summarizer.close()
+
+    print(
+        f"\nSummarizer: {summarizer.folded} messages folded in {summarizer.calls} "
+        f"calls ({summarizer.batches} batches), "
+        f"{FAKE_SUMMARY_LATENCY_SECONDS * 1e3:.0f}ms each, off the request path."
+    )
+    print(f"Final summary:\n{summary.summary}")
+
+
+# =========================
+# Entrypoint
+# =========================
+
+
+def main() -> None:
+    """Main entrypoint for the application."""
+
+    parser = argparse.ArgumentParser(description="Rolling-summary memory")
+    parser.add_argument("--window-tokens", type=int, default=DEFAULT_WINDOW_TOKENS)
+    args = parser.parse_args()
+
+    run_demo(args.window_tokens)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,557 @@
+"""
+Retrieval-Based Long-Term Memory
+--------------------------------
+
+Instead of sending the whole history through
+`MessagesPlaceholder(variable_name="history")`, the prompt carries:
+- A short recent window (p04)
+- The top-k past turns most relevant to the new input, retrieved from a
+  vector index
+
+Turns that fall out of the window are embedded and written to the index in
+batches by a background thread, so `chain.invoke` never waits on
+embeddings. Every turn is stored with its `session_id`, and searches filter
+on it. With PGVector (the ch05 database) that filter is backed by an
+expression index, so lookups only touch the session's own rows.
+
+Prompt size and latency stay flat no matter how long the session is. The
+benchmark compares full-history, sliding-window and long-term modes offline;
+pass `--pgvector` to run it against `PGVECTOR_URL` with OpenAI embeddings.
+"""
+
+from __future__ import annotations
+
+import argparse
+import atexit
+import hashlib
+import logging
+import math
+import os
+import re
+import threading
+import time
+from collections.abc import Callable, Iterable, Sequence
+from functools import partial
+from typing import TYPE_CHECKING, Any, Protocol
+
+import numpy as np
+from langchain_core.chat_history import (
+    BaseChatMessageHistory,
+    InMemoryChatMessageHistory,
+)
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+from langchain_core.language_models import FakeListChatModel
+from langchain_core.messages import (
+    AIMessage,
+    BaseMessage,
+    HumanMessage,
+    get_buffer_string,
+)
+from langchain_core.messages.utils import count_tokens_approximately
+from langchain_core.prompt_values import PromptValue
+from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder
+from langchain_core.runnables import (
+    Runnable,
+    RunnableConfig,
+    RunnableLambda,
+    RunnablePassthrough,
+    RunnableWithMessageHistory,
+)
+from p04_incremental_sliding_window import (
+    TokenCounter,
+    WindowedChatMessageHistory,
+    count_message_tokens,
+)
+
+if TYPE_CHECKING:
+    from langchain_postgres import PGVector
+    from p03_tiered_session_store import HistoryFactory, TieredSessionStore
+
+logger = logging.getLogger(__name__)
+
+# =========================
+# Configuration
+# =========================
+
+DEFAULT_EMBEDDING_MODEL = "text-embedding-3-small"
+DEFAULT_MEMORY_COLLECTION = "chat_long_term_memory"
+DEFAULT_WINDOW_TOKENS = 300
+DEFAULT_TOP_K = 4
+DEFAULT_FLUSH_INTERVAL_SECONDS = 0.5
+DEFAULT_FLUSH_BATCH_SIZE = 64
+
+SESSION_INDEX_SQL = """
+CREATE INDEX IF NOT EXISTS ix_langchain_pg_embedding_session
+ON langchain_pg_embedding (collection_id, (cmetadata ->> 'session_id'))
+"""
+
+BENCH_SESSION_TURNS = (10, 100, 1_000, 3_000)
+BENCH_SAMPLES = 20
+HASHING_DIMENSIONS = 512
+
+# Embedding matrix, documents and id -> row of one session's turns.
+type SessionRows = tuple[np.ndarray, list[Document], dict[str, int]]
+
+
+# =========================
+# Turn Index
+# =========================
+
+
+class TurnIndex(Protocol):
+    """Vector index of past turns, searched per session."""
+
+    def add(self, documents: Sequence[Document], ids: Sequence[str]) -> None: ...
+
+    def search(self, session_id: str, query: str, k: int) -> list[Document]: ...
+
+
+class InMemoryTurnIndex:
+    """
+    Offline stand-in: one growing embedding matrix per session.
+
+    Searching a session is one matrix-vector product over that session's
+    rows only, like the session-filtered PGVector query.
+    """
+
+    def __init__(self, embeddings: Embeddings) -> None:
+        self.embeddings = embeddings
+        self._sessions: dict[str, SessionRows] = {}
+        self._lock = threading.Lock()
+
+    def add(self, documents: Sequence[Document], ids: Sequence[str]) -> None:
+        vectors = self.embeddings.embed_documents(
+            [document.page_content for document in documents]
+        )
+        with self._lock:
+            for document, id_, vector in zip(documents, ids, vectors, strict=True):
+                session_id = document.metadata["session_id"]
+                matrix, rows, positions = self._sessions.get(
+                    session_id, (np.empty((0, len(vector))), [], {})
+                )
+                if id_ in positions:  # upsert
+                    matrix[positions[id_]] = vector
+                    rows[positions[id_]] = document
+                    continue
+                if len(rows) == len(matrix):  # grow by doubling
+                    matrix = np.resize(matrix, (max(16, 2 * len(matrix)), len(vector)))
+                matrix[len(rows)] = vector
+                positions[id_] = len(rows)
+                rows.append(document)
+                self._sessions[session_id] = (matrix, rows, positions)
+
+    def search(self, session_id: str, query: str, k: int) -> list[Document]:
+        with self._lock:
+            matrix, rows, _ = self._sessions.get(session_id, (np.empty(0), [], {}))
+            matrix = matrix[: len(rows)]
+            rows = list(rows)
+        if not rows:
+            return []
+        scores = matrix @ np.asarray(self.embeddings.embed_query(query))
+        top = np.argsort(-scores)[:k]
+        return [rows[position] for position in top]
+
+
+class PGVectorTurnIndex:
+    """Turns stored in the ch05 PGVector database, filtered by session."""
+
+    def __init__(self, store: PGVector) -> None:
+        self.store = store
+        self._create_session_index()
+
+    def _create_session_index(self) -> None:
+        from sqlalchemy import text
+
+        with self.store.session_maker() as session:
+            session.execute(text(SESSION_INDEX_SQL))
+            session.commit()
+
+    def add(self, documents: Sequence[Document], ids: Sequence[str]) -> None:
+        # Deterministic ids: re-adding a turn (e.g. on rehydration) upserts it.
+        self.store.add_documents(list(documents), ids=list(ids))
+
+    def search(self, session_id: str, query: str, k: int) -> list[Document]:
+        # `$in` compiles to `cmetadata ->> 'session_id' IN (...)`, which the
+        # expression index serves; `$eq` compiles to `jsonb_path_match(...)`,
+        # which no btree index can.
+        return self.store.similarity_search(
+            query, k=k, filter={"session_id": {"$in": [session_id]}}
+        )
+
+
+def build_pgvector_index() -> PGVectorTurnIndex:
+    """`PGVECTOR_URL` database, `PGVECTOR_MEMORY_COLLECTION` collection."""
+
+    from langchain_openai import OpenAIEmbeddings
+    from langchain_postgres import PGVector
+
+    store = PGVector(
+        embeddings=OpenAIEmbeddings(
+            model=os.getenv("OPENAI_MODEL", DEFAULT_EMBEDDING_MODEL)
+        ),
+        collection_name=os.getenv(
+            "PGVECTOR_MEMORY_COLLECTION", DEFAULT_MEMORY_COLLECTION
+        ),
+        connection=os.environ["PGVECTOR_URL"],
+        use_jsonb=True,
+    )
+    return PGVectorTurnIndex(store)
+
+
+# =========================
+# Batched Embedding Writer
+# =========================
+
+
+class EmbeddingWriter:
+    """Buffer turns from every session and index them in batches."""
+
+    def __init__(
+        self,
+        index: TurnIndex,
+        flush_interval: float = DEFAULT_FLUSH_INTERVAL_SECONDS,
+        flush_batch_size: int = DEFAULT_FLUSH_BATCH_SIZE,
+    ) -> None:
+        self.index = index
+        self.flush_interval = flush_interval
+        self.flush_batch_size = flush_batch_size
+        self.batches = 0
+        self.written = 0
+
+        self._pending: dict[str, Document] = {}
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._closed = False
+
+        self._flusher = threading.Thread(
+            target=self._flush_loop, name="memory-embedding-writer", daemon=True
+        )
+        self._flusher.start()
+        atexit.register(self.close)
+
+    def submit(self, documents: Iterable[Document]) -> None:
+        """Queue turns for embedding; returns immediately."""
+
+        with self._lock:
+            for document in documents:
+                assert document.id is not None
+                self._pending[document.id] = document
+            full = len(self._pending) >= self.flush_batch_size
+        if full:
+            self._wake.set()
+
+    def flush(self) -> None:
+        """Embed and store everything queued so far."""
+
+        with self._flush_lock:
+            while True:
+                with self._lock:
+                    ids = list(self._pending)[: self.flush_batch_size]
+                    batch = [self._pending.pop(id_) for id_ in ids]
+                if not batch:
+                    return
+                try:
+                    self.index.add(batch, ids)
+                except Exception:
+                    # Newer versions of a turn win over the failed batch.
+                    with self._lock:
+                        for document in batch:
+                            assert document.id is not None
+                            self._pending.setdefault(document.id, document)
+                    raise
+                self.batches += 1
+                self.written += len(batch)
+
+    def _flush_loop(self) -> None:
+        failing = False
+        while not self._closed:
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            try:
+                self.flush()
+            except Exception:  # keep the writer alive; turns stay pending
+                if not failing:
+                    logger.exception("Memory embedding flush failed; retrying.")
+                failing = True
+            else:
+                if failing:
+                    logger.info("Memory embedding flush recovered.")
+                failing = False
+
+    def close(self) -> None:
+        """Flush pending turns and stop the background thread."""
+
+        if self._closed:
+            return
+        self._closed = True
+        self._wake.set()
+        self._flusher.join()
+        self.flush()
+
+
+# =========================
+# Long-Term Memory History
+# =========================
+
+
+class LongTermMemoryHistory(BaseChatMessageHistory):
+    """Recent window; turns evicted from it go to the long-term index."""
+
+    def __init__(
+        self,
+        session_id: str,
+        writer: EmbeddingWriter,
+        max_tokens: int = DEFAULT_WINDOW_TOKENS,
+        token_counter: TokenCounter = count_message_tokens,
+        messages: Iterable[BaseMessage] = (),
+        on_add: Callable[[Sequence[BaseMessage]], None] | None = None,
+        on_clear: Callable[[], None] | None = None,
+    ) -> None:
+        self.session_id = session_id
+        self.writer = writer
+        self._on_clear = on_clear
+        self.window = WindowedChatMessageHistory(
+            max_tokens,
+            token_counter,
+            messages=messages,
+            on_add=on_add,
+            on_evict=self._index_turns,
+        )
+
+    @property
+    def messages(self) -> list[BaseMessage]:  # type: ignore[override]
+        return self.window.messages
+
+    def _index_turns(self, evicted: list[BaseMessage]) -> None:
+        # The window always starts on a human message, so evicted messages
+        # come in whole turns: a human message and what followed it.
+        turns: list[list[BaseMessage]] = []
+        for message in evicted:
+            if isinstance(message, HumanMessage) or not turns:
+                turns.append([])
+            turns[-1].append(message)
+
+        # Ids come from the content, not from a counter that restarts with the
+        # process: a turn evicted again after rehydration upserts its own row
+        # instead of overwriting another one.
+        indexed_at = time.time_ns()
+        documents = []
+        for offset, turn in enumerate(turns):
+            content = get_buffer_string(turn)
+            digest = hashlib.blake2b(content.encode(), digest_size=8).hexdigest()
+            documents.append(
+                Document(
+                    id=f"{self.session_id}:{digest}",
+                    page_content=content,
+                    metadata={
+                        "session_id": self.session_id,
+                        "indexed_at": indexed_at + offset,
+                    },
+                )
+            )
+        self.writer.submit(documents)
+
+    def add_messages(self, messages: Sequence[BaseMessage]) -> None:
+        self.window.add_messages(messages)
+
+    def clear(self) -> None:
+        # Indexed turns are kept: long-term memory outlives the window.
+        self.window.clear()
+        if self._on_clear is not None:
+            self._on_clear()
+
+
+def long_term(
+    writer: EmbeddingWriter,
+    max_tokens: int = DEFAULT_WINDOW_TOKENS,
+    token_counter: TokenCounter = count_message_tokens,
+) -> HistoryFactory:
+    """`history_factory` for `TieredSessionStore` (p03)."""
+
+    def factory(
+        session_id: str, store: TieredSessionStore, messages: list[BaseMessage]
+    ) -> BaseChatMessageHistory:
+        return LongTermMemoryHistory(
+            session_id,
+            writer,
+            max_tokens,
+            token_counter,
+            messages=messages,
+            on_add=partial(store.persist, session_id),
+            on_clear=partial(store.forget, session_id),
+        )
+
+    return factory
+
+
+# =========================
+# Chain Builder
+# =========================
+
+
+def build_prompt() -> ChatPromptTemplate:
+    return ChatPromptTemplate.from_messages(
+        [
+            ("system", "You are a helpful assistant."),
+            ("system", "Relevant earlier turns of this conversation:\n{memories}"),
+            MessagesPlaceholder(variable_name="history"),
+            ("human", "{input}"),
+        ]
+    )
+
+
+def build_chain(
+    llm: Runnable[PromptValue, BaseMessage],
+    index: TurnIndex,
+    get_session_history: Callable[[str], BaseChatMessageHistory],
+    k: int = DEFAULT_TOP_K,
+) -> RunnableWithMessageHistory:
+    """Conversational chain with a recent window plus top-k retrieved turns."""
+
+    def retrieve(inputs: dict[str, Any], config: RunnableConfig) -> str:
+        session_id = config.get("configurable", {})["session_id"]
+        documents = index.search(session_id, inputs["input"], k)
+        documents.sort(key=lambda document: document.metadata["indexed_at"])
+        return "\n\n".join(document.page_content for document in documents)
+
+    chain = (
+        RunnablePassthrough.assign(memories=RunnableLambda(retrieve))
+        | build_prompt()
+        | llm
+    )
+
+    return RunnableWithMessageHistory(
+        runnable=chain,
+        get_session_history=get_session_history,
+        input_messages_key="input",
+        history_messages_key="history",
+    )
+
+
+# =========================
+# Benchmark
+# =========================
+
+
+class HashingEmbeddings(Embeddings):
+    """Offline bag-of-words embeddings (hashing trick), good enough to rank."""
+
+    def __init__(self, dimensions: int = HASHING_DIMENSIONS) -> None:
+        self.dimensions = dimensions
+
+    def _embed(self, text: str) -> list[float]:
+        vector = [0.0] * self.dimensions
+        for word in re.findall(r"\w+", text.lower()):
+            digest = hashlib.blake2b(word.encode(), digest_size=4).digest()
+            vector[int.from_bytes(digest) % self.dimensions] += 1.0
+        norm = math.sqrt(sum(value * value for value in vector)) or 1.0
+        return [value / norm for value in vector]
+
+    def embed_documents(self, texts: list[str]) -> list[list[float]]:
+        return [self._embed(text) for text in texts]
+
+    def embed_query(self, text: str) -> list[float]:
+        return self._embed(text)
+
+
+def past_turns(count: int) -> list[BaseMessage]:
+    messages: list[BaseMessage] = [
+        HumanMessage("Hi, my name is Higor and I live in Recife."),
+        AIMessage("Nice to meet you, Higor!"),
+    ]
+    for index in range(1, count):
+        messages.append(HumanMessage(f"Tell me a fun fact about topic {index}."))
+        messages.append(AIMessage(f"Here is a fun fact about topic {index}. " * 4))
+    return messages
+
+
+def measure(
+    name: str,
+    turns: int,
+    history: BaseChatMessageHistory,
+    index: TurnIndex,
+    writer: EmbeddingWriter | None,
+) -> None:
+    """Prompt tokens, invoke latency and recall at a given session length."""
+
+    prompts: list[PromptValue] = []
+
+    def meter(value: PromptValue) -> PromptValue:
+        prompts.append(value)
+        return value
+
+    llm = RunnableLambda(meter) | FakeListChatModel(responses=["Sure."])
+    history.add_messages(past_turns(turns))
+    if writer is not None:
+        writer.flush()  # benchmark steady state: older turns already indexed
+    chain = build_chain(llm, index, lambda session_id: history)
+
+    config = {"configurable": {"session_id": f"{name}-{turns}"}}
+    latencies = []
+    for _ in range(BENCH_SAMPLES):
+        start = time.perf_counter()
+        chain.invoke({"input": "What is my name?"}, config=config)  # type: ignore
+        latencies.append(time.perf_counter() - start)
+    latencies.sort()
+
+    tokens = count_tokens_approximately(prompts[-1].to_messages())
+    recall = "Higor" in prompts[0].to_string()
+    print(
+        f"{turns:>7,}  {name:<16}{tokens:>10,}"
+        f"{latencies[len(latencies) // 2] * 1e3:>10.2f}ms"
+        f"{'yes' if recall else 'no':>8}"
+    )
+
+
+def run_benchmark(index: TurnIndex, window_tokens: int, k: int) -> None:
+    """Compare full history, sliding window and long-term memory."""
+
+    writer = EmbeddingWriter(index)
+    empty = InMemoryTurnIndex(HashingEmbeddings())
+    print(f"window {window_tokens} tokens, top-{k} retrieved turns")
+    print(f"{'turns':>7}  {'mode':<16}{'prompt':>10}{'p50':>12}{'recall':>8}")
+
+    for turns in BENCH_SESSION_TURNS:
+        measure("full history", turns, InMemoryChatMessageHistory(), empty, None)
+
+        window = WindowedChatMessageHistory(window_tokens, count_message_tokens)
+        measure("sliding window", turns, window, empty, None)
+
+        memory = LongTermMemoryHistory(f"long-term-{turns}", writer, window_tokens)
+        measure("long-term", turns, memory, index, writer)
+
+    writer.close()
+    print(f"\nIndexed {writer.written:,} turns in {writer.batches:,} batches.")
+
+
+# =========================
+# Entrypoint
+# =========================
+
+
+def main() -> None:
+    """Main entrypoint for the application."""
+
+    parser = argparse.ArgumentParser(description="Retrieval-based long-term memory")
+    parser.add_argument("--window-tokens", type=int, default=DEFAULT_WINDOW_TOKENS)
+    parser.add_argument("--k", type=int, default=DEFAULT_TOP_K)
+    parser.add_argument(
+        "--pgvector", action="store_true", help="use PGVECTOR_URL + OpenAI"
+    )
+    args = parser.parse_args()
+
+    if args.pgvector:
+        from dotenv import load_dotenv
+
+        load_dotenv()
+        index: TurnIndex = build_pgvector_index()
+    else:
+        index = InMemoryTurnIndex(HashingEmbeddings())
+
+    run_benchmark(index, args.window_tokens, args.k)
+
+
+if __name__ == "__main__":
+    main()
@@ -6,20 +6,22 @@ Refactored for:
 - Clear separation of concerns
 - Modern Python 3.13 typing
 - Clean architecture style
+- Near-duplicate chunks dropped before embedding (see p06_near_duplicate_dedup.py)
 """
 
 from __future__ import annotations
 
 import os
 from collections.abc import Iterable
+from functools import cache
 from pathlib import Path
+from typing import TYPE_CHECKING
 
 from dotenv import load_dotenv
-from langchain_community.document_loaders import PyPDFLoader
 from langchain_core.documents import Document
-from langchain_openai import OpenAIEmbeddings
-from langchain_postgres import PGVector
-from langchain_text_splitters import RecursiveCharacterTextSplitter
+
+if TYPE_CHECKING:
+    from langchain_postgres import PGVector
 
 # ==========================================================
 # Configuration
@@ -65,6 +67,8 @@ def load_pdf(file_path: Path) -> list[Document]:
     if not file_path.exists():
         raise FileNotFoundError(f"PDF file not found: {file_path}")
 
+    from langchain_community.document_loaders import PyPDFLoader
+
     return PyPDFLoader(str(file_path)).load()
 
 
@@ -76,6 +80,8 @@ def load_pdf(file_path: Path) -> list[Document]:
 def split_documents(documents: list[Document]) -> list[Document]:
     """Split documents into chunks."""
 
+    from langchain_text_splitters import RecursiveCharacterTextSplitter
+
     splitter = RecursiveCharacterTextSplitter(
         chunk_size=1000,
         chunk_overlap=150,
@@ -98,8 +104,12 @@ def split_documents(documents: list[Document]) -> list[Document]:
 # ==========================================================
 
 
+@cache
 def build_vector_store() -> PGVector:
-    """Create vector store from documents."""
+    """Create vector store from documents (once per process)."""
+
+    from langchain_openai import OpenAIEmbeddings
+    from langchain_postgres import PGVector
 
     embeddings = OpenAIEmbeddings(
         model=os.getenv(
@@ -130,6 +140,8 @@ def generate_ids(count: int) -> list[str]:
 def ingest_pdf() -> None:
     """Ingest PDF file into vector store."""
 
+    from p06_near_duplicate_dedup import NearDuplicateFilter
+
     script_dir = Path(__file__).resolve().parent
     pdf_path = script_dir / PDF_FILENAME
 
@@ -139,6 +151,11 @@ def ingest_pdf() -> None:
     if not chunks:
         raise RuntimeError("No document chunks were generated.")
 
+    # Repeated headers/footers would otherwise be embedded once per page.
+    dedup = NearDuplicateFilter()
+    chunks = dedup.transform_documents(chunks)
+    print(f"Dropped {dedup.stats.dropped} near-duplicate chunks.")
+
     store = build_vector_store()
     ids = generate_ids(len(chunks))
 
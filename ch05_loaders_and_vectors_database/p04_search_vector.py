@@ -10,11 +10,14 @@ from __future__ import annotations
 
 import os
 from collections.abc import Iterable
+from functools import cache
+from typing import TYPE_CHECKING
 
 from dotenv import load_dotenv
 from langchain_core.documents import Document
-from langchain_openai import OpenAIEmbeddings
-from langchain_postgres import PGVector
+
+if TYPE_CHECKING:
+    from langchain_postgres import PGVector
 
 # ==========================================================
 # Configuration
@@ -53,8 +56,12 @@ def validate_env(required_vars: Iterable[str]) -> None:
 # ==========================================================
 
 
+@cache
 def build_vector_store() -> PGVector:
-    """Create vector store from documents."""
+    """Create vector store from documents (once per process)."""
+
+    from langchain_openai import OpenAIEmbeddings
+    from langchain_postgres import PGVector
 
     embeddings = OpenAIEmbeddings(
         model=os.getenv(
@@ -0,0 +1,532 @@
+"""
+Concurrent, Cache-Aware Crawler Loader
+--------------------------------------
+
+Crawls a whole documentation site instead of loading one URL with
+`WebBaseLoader`:
+- Many pages are fetched concurrently over one pooled HTTP client, with a
+  per-host connection limit and a politeness delay between requests to the
+  same host
+- A local HTTP response cache keeps each page's ETag/Last-Modified and its
+  parsed result; unchanged pages come back as `304 Not Modified` and are
+  neither re-downloaded nor re-parsed
+- HTML is parsed (BeautifulSoup, same text/metadata as `WebBaseLoader`) in a
+  process pool, off the event loop
+- `Document`s are yielded as soon as each page is ready, so they stream
+  straight into the splitter
+
+The benchmark crawls a local stand-in site and reports pages per second,
+cold and warm, against `WebBaseLoader`.
+
+Usage:
+    uv run ch05_loaders_and_vectors_database/p05_concurrent_crawler_loader.py \\
+        crawl https://python.langchain.com/docs/ --max-pages 200
+    uv run ch05_loaders_and_vectors_database/p05_concurrent_crawler_loader.py bench
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+from collections import Counter, defaultdict
+from collections.abc import AsyncGenerator, Iterable, Iterator, Sequence
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import asdict, dataclass, field
+from email.utils import formatdate
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Any
+from urllib.parse import urldefrag, urljoin, urlsplit
+
+import httpx
+from langchain_core.document_loaders import BaseLoader
+from langchain_core.documents import Document
+from langchain_text_splitters import RecursiveCharacterTextSplitter, TextSplitter
+
+# ==========================================================
+# Configuration
+# ==========================================================
+
+DEFAULT_MAX_PAGES = 500
+DEFAULT_CONCURRENCY = 32
+DEFAULT_PER_HOST_LIMIT = 8
+DEFAULT_POLITENESS_DELAY_SECONDS = 0.0
+DEFAULT_TIMEOUT_SECONDS = 30.0
+DEFAULT_CACHE_DIR = Path.home() / ".cache" / "langchain-fundamentals" / "http"
+USER_AGENT = "langchain-fundamentals-crawler/0.1"
+
+BENCH_PAGES = 300
+BENCH_SERVER_LATENCY_SECONDS = 0.02
+STAND_IN_FOOTER = (
+    "Was this page helpful? Edit this page on GitHub. Copyright 2025 LangChain, "
+    "Inc. All rights reserved. This documentation is provided as is, without "
+    "warranty of any kind. Join the community forum to ask questions, report "
+    "issues and share what you build. Subscribe to the newsletter for release "
+    "notes, tutorials and announcements about new integrations."
+)
+
+
+# ==========================================================
+# HTML Parsing (process pool)
+# ==========================================================
+
+
+def parse_html(url: str, html: str) -> tuple[str, dict[str, Any], list[str]]:
+    """Page text, `WebBaseLoader`-style metadata and outgoing links."""
+
+    from bs4 import BeautifulSoup
+
+    soup = BeautifulSoup(html, "html.parser")
+
+    metadata: dict[str, Any] = {"source": url}
+    if title := soup.find("title"):
+        metadata["title"] = title.get_text()
+    if description := soup.find("meta", attrs={"name": "description"}):
+        metadata["description"] = description.get("content", "No description found.")
+    if root := soup.find("html"):
+        metadata["language"] = root.get("lang", "No language found.")
+
+    links = [
+        urldefrag(urljoin(url, str(anchor["href"])))[0]
+        for anchor in soup.find_all("a", href=True)
+    ]
+    return soup.get_text(), metadata, links
+
+
+# ==========================================================
+# HTTP Response Cache
+# ==========================================================
+
+
+@dataclass
+class CachedPage:
+    etag: str | None
+    last_modified: str | None
+    page_content: str
+    metadata: dict[str, Any]
+    links: list[str] = field(default_factory=list)
+
+
+class HttpCache:
+    """Validators plus the parsed page, one JSON file per URL."""
+
+    def __init__(self, directory: Path | str) -> None:
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+
+    def _path(self, url: str) -> Path:
+        return self.directory / f"{hashlib.sha256(url.encode()).hexdigest()}.json"
+
+    def get(self, url: str) -> CachedPage | None:
+        try:
+            return CachedPage(**json.loads(self._path(url).read_text("utf-8")))
+        except (FileNotFoundError, json.JSONDecodeError, TypeError):
+            return None
+
+    def put(self, url: str, page: CachedPage) -> None:
+        path = self._path(url)
+        with tempfile.NamedTemporaryFile(
+            "w", dir=path.parent, delete=False, encoding="utf-8"
+        ) as file:
+            json.dump(asdict(page), file, ensure_ascii=False)
+        os.replace(file.name, path)
+
+
+# ==========================================================
+# Crawler Loader
+# ==========================================================
+
+
+class CrawlerLoader(BaseLoader):
+    """Breadth-first crawl of every page under the start URLs."""
+
+    def __init__(
+        self,
+        start_urls: str | Sequence[str],
+        max_pages: int = DEFAULT_MAX_PAGES,
+        concurrency: int = DEFAULT_CONCURRENCY,
+        per_host_limit: int = DEFAULT_PER_HOST_LIMIT,
+        politeness_delay: float = DEFAULT_POLITENESS_DELAY_SECONDS,
+        cache_dir: Path | str | None = DEFAULT_CACHE_DIR,
+        allowed_prefixes: Sequence[str] | None = None,
+        parse_workers: int | None = None,
+        timeout: float = DEFAULT_TIMEOUT_SECONDS,
+    ) -> None:
+        self.start_urls = [start_urls] if isinstance(start_urls, str) else start_urls
+        self.allowed_prefixes = tuple(allowed_prefixes or self.start_urls)
+        self.max_pages = max_pages
+        self.concurrency = concurrency
+        self.per_host_limit = per_host_limit
+        self.politeness_delay = politeness_delay
+        self.cache = HttpCache(cache_dir) if cache_dir is not None else None
+        self.parse_workers = parse_workers
+        self.timeout = timeout
+        self.stats: Counter[str] = Counter()
+
+    def _in_scope(self, url: str) -> bool:
+        return url.startswith(self.allowed_prefixes)
+
+    async def alazy_load(self) -> AsyncGenerator[Document]:
+        """Yield each crawled page as soon as it is fetched and parsed."""
+
+        self.stats.clear()
+        loop = asyncio.get_running_loop()
+        # `enqueue` admits at most `max_pages` URLs; workers wait for room in
+        # `ready`, so a slow consumer slows the crawl down instead of
+        # buffering the whole site.
+        frontier: asyncio.Queue[str] = asyncio.Queue(maxsize=self.max_pages)
+        ready: asyncio.Queue[Document | None] = asyncio.Queue(maxsize=self.concurrency)
+        seen: set[str] = set()
+        closed = False
+
+        host_slots: defaultdict[str, asyncio.Semaphore] = defaultdict(
+            lambda: asyncio.Semaphore(self.per_host_limit)
+        )
+        host_turns: defaultdict[str, asyncio.Lock] = defaultdict(asyncio.Lock)
+        host_next: defaultdict[str, float] = defaultdict(float)
+
+        def enqueue(urls: Iterable[str]) -> None:
+            for url in urls:
+                if (
+                    url not in seen
+                    and len(seen) < self.max_pages
+                    and self._in_scope(url)
+                ):
+                    seen.add(url)
+                    frontier.put_nowait(url)
+
+        async def polite(host: str) -> None:
+            async with host_turns[host]:
+                wait = host_next[host] - loop.time()
+                if wait > 0:
+                    await asyncio.sleep(wait)
+                host_next[host] = loop.time() + self.politeness_delay
+
+        async def fetch(
+            client: httpx.AsyncClient, pool: ProcessPoolExecutor, url: str
+        ) -> CachedPage | None:
+            cached = self.cache.get(url) if self.cache else None
+            headers = {}
+            if cached and cached.etag:
+                headers["If-None-Match"] = cached.etag
+            if cached and cached.last_modified:
+                headers["If-Modified-Since"] = cached.last_modified
+
+            host = urlsplit(url).netloc
+            async with host_slots[host]:
+                await polite(host)
+                response = await client.get(url, headers=headers)
+
+            if response.status_code == 304 and cached:
+                self.stats["not_modified"] += 1
+                return cached
+            response.raise_for_status()
+            if "html" not in response.headers.get("content-type", "html"):
+                self.stats["skipped"] += 1
+                return None
+
+            self.stats["downloaded"] += 1
+            self.stats["bytes"] += len(response.content)
+            text, metadata, links = await loop.run_in_executor(
+                pool, parse_html, str(response.url), response.text
+            )
+            page = CachedPage(
+                etag=response.headers.get("etag"),
+                last_modified=response.headers.get("last-modified"),
+                page_content=text,
+                metadata=metadata,
+                links=links,
+            )
+            if self.cache and (page.etag or page.last_modified):
+                await asyncio.to_thread(self.cache.put, url, page)
+            return page
+
+        async def worker(client: httpx.AsyncClient, pool: ProcessPoolExecutor) -> None:
+            while True:
+                url = await frontier.get()
+                try:
+                    page = await fetch(client, pool, url)
+                    if page is not None:
+                        enqueue(page.links)
+                        await ready.put(
+                            Document(
+                                page_content=page.page_content,
+                                metadata=page.metadata,
+                            )
+                        )
+                except Exception as e:  # one bad page must not stop the crawl
+                    self.stats["errors"] += 1
+                    print(f"Failed to fetch {url}: {e}")
+                finally:
+                    frontier.task_done()
+
+        async def crawl() -> None:
+            limits = httpx.Limits(
+                max_connections=self.concurrency,
+                max_keepalive_connections=self.concurrency,
+            )
+            try:
+                async with httpx.AsyncClient(
+                    limits=limits,
+                    timeout=self.timeout,
+                    follow_redirects=True,
+                    headers={"User-Agent": os.getenv("USER_AGENT", USER_AGENT)},
+                ) as client:
+                    with ProcessPoolExecutor(self.parse_workers) as pool:
+                        workers = [
+                            asyncio.create_task(worker(client, pool))
+                            for _ in range(self.concurrency)
+                        ]
+                        try:
+                            await frontier.join()
+                        finally:
+                            for task in workers:
+                                task.cancel()
+                            await asyncio.gather(*workers, return_exceptions=True)
+            finally:
+                # Wake the consumer, also when the crawl failed; once it has
+                # closed the generator there is nobody left to wake.
+                if not closed:
+                    await ready.put(None)
+
+        enqueue(self.start_urls)
+        crawler = asyncio.create_task(crawl())
+        try:
+            while (document := await ready.get()) is not None:
+                self.stats["pages"] += 1
+                yield document
+            await crawler
+        finally:
+            closed = True
+            crawler.cancel()
+            await asyncio.gather(crawler, return_exceptions=True)
+
+    def lazy_load(self) -> Iterator[Document]:
+        """
+        Sync iterator over `alazy_load`, crawled on a background loop.
+
+        Each document is pulled from the loop on demand, so only the bounded
+        `ready` queue is buffered; closing the iterator stops the crawl.
+        """
+
+        loop = asyncio.new_event_loop()
+        thread = threading.Thread(target=loop.run_forever, name="crawler", daemon=True)
+        thread.start()
+        documents = self.alazy_load()
+        try:
+            while True:
+                try:
+                    yield asyncio.run_coroutine_threadsafe(
+                        anext(documents), loop
+                    ).result()
+                except StopAsyncIteration:
+                    return
+        finally:
+            asyncio.run_coroutine_threadsafe(documents.aclose(), loop).result()
+            loop.call_soon_threadsafe(loop.stop)
+            thread.join()
+            loop.close()
+
+
+def split_stream(
+    documents: Iterable[Document], splitter: TextSplitter
+) -> Iterator[Document]:
+    """Split documents one at a time, as they arrive."""
+
+    for document in documents:
+        yield from splitter.split_documents([document])
+
+
+def build_splitter() -> RecursiveCharacterTextSplitter:
+    return RecursiveCharacterTextSplitter(chunk_size=500, chunk_overlap=100)
+
+
+# ==========================================================
+# Local Stand-In Site
+# ==========================================================
+
+
+class StandInSite(ThreadingHTTPServer):
+    """Generated documentation site with ETag/Last-Modified support."""
+
+    daemon_threads = True
+
+    def __init__(self, pages: int, latency: float) -> None:
+        super().__init__(("127.0.0.1", 0), StandInHandler)
+        self.pages = pages
+        self.latency = latency
+        self.requests: Counter[int] = Counter()
+        self.last_modified = formatdate(usegmt=True)
+
+    @property
+    def root(self) -> str:
+        host, port = self.server_address[:2]
+        return f"http://{host!s}:{port}/docs/"
+
+    def page(self, index: int) -> str:
+        links = "".join(
+            f'<li><a href="/docs/page-{target}.html">Page {target}</a></li>'
+            for target in ((index * 7 + 1) % self.pages, (index + 1) % self.pages)
+        )
+        body = " ".join(
+            f"Section {index}.{paragraph}: configuring chains, retrievers and "
+            f"agents for production workloads."
+            for paragraph in range(40)
+        )
+        return (
+            f'<html lang="en"><head><title>Page {index}</title>'
+            f'<meta name="description" content="Docs page {index}"></head>'
+            f"<body><nav><ul>{links}</ul></nav><main><p>{body}</p></main>"
+            f"<footer>{STAND_IN_FOOTER}</footer></body></html>"
+        )
+
+    def start(self) -> StandInSite:
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        return self
+
+
+class StandInHandler(BaseHTTPRequestHandler):
+    server: StandInSite
+
+    def do_GET(self) -> None:
+        site = self.server
+        path = self.path.removeprefix("/docs/")
+        index = None
+        if path.startswith("page-") and path.endswith(".html"):
+            index = int(path.removeprefix("page-").removesuffix(".html"))
+        if index is None or not 0 <= index < site.pages:
+            self.send_error(404)
+            return
+
+        time.sleep(site.latency)
+        site.requests[index] += 1
+        etag = f'"page-{index}-v1"'
+
+        if self.headers.get("If-None-Match") == etag:
+            self.send_response(304)
+            self.send_header("ETag", etag)
+            self.end_headers()
+            return
+
+        body = site.page(index).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "text/html; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.send_header("ETag", etag)
+        self.send_header("Last-Modified", site.last_modified)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format: str, *args: Any) -> None:
+        pass
+
+
+# ==========================================================
+# Benchmark
+# ==========================================================
+
+
+def run_benchmark(pages: int, concurrency: int, per_host_limit: int) -> None:
+    """Pages per second against the stand-in site, cold and warm cache."""
+
+    from langchain_community.document_loaders import WebBaseLoader
+
+    site = StandInSite(pages, BENCH_SERVER_LATENCY_SECONDS).start()
+    splitter = build_splitter()
+    print(f"{pages} pages, {BENCH_SERVER_LATENCY_SECONDS * 1e3:.0f}ms server latency")
+    print(f"{'run':<26}{'pages':>7}{'chunks':>8}{'seconds':>9}{'pages/s':>9}  stats")
+
+    urls = [f"{site.root}page-{index}.html" for index in range(pages)]
+    start = time.perf_counter()
+    chunks = build_splitter().split_documents(WebBaseLoader(urls).load())
+    elapsed = time.perf_counter() - start
+    print(
+        f"{'WebBaseLoader (URL list)':<26}{pages:>7}{len(chunks):>8}"
+        f"{elapsed:>9.2f}{pages / elapsed:>9.1f}"
+    )
+
+    with tempfile.TemporaryDirectory() as cache_dir:
+        for run in ("crawler, cold cache", "crawler, warm cache"):
+            loader = CrawlerLoader(
+                f"{site.root}page-0.html",
+                allowed_prefixes=[site.root],
+                max_pages=pages,
+                concurrency=concurrency,
+                per_host_limit=per_host_limit,
+                cache_dir=cache_dir,
+            )
+            start = time.perf_counter()
+            count = sum(1 for _ in split_stream(loader.lazy_load(), splitter))
+            elapsed = time.perf_counter() - start
+            stats = {
+                key: value for key, value in loader.stats.items() if key != "bytes"
+            }
+            print(
+                f"{run:<26}{loader.stats['pages']:>7}{count:>8}"
+                f"{elapsed:>9.2f}{loader.stats['pages'] / elapsed:>9.1f}  {stats}"
+            )
+
+    site.shutdown()
+
+
+# ==========================================================
+# Entrypoint
+# ==========================================================
+
+
+def main() -> None:
+    """Main entrypoint for the application."""
+
+    parser = argparse.ArgumentParser(description="Concurrent crawler loader")
+    commands = parser.add_subparsers(dest="command")
+
+    crawl_command = commands.add_parser("crawl", help="crawl and split a site")
+    crawl_command.add_argument("url")
+    crawl_command.add_argument("--max-pages", type=int, default=DEFAULT_MAX_PAGES)
+    crawl_command.add_argument(
+        "--politeness-delay", type=float, default=DEFAULT_POLITENESS_DELAY_SECONDS
+    )
+
+    bench_command = commands.add_parser("bench", help="pages/s on a local site")
+    bench_command.add_argument("--pages", type=int, default=BENCH_PAGES)
+
+    for command in (crawl_command, bench_command):
+        command.add_argument("--concurrency", type=int, default=DEFAULT_CONCURRENCY)
+        command.add_argument(
+            "--per-host-limit", type=int, default=DEFAULT_PER_HOST_LIMIT
+        )
+
+    args = parser.parse_args()
+
+    if args.command != "crawl":
+        run_benchmark(
+            getattr(args, "pages", BENCH_PAGES),
+            getattr(args, "concurrency", DEFAULT_CONCURRENCY),
+            getattr(args, "per_host_limit", DEFAULT_PER_HOST_LIMIT),
+        )
+        return
+
+    loader = CrawlerLoader(
+        args.url,
+        max_pages=args.max_pages,
+        concurrency=args.concurrency,
+        per_host_limit=args.per_host_limit,
+        politeness_delay=args.politeness_delay,
+    )
+    chunks = 0
+    for chunk in split_stream(loader.lazy_load(), build_splitter()):
+        chunks += 1
+        if chunks == 1:
+            print(chunk)
+            print("-" * 30)
+    print(f"{loader.stats['pages']} pages → {chunks} chunks {dict(loader.stats)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,368 @@
+"""
+Near-Duplicate Chunk Elimination
+--------------------------------
+
+Dedup stage between `split_documents()` and the embedding step. Repeated
+headers, footers and boilerplate across PDF and web pages otherwise get
+embedded, stored and returned in search many times over.
+- Each chunk is fingerprinted with MinHash over word shingles
+- An LSH index (banded signatures) finds candidate pairs without comparing
+  every chunk with every other one
+- Candidates are confirmed with the exact Jaccard similarity; a chunk at or
+  above the threshold is dropped in favor of the first one seen
+- The kept chunk records where its duplicates came from, in
+  `metadata["duplicates"]`
+
+`NearDuplicateFilter` is a `BaseDocumentTransformer`, so it drops into any
+pipeline (it is used by `p03_ingestion_pgvector.py`). Running the script
+reports embedding calls and storage saved on the local corpora.
+
+Usage:
+    uv run ch05_loaders_and_vectors_database/p06_near_duplicate_dedup.py
+    uv run ch05_loaders_and_vectors_database/p06_near_duplicate_dedup.py \\
+        --pdf ch05_loaders_and_vectors_database/gpt5.pdf --threshold 0.8
+"""
+
+from __future__ import annotations
+
+import argparse
+import hashlib
+import math
+import re
+import time
+from collections import defaultdict
+from collections.abc import Sequence
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any
+
+import numpy as np
+from langchain_core.documents import BaseDocumentTransformer, Document
+
+# ==========================================================
+# Configuration
+# ==========================================================
+
+DEFAULT_THRESHOLD = 0.8
+DEFAULT_NUM_PERM = 128
+DEFAULT_SHINGLE_SIZE = 3
+MINHASH_PRIME = 4_294_967_291  # largest prime below 2**32
+MINHASH_SEED = 42
+LSH_RECALL = 0.99
+PROVENANCE_KEYS = ("source", "page", "start_index")
+
+# Storage per stored chunk in PGVector: text-embedding-3-small vectors are
+# 1536 float4 values; text and metadata are measured per chunk.
+EMBEDDING_DIMENSIONS = 1536
+EMBEDDING_BATCH_SIZE = 1000  # texts per OpenAIEmbeddings request
+
+WORD_PATTERN = re.compile(r"\w+")
+
+
+# ==========================================================
+# MinHash + LSH
+# ==========================================================
+
+
+def shingles(text: str, size: int = DEFAULT_SHINGLE_SIZE) -> set[int]:
+    """32-bit hashes of the overlapping `size`-word shingles of a text."""
+
+    words = WORD_PATTERN.findall(text.lower())
+    grams = (
+        " ".join(words[i : i + size]) for i in range(max(1, len(words) - size + 1))
+    )
+    return {
+        int.from_bytes(hashlib.blake2b(gram.encode(), digest_size=4).digest())
+        for gram in grams
+    }
+
+
+def jaccard(a: set[int], b: set[int]) -> float:
+    return len(a & b) / len(a | b) if a or b else 1.0
+
+
+def lsh_params(threshold: float, num_perm: int) -> tuple[int, int]:
+    """
+    (bands, rows) for the LSH index.
+
+    Picks the most selective split (most rows per band, fewest candidates)
+    that still makes a pair at `threshold` a candidate with probability
+    `LSH_RECALL`; candidates are verified exactly afterwards.
+    """
+
+    splits = [
+        (num_perm // rows, rows)
+        for rows in range(1, num_perm + 1)
+        if num_perm % rows == 0
+    ]
+    return max(
+        (
+            (bands, rows)
+            for bands, rows in splits
+            if 1 - (1 - threshold**rows) ** bands >= LSH_RECALL
+        ),
+        key=lambda params: params[1],
+        default=splits[0],
+    )
+
+
+class MinHasher:
+    """MinHash signatures from `num_perm` universal hash functions."""
+
+    def __init__(self, num_perm: int = DEFAULT_NUM_PERM, seed: int = MINHASH_SEED):
+        rng = np.random.default_rng(seed)
+        # a, b < 2**31 and hashes < 2**32 keep a*x + b exact in uint64.
+        self.a = rng.integers(1, 2**31, num_perm, dtype=np.uint64)
+        self.b = rng.integers(0, 2**31, num_perm, dtype=np.uint64)
+
+    def signature(self, hashes: set[int]) -> np.ndarray:
+        values = np.fromiter(hashes, dtype=np.uint64, count=len(hashes))
+        if not len(values):
+            values = np.zeros(1, dtype=np.uint64)
+        permuted = (np.outer(values, self.a) + self.b) % np.uint64(MINHASH_PRIME)
+        return permuted.min(axis=0)
+
+
+# ==========================================================
+# Document Transformer
+# ==========================================================
+
+
+@dataclass
+class DedupStats:
+    chunks: int = 0
+    kept: int = 0
+    candidate_pairs: int = 0
+    seconds: float = 0.0
+
+    @property
+    def dropped(self) -> int:
+        return self.chunks - self.kept
+
+
+class NearDuplicateFilter(BaseDocumentTransformer):
+    """Drop chunks whose shingle Jaccard similarity to a kept one is high."""
+
+    def __init__(
+        self,
+        threshold: float = DEFAULT_THRESHOLD,
+        num_perm: int = DEFAULT_NUM_PERM,
+        shingle_size: int = DEFAULT_SHINGLE_SIZE,
+    ) -> None:
+        self.threshold = threshold
+        self.shingle_size = shingle_size
+        self.bands, self.rows = lsh_params(threshold, num_perm)
+        self.hasher = MinHasher(num_perm)
+        self.stats = DedupStats()
+
+    def transform_documents(
+        self, documents: Sequence[Document], **kwargs: Any
+    ) -> list[Document]:
+        """Keep the first chunk of every near-duplicate group, in order."""
+
+        start = time.perf_counter()
+        stats = DedupStats(chunks=len(documents))
+
+        buckets: list[defaultdict[bytes, list[int]]] = [
+            defaultdict(list) for _ in range(self.bands)
+        ]
+        kept_shingles: dict[int, set[int]] = {}
+        duplicates: defaultdict[int, list[dict[str, Any]]] = defaultdict(list)
+
+        for index, document in enumerate(documents):
+            hashes = shingles(document.page_content, self.shingle_size)
+            signature = self.hasher.signature(hashes)
+            keys = [
+                signature[band * self.rows : (band + 1) * self.rows].tobytes()
+                for band in range(self.bands)
+            ]
+
+            # Only kept chunks are indexed, so every candidate is a survivor.
+            candidates = {
+                kept
+                for band, key in enumerate(keys)
+                for kept in buckets[band].get(key, ())
+            }
+            stats.candidate_pairs += len(candidates)
+            match, similarity = None, 0.0
+            for kept in sorted(candidates):
+                similarity = jaccard(hashes, kept_shingles[kept])
+                if similarity >= self.threshold:
+                    match = kept
+                    break
+
+            if match is not None:
+                duplicates[match].append(
+                    {
+                        **{
+                            key: document.metadata[key]
+                            for key in PROVENANCE_KEYS
+                            if key in document.metadata
+                        },
+                        "similarity": round(similarity, 3),
+                    }
+                )
+                continue
+
+            kept_shingles[index] = hashes
+            for band, key in enumerate(keys):
+                buckets[band][key].append(index)
+
+        result = []
+        for index in kept_shingles:
+            document = documents[index]
+            if index in duplicates:
+                document = Document(
+                    page_content=document.page_content,
+                    metadata={
+                        **document.metadata,
+                        "duplicates": duplicates[index],
+                        "duplicate_count": len(duplicates[index]),
+                    },
+                    id=document.id,
+                )
+            result.append(document)
+
+        stats.kept = len(result)
+        stats.seconds = time.perf_counter() - start
+        self.stats = stats
+        return result
+
+
+def exact_dropped_count(documents: Sequence[Document], threshold: float) -> int:
+    """All-pairs reference: how many chunks the same policy drops."""
+
+    sets = [shingles(document.page_content) for document in documents]
+    kept: list[int] = []
+    dropped = 0
+    for index, hashes in enumerate(sets):
+        if any(jaccard(hashes, sets[other]) >= threshold for other in kept):
+            dropped += 1
+        else:
+            kept.append(index)
+    return dropped
+
+
+# ==========================================================
+# Savings Report
+# ==========================================================
+
+
+def boilerplate_pages(count: int = 60) -> list[Document]:
+    """PDF-like pages: repeated header, disclaimer and footer around the body."""
+
+    header = "GPT-5 System Card. OpenAI. Preliminary version for internal review."
+    disclaimer = (
+        "This document contains forward-looking statements about model "
+        "capabilities and safety evaluations. Results may differ from those "
+        "described here and are subject to change without notice. Do not "
+        "distribute outside the evaluation team without written approval."
+    )
+    pages = []
+    for page in range(count):
+        body = " ".join(
+            f"Evaluation {page}.{item} measured accuracy {(page * 7 + item) % 100}% "
+            f"on benchmark suite {item} under configuration {page % 5}."
+            for item in range(8)
+        )
+        pages.append(
+            Document(
+                page_content=(
+                    f"{header}\n\n{disclaimer}\n\n{body}\n\n{disclaimer}\n\n"
+                    f"Page {page + 1} of {count}. Confidential."
+                ),
+                metadata={"source": "system-card.pdf", "page": page},
+            )
+        )
+    return pages
+
+
+def stand_in_site_pages(count: int = 120) -> list[Document]:
+    """Pages crawled from the p05 local stand-in documentation site."""
+
+    from p05_concurrent_crawler_loader import CrawlerLoader, StandInSite
+
+    site = StandInSite(count, latency=0).start()
+    try:
+        loader = CrawlerLoader(
+            f"{site.root}page-0.html",
+            allowed_prefixes=[site.root],
+            max_pages=count,
+            cache_dir=None,
+        )
+        return loader.load()
+    finally:
+        site.shutdown()
+
+
+def load_pdf_pages(path: Path) -> list[Document]:
+    from langchain_community.document_loaders import PyPDFLoader
+
+    return PyPDFLoader(str(path)).load()
+
+
+def storage_bytes(documents: Sequence[Document]) -> int:
+    return sum(
+        EMBEDDING_DIMENSIONS * 4
+        + len(document.page_content.encode())
+        + len(repr(document.metadata).encode())
+        for document in documents
+    )
+
+
+def report(name: str, pages: list[Document], threshold: float) -> None:
+    from langchain_text_splitters import RecursiveCharacterTextSplitter
+
+    splitter = RecursiveCharacterTextSplitter(chunk_size=500, chunk_overlap=100)
+    chunks = splitter.split_documents(pages)
+
+    dedup = NearDuplicateFilter(threshold=threshold)
+    kept = dedup.transform_documents(chunks)
+    stats = dedup.stats
+
+    start = time.perf_counter()
+    exact_dropped = exact_dropped_count(chunks, threshold)
+    exact_seconds = time.perf_counter() - start
+
+    before, after = storage_bytes(chunks), storage_bytes(kept)
+    calls = math.ceil(len(chunks) / EMBEDDING_BATCH_SIZE)
+    print(f"{name}: {len(pages)} pages → {stats.chunks} chunks")
+    print(
+        f"  kept {stats.kept}, dropped {stats.dropped} "
+        f"({stats.dropped / max(stats.chunks, 1):.0%}); all-pairs check drops "
+        f"{exact_dropped}"
+    )
+    print(
+        f"  texts embedded: {stats.chunks} → {stats.kept} "
+        f"(requests: {calls} → {math.ceil(stats.kept / EMBEDDING_BATCH_SIZE)}), "
+        f"~{sum(len(c.page_content) for c in chunks) // 4:,} → "
+        f"~{sum(len(c.page_content) for c in kept) // 4:,} tokens"
+    )
+    print(
+        f"  storage: {before / 1e6:.2f}MB → {after / 1e6:.2f}MB; "
+        f"LSH {stats.seconds * 1e3:.0f}ms ({stats.candidate_pairs} candidates) "
+        f"vs all-pairs {exact_seconds * 1e3:.0f}ms"
+    )
+
+
+# ==========================================================
+# Entrypoint
+# ==========================================================
+
+
+def main() -> None:
+    """Main entrypoint for the application."""
+
+    parser = argparse.ArgumentParser(description="Near-duplicate chunk filter")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD)
+    parser.add_argument("--pdf", type=Path, help="also report on a PDF file")
+    args = parser.parse_args()
+
+    report("PDF-like pages", boilerplate_pages(), args.threshold)
+    report("Docs site (stand-in)", stand_in_site_pages(), args.threshold)
+    if args.pdf:
+        report(args.pdf.name, load_pdf_pages(args.pdf), args.threshold)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,479 @@
+"""
+Unified Workflow Entry Point
+----------------------------
+
+One CLI over every ch01–ch05 script, built for short-lived jobs:
+- `list` / `run` discover the chapter scripts without importing them; a
+  workflow is named `chNN.pMM_name` (any unique prefix works, e.g. `ch05.p04`)
+- Provider and loader packages (`langchain_openai`, `langchain_google_genai`,
+  `langchain_postgres`, `langchain_community.document_loaders`) are imported
+  inside the builders that need them, and clients are built on first use
+  and cached for the rest of the process
+- `serve` keeps a warm interpreter with the heavy packages already imported
+  and forks it for every `run --warm`, so repeated invocations skip the
+  import cost entirely (POSIX only; `--warm` falls back to a cold run when
+  no daemon is listening). The socket lives in `$XDG_RUNTIME_DIR` or in a
+  0700 directory of the user, and the client only hands its environment and
+  stdio to a daemon run by the same user; Ctrl-C reaches the forked child
+- `bench` measures cold-start milliseconds with `-X importtime` and compares
+  them against a stored JSON baseline
+
+Usage:
+    uv run workflows.py list
+    uv run workflows.py run ch03.p10 bench
+    uv run workflows.py serve &
+    uv run workflows.py run --warm ch03.p10 bench
+    uv run workflows.py bench [--save-baseline]
+"""
+
+from __future__ import annotations
+
+import argparse
+import ast
+import importlib
+import io
+import json
+import os
+import platform
+import runpy
+import signal
+import socket
+import stat
+import statistics
+import struct
+import subprocess
+import sys
+import tempfile
+import time
+import traceback
+from collections.abc import Sequence
+from dataclasses import dataclass
+from pathlib import Path
+
+# ==========================================================
+# Configuration
+# ==========================================================
+
+ROOT = Path(__file__).resolve().parent
+SCRIPT_GLOB = "ch0*_*/p*.py"
+SOCKET_NAME = "langchain-fundamentals.sock"
+
+PRELOAD_MODULES = (
+    "dotenv",
+    "langchain_core.runnables",
+    "langchain_core.prompts",
+    "langchain_classic.agents",
+    "langchain_text_splitters",
+    "langchain_community.document_loaders",
+    "langchain_openai",
+    "langchain_google_genai",
+    "langchain_postgres",
+    "httpx",
+)
+
+BASELINE_PATH = ROOT / "workflows_startup_baseline.json"
+REGRESSION_TOLERANCE = 0.25
+BENCH_RUNS = 5
+BENCH_WORKFLOWS = (
+    "ch02.p08_processing_pipeline_batch",
+    "ch03.p10_batch_agent_runner",
+    "ch04.p02_history_based_on_sliding_window",
+    "ch05.p03_ingestion_pgvector",
+    "ch05.p04_search_vector",
+    "ch05.p05_concurrent_crawler_loader",
+)
+BENCH_CLI_WORKFLOW = "ch03.p10_batch_agent_runner"
+
+
+# ==========================================================
+# Workflow Discovery
+# ==========================================================
+
+
+@dataclass(frozen=True)
+class Workflow:
+    name: str
+    path: Path
+
+    @property
+    def title(self) -> str:
+        """First docstring line, read without importing the script."""
+
+        tree = ast.parse(self.path.read_text(encoding="utf-8"))
+        docstring = ast.get_docstring(tree) or ""
+        return docstring.strip().splitlines()[0] if docstring.strip() else ""
+
+
+def discover() -> dict[str, Workflow]:
+    workflows = {}
+    for path in sorted(ROOT.glob(SCRIPT_GLOB)):
+        name = f"{path.parent.name.split('_')[0]}.{path.stem}"
+        workflows[name] = Workflow(name, path)
+    return workflows
+
+
+def resolve(name: str) -> Workflow:
+    """Exact workflow name or a unique prefix of one."""
+
+    workflows = discover()
+    if name in workflows:
+        return workflows[name]
+
+    matches = [workflow for key, workflow in workflows.items() if key.startswith(name)]
+    if len(matches) != 1:
+        candidates = ", ".join(workflow.name for workflow in matches) or "none"
+        raise SystemExit(
+            f"Unknown or ambiguous workflow {name!r} (matches: {candidates})"
+        )
+    return matches[0]
+
+
+def run_workflow(workflow: Workflow, argv: Sequence[str]) -> int:
+    """Run a chapter script as `__main__`, with its sibling imports working."""
+
+    sys.argv = [str(workflow.path), *argv]
+    sys.path.insert(0, str(workflow.path.parent))
+    try:
+        runpy.run_path(str(workflow.path), run_name="__main__")
+    except SystemExit as e:
+        return e.code if isinstance(e.code, int) else (0 if e.code is None else 1)
+    finally:
+        sys.stdout.flush()
+        sys.stderr.flush()
+    return 0
+
+
+# ==========================================================
+# Warm Daemon
+# ==========================================================
+
+
+def preload(modules: Sequence[str]) -> None:
+    for module in modules:
+        try:
+            importlib.import_module(module)
+        except ImportError as e:
+            print(f"Not preloading {module}: {e}", file=sys.stderr)
+
+
+def default_socket() -> Path:
+    """`$XDG_RUNTIME_DIR`, else a per-user directory in the temp dir."""
+
+    runtime_dir = os.environ.get("XDG_RUNTIME_DIR")
+    if runtime_dir:
+        return Path(runtime_dir) / SOCKET_NAME
+    directory = Path(tempfile.gettempdir()) / f"langchain-fundamentals-{os.getuid()}"
+    return directory / SOCKET_NAME
+
+
+def is_private(path: Path) -> bool:
+    """Owned by this user and not accessible to anyone else."""
+
+    info = path.lstat()
+    return info.st_uid == os.getuid() and not info.st_mode & 0o077
+
+
+def peer_uid(connection: socket.socket) -> int | None:
+    """UID of the process at the other end; `None` where unsupported."""
+
+    if not hasattr(socket, "SO_PEERCRED"):  # Linux only
+        return None
+    credentials = connection.getsockopt(
+        socket.SOL_SOCKET, socket.SO_PEERCRED, struct.calcsize("3i")
+    )
+    _, uid, _ = struct.unpack("3i", credentials)
+    return uid
+
+
+def serve(socket_path: Path) -> None:
+    """Import the heavy packages once, then fork a child per request."""
+
+    directory = socket_path.parent
+    directory.mkdir(mode=0o700, parents=True, exist_ok=True)
+    if not stat.S_ISDIR(directory.lstat().st_mode) or not is_private(directory):
+        raise SystemExit(
+            f"Refusing to serve from {directory}: it must be a 0700 directory "
+            "owned by this user."
+        )
+
+    start = time.perf_counter()
+    preload(PRELOAD_MODULES)
+    print(f"Preloaded in {(time.perf_counter() - start) * 1e3:.0f}ms")
+
+    socket_path.unlink(missing_ok=True)
+    server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    server.bind(str(socket_path))
+    socket_path.chmod(0o600)
+    server.listen()
+    signal.signal(signal.SIGCHLD, signal.SIG_IGN)  # children are reaped by the OS
+    print(f"Listening on {socket_path}")
+
+    try:
+        while True:
+            connection, _ = server.accept()
+            if peer_uid(connection) not in (None, os.getuid()):
+                connection.close()
+                continue
+            sys.stdout.flush()
+            sys.stderr.flush()
+            if os.fork() == 0:
+                server.close()
+                os._exit(handle(connection))
+            connection.close()
+    finally:
+        server.close()
+        socket_path.unlink(missing_ok=True)
+
+
+def handle(connection: socket.socket) -> int:
+    """Forked child: adopt the client's stdio, env and cwd, run, report."""
+
+    _, fds, _, _ = socket.recv_fds(connection, 1, 3)
+    request = json.loads(connection.makefile("rb").readline())
+    connection.sendall(f"{os.getpid()}\n".encode())  # lets the client forward Ctrl-C
+    for target, fd in enumerate(fds):
+        os.dup2(fd, target)
+        os.close(fd)
+    if isinstance(sys.stdout, io.TextIOWrapper):
+        sys.stdout.reconfigure(line_buffering=os.isatty(1))
+
+    os.environ.clear()
+    os.environ.update(request["env"])
+    os.chdir(request["cwd"])
+
+    try:
+        code = run_workflow(resolve(request["name"]), request["argv"])
+    except KeyboardInterrupt:
+        code = 128 + signal.SIGINT
+    except BaseException:
+        traceback.print_exc()
+        code = 1
+    connection.sendall(f"{code}\n".encode())
+    return code
+
+
+def run_warm(socket_path: Path, name: str, argv: Sequence[str]) -> int | None:
+    """
+    Run through the daemon; `None` when no daemon of this user is listening.
+
+    The request carries the environment (API keys included) and the stdio
+    descriptors, so both the socket and the process behind it must belong to
+    this user before anything is sent.
+    """
+
+    client = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        owned = is_private(socket_path.parent) and is_private(socket_path)
+        client.connect(str(socket_path))
+    except (FileNotFoundError, ConnectionRefusedError, PermissionError):
+        client.close()
+        return None
+
+    if not owned or peer_uid(client) not in (None, os.getuid()):
+        client.close()
+        print(
+            f"Ignoring {socket_path}: not a private socket of this user.",
+            file=sys.stderr,
+        )
+        return None
+
+    with client:
+        request = {
+            "name": name,
+            "argv": list(argv),
+            "cwd": os.getcwd(),
+            "env": dict(os.environ),
+        }
+        socket.send_fds(client, [b"\0"], [0, 1, 2])
+        client.sendall(json.dumps(request).encode() + b"\n")
+        reply = client.makefile("rb")
+
+        # The child is not in the terminal's foreground process group, so
+        # Ctrl-C only reaches this process; pass it on.
+        child = int(reply.readline() or 0)
+        previous = signal.getsignal(signal.SIGINT)
+        if child:
+            signal.signal(signal.SIGINT, lambda signum, _: os.kill(child, signum))
+        try:
+            code = reply.readline()
+        finally:
+            signal.signal(signal.SIGINT, previous)
+    return int(code) if code.strip() else 1
+
+
+# ==========================================================
+# Startup Benchmark
+# ==========================================================
+
+
+def import_time_ms(workflow: Workflow) -> float:
+    """Cumulative `-X importtime` of the workflow module, in milliseconds."""
+
+    module = workflow.path.stem
+    directory = str(workflow.path.parent)
+    code = f"import sys; sys.path.insert(0, {directory!r}); import {module}"
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code],
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    # "import time: self [us] | cumulative | imported package"
+    for line in result.stderr.splitlines():
+        if line.startswith("import time:") and line.split("|")[-1].strip() == module:
+            return int(line.split("|")[1]) / 1e3
+    raise RuntimeError(f"{module} missing from -X importtime output")
+
+
+def wall_time_ms(command: Sequence[str]) -> float:
+    start = time.perf_counter()
+    subprocess.run(command, capture_output=True, check=True)
+    return (time.perf_counter() - start) * 1e3
+
+
+def run_benchmark(runs: int) -> dict[str, dict[str, float]]:
+    """Median import time per workflow, and cold vs warm CLI round trips."""
+
+    results: dict[str, dict[str, float]] = {}
+    for name in BENCH_WORKFLOWS:
+        workflow = resolve(name)
+        import_time_ms(workflow)  # compile bytecode first
+        samples = [import_time_ms(workflow) for _ in range(runs)]
+        results[workflow.name] = {"import_ms": statistics.median(samples)}
+
+    cli = [sys.executable, __file__, "run"]
+    cold = [wall_time_ms([*cli, BENCH_CLI_WORKFLOW, "--help"]) for _ in range(runs)]
+    results["cli.cold"] = {"help_ms": statistics.median(cold)}
+
+    with tempfile.TemporaryDirectory() as directory:
+        socket_path = Path(directory) / "bench.sock"
+        daemon = subprocess.Popen(
+            [sys.executable, __file__, "serve", "--socket", str(socket_path)],
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL,
+        )
+        try:
+            while not socket_path.exists():
+                time.sleep(0.05)
+            command = [*cli, "--warm", "--socket", str(socket_path)]
+            warm = [
+                wall_time_ms([*command, BENCH_CLI_WORKFLOW, "--help"])
+                for _ in range(runs)
+            ]
+        finally:
+            daemon.terminate()
+            daemon.wait()
+    results["cli.warm"] = {"help_ms": statistics.median(warm)}
+
+    return results
+
+
+def compare(
+    results: dict[str, dict[str, float]],
+    baseline: dict[str, dict[str, float]],
+    tolerance: float,
+) -> list[str]:
+    """Print a comparison table and return the regressed metric names."""
+
+    regressions: list[str] = []
+    print(f"{'workflow / metric':<56}{'current':>10}{'baseline':>10}{'delta':>9}")
+
+    for name, metrics in results.items():
+        for metric, value in metrics.items():
+            reference = baseline.get(name, {}).get(metric)
+            label = f"{name} / {metric}"
+            if not reference:
+                print(f"{label:<56}{value:>10.1f}{'-':>10}{'-':>9}")
+                continue
+
+            delta = (value - reference) / reference
+            flag = " !" if delta > tolerance else ""
+            if flag:
+                regressions.append(label)
+            print(f"{label:<56}{value:>10.1f}{reference:>10.1f}{delta:>+8.0%}{flag}")
+
+    return regressions
+
+
+def load_baseline(path: Path) -> dict[str, dict[str, float]]:
+    if not path.exists():
+        return {}
+
+    return json.loads(path.read_text(encoding="utf-8"))["results"]
+
+
+def save_baseline(path: Path, results: dict[str, dict[str, float]]) -> None:
+    payload = {
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "results": {
+            name: {metric: round(value, 1) for metric, value in metrics.items()}
+            for name, metrics in results.items()
+        },
+    }
+    path.write_text(json.dumps(payload, indent=2) + "\n", encoding="utf-8")
+
+
+# ==========================================================
+# Entrypoint
+# ==========================================================
+
+
+def main() -> None:
+    """Main entrypoint for the application."""
+
+    parser = argparse.ArgumentParser(description="ch01–ch05 workflows")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    commands.add_parser("list", help="list the available workflows")
+
+    run_command = commands.add_parser("run", help="run a workflow")
+    run_command.add_argument("--warm", action="store_true", help="use the daemon")
+    run_command.add_argument("--socket", type=Path)
+    run_command.add_argument("workflow")
+    run_command.add_argument("args", nargs=argparse.REMAINDER)
+
+    serve_command = commands.add_parser("serve", help="keep a warm interpreter")
+    serve_command.add_argument("--socket", type=Path)
+
+    bench_command = commands.add_parser("bench", help="cold-start benchmark")
+    bench_command.add_argument("--runs", type=int, default=BENCH_RUNS)
+    bench_command.add_argument("--baseline", type=Path, default=BASELINE_PATH)
+    bench_command.add_argument("--save-baseline", action="store_true")
+    bench_command.add_argument("--tolerance", type=float, default=REGRESSION_TOLERANCE)
+
+    args = parser.parse_args()
+
+    if args.command == "list":
+        for workflow in discover().values():
+            print(f"{workflow.name:<48}{workflow.title}")
+
+    elif args.command == "run":
+        code = None
+        if args.warm:
+            code = run_warm(args.socket or default_socket(), args.workflow, args.args)
+        if code is None:
+            code = run_workflow(resolve(args.workflow), args.args)
+        sys.exit(code)
+
+    elif args.command == "serve":
+        serve(args.socket or default_socket())
+
+    else:
+        results = run_benchmark(args.runs)
+        if args.save_baseline:
+            save_baseline(args.baseline, results)
+            print(f"Baseline written to {args.baseline}")
+            return
+
+        regressions = compare(results, load_baseline(args.baseline), args.tolerance)
+        if regressions:
+            print(
+                f"\n{len(regressions)} metric(s) regressed by more than "
+                f"{args.tolerance:.0%}."
+            )
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()